@@ -0,0 +1,199 @@
+"""
+Bulk offline scoring via de Anthropic Message Batches API
+Half de prijs van losse messages.create calls, voor grote herscoringen die niet direct klaar hoeven te zijn
+"""
+
+import hashlib
+import json
+import os
+import time
+from dataclasses import asdict
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from natuurhuisje_agent_v2 import ImprovedNatuurhuisjeAgent, ScoringResult, message_text
+from near_duplicates import TEXT_FIELDS
+
+
+class AnthropicBatchBackend:
+    """
+    Thin wrapper around client.messages.batches.
+
+    Any object with the same three methods can be passed to BatchScoringJob,
+    e.g. a fake that serves canned results for local testing.
+    """
+
+    def __init__(self, client):
+        self.client = client
+
+    def submit(self, requests: List[Dict]) -> str:
+        """Create a batch from [{"custom_id", "params"}] and return its id"""
+        return self.client.messages.batches.create(requests=requests).id
+
+    def is_finished(self, batch_id: str) -> bool:
+        return self.client.messages.batches.retrieve(batch_id).processing_status == "ended"
+
+    def results(self, batch_id: str) -> Iterator[Tuple[str, Optional[str], Optional[str]]]:
+        """Yield (custom_id, response text, error) for every request in the batch"""
+        for entry in self.client.messages.batches.results(batch_id):
+            if entry.result.type == "succeeded":
+                yield entry.custom_id, message_text(entry.result.message), None
+            else:
+                error = getattr(entry.result, "error", None)
+                yield entry.custom_id, None, f"{entry.result.type}: {error}" if error else entry.result.type
+
+
+def _custom_id(url: str) -> str:
+    """Batch custom_ids must match [a-zA-Z0-9_-]{1,64}, so use a hash of the url"""
+    return "listing-" + hashlib.sha1(url.encode("utf-8")).hexdigest()[:24]
+
+
+def _unique(listings: Iterable[Tuple[str, str]]) -> Iterator[Tuple[str, str]]:
+    """(url, html) pairs with each url once (its first occurrence): a repeated custom_id fails the whole batch"""
+    seen = set()
+    for url, html_content in listings:
+        if url not in seen:
+            seen.add(url)
+            yield url, html_content
+
+
+def _input_fingerprint(urls: Iterable[str]) -> str:
+    """Hash of the listing URLs in order, to tell whether a state file belongs to this input"""
+    return hashlib.sha256("\n".join(urls).encode("utf-8")).hexdigest()
+
+
+class BatchScoringJob:
+    """
+    Score many listings as one Message Batch.
+
+    Progress is written to `state_file` after submitting and after collecting
+    results, so a restarted process picks up the existing batch instead of
+    submitting (and paying for) it again. The state file records a hash of
+    the input URLs: resuming it for a different input raises ValueError. A
+    "submitting" marker is saved before the batch is sent, so a crash during
+    submission stops the next run (RuntimeError) instead of submitting a
+    possibly duplicate batch. Repeated URLs are scored once; results come
+    back one per unique URL, in input order. Listings the agent can answer
+    locally (result cache, near duplicates or fast-path pre-classifier) are
+    not submitted, and batch answers are indexed for near duplicates like
+    interactive ones.
+
+    Every request goes to agent.model, so cascade agents (cascade_model) are
+    refused: their cache keys and near-duplicate versions promise a
+    fast-then-full score that a batch never produces.
+    """
+
+    def __init__(self, agent: ImprovedNatuurhuisjeAgent, backend=None,
+                 state_file: str = 'batch_state.json', poll_interval: float = 60.0):
+        if agent.cascade_model is not None:
+            raise ValueError("batch scoring gebruikt alleen agent.model; maak een agent zonder cascade_model")
+        self.agent = agent
+        self.backend = backend or AnthropicBatchBackend(agent.client)
+        self.state_file = state_file
+        self.poll_interval = poll_interval
+
+    def run(self, listings: Iterable[Tuple[str, str]]) -> List[ScoringResult]:
+        """Score (url, html) pairs; resumes the batch in state_file if there is one"""
+        state = self._load_state()
+        if state is None:
+            state = self._submit(listings)
+        else:
+            self._check_resumable(state, listings)
+
+        if state.get("batch_id") and not state.get("collected"):
+            self._wait(state["batch_id"])
+            self._collect(state)
+
+        # State files written before the order was recorded keep their insertion order
+        order = state.get("order") or list(state["results"])
+        results = [ScoringResult(**state["results"][url]) for url in order]
+        self._clear_state()
+        return results
+
+    def _submit(self, listings: Iterable[Tuple[str, str]]) -> Dict:
+        """Build requests for listings that need the model and submit them as one batch"""
+        state = {"batch_id": None, "pending": {}, "results": {}, "collected": False}
+        requests = []
+        urls = []
+
+        for url, html_content in _unique(listings):
+            urls.append(url)
+            listing_data = self.agent._extract_listing_data(html_content)
+            cache_key, cached = self.agent._local_result(listing_data, url=url)
+            if cached is not None:
+                cached.url = url
+                state["results"][url] = asdict(cached)
+                continue
+
+            custom_id = _custom_id(url)
+            state["pending"][custom_id] = {"url": url, "cache_key": cache_key}
+            if self.agent.near_duplicates is not None:
+                # Only the text the near-duplicate signature is built from, to keep the state file small
+                state["pending"][custom_id]["listing"] = {field: listing_data.get(field, "") for field in TEXT_FIELDS}
+            requests.append({
+                "custom_id": custom_id,
+                "params": self.agent._message_request(listing_data),
+            })
+
+        state["input"] = _input_fingerprint(urls)
+        state["order"] = urls
+        if requests:
+            state["submitting"] = True
+            self._save_state(state)
+            state["batch_id"] = self.backend.submit(requests)
+            state["submitting"] = False
+            print(f"📦 Batch {state['batch_id']} ingediend met {len(requests)} listings")
+        self._save_state(state)
+        return state
+
+    def _check_resumable(self, state: Dict, listings: Iterable[Tuple[str, str]]):
+        # State files written before the fingerprint was recorded are resumed as they are
+        if "input" in state and state["input"] != _input_fingerprint(url for url, _ in _unique(listings)):
+            raise ValueError(f"{self.state_file} hoort bij een andere lijst listings; "
+                             f"verwijder het bestand om opnieuw te beginnen")
+        if state.get("submitting"):
+            raise RuntimeError(f"indienen werd onderbroken: controleer in de Anthropic console of de batch "
+                               f"al bestaat, en verwijder daarna {self.state_file}")
+
+    def _wait(self, batch_id: str):
+        while not self.backend.is_finished(batch_id):
+            time.sleep(self.poll_interval)
+
+    def _collect(self, state: Dict):
+        """Map batch answers back through the agent's parse + scoring path"""
+        for custom_id, response_text, error in self.backend.results(state["batch_id"]):
+            pending = state["pending"].get(custom_id)
+            if pending is None:
+                continue
+
+            if error is None:
+                analysis = self.agent._parse_response(response_text)
+                result = self.agent._calculate_final_score(analysis)
+                result.url = pending["url"]
+                self.agent._store_result(pending["cache_key"], analysis, result, api_seconds=0.0,
+                                         listing_data=pending.get("listing"))
+            else:
+                result = self.agent._failed_result(error)
+                result.url = pending["url"]
+            state["results"][pending["url"]] = asdict(result)
+
+        state["collected"] = True
+        self._save_state(state)
+
+    def _load_state(self) -> Optional[Dict]:
+        if not os.path.exists(self.state_file):
+            return None
+        with open(self.state_file, 'r', encoding='utf-8') as f:
+            state = json.load(f)
+        print(f"↻ Hervat batch {state.get('batch_id')} uit {self.state_file}")
+        return state
+
+    def _save_state(self, state: Dict):
+        # Write to a temp file first so a crash never leaves half a state file behind
+        tmp_file = self.state_file + '.tmp'
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump(state, f, ensure_ascii=False)
+        os.replace(tmp_file, self.state_file)
+
+    def _clear_state(self):
+        if os.path.exists(self.state_file):
+            os.remove(self.state_file)
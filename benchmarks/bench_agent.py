@@ -0,0 +1,238 @@
+"""
+Offline benchmark suite voor de Natuurhuisje Agent
+
+Usage:
+    python benchmarks/bench_agent.py                                   # alles, schrijft bench_results.json
+    python benchmarks/bench_agent.py --quick -o new.json --compare old.json
+
+Draait volledig offline: een nep Anthropic client (fake_anthropic.py) en een
+synthetisch corpus (corpus.py) vervangen de API en natuurhuisje.nl. Meet de
+losse stappen (extractie, prompt, parsing, score), analyze_listing end-to-end
+en de doorvoer van analyze_many bij verschillende concurrency.
+Resultaten worden als JSON weggeschreven; --compare meldt regressies ten
+opzichte van een eerdere run.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from typing import Callable, Dict, List, Optional, Sequence
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from natuurhuisje_agent_v2 import PROMPT_VERSION, ImprovedNatuurhuisjeAgent
+from instrumentation import Metrics
+
+from corpus import CorpusFetcher, synthetic_corpus, synthetic_listing
+from fake_anthropic import FakeAnthropic, FakeAsyncAnthropic
+
+RESULTS_VERSION = 1
+PAGE_SIZES_KB = (20, 80, 300)
+
+
+def time_calls(func: Callable, inputs: Sequence, repeat: int, min_seconds: float = 0.2) -> Dict:
+    """
+    Time func over `inputs`, `repeat` rounds (or until min_seconds has passed).
+
+    Returns per-call statistics in microseconds.
+    """
+    timings = []
+    started = time.perf_counter()
+    rounds = 0
+    while rounds < repeat or (time.perf_counter() - started < min_seconds and rounds < repeat * 50):
+        for value in inputs:
+            t0 = time.perf_counter()
+            func(value)
+            timings.append(time.perf_counter() - t0)
+        rounds += 1
+
+    timings.sort()
+    return {
+        "unit": "us",
+        "runs": len(timings),
+        "median": statistics.median(timings) * 1e6,
+        "mean": statistics.fmean(timings) * 1e6,
+        "p95": timings[min(len(timings) - 1, int(0.95 * len(timings)))] * 1e6,
+    }
+
+
+def make_agent(pages: Dict[str, str], training_file: str, few_shot: str = "fixed", latency: float = 0.0,
+               error_rate: float = 0.0, fetch_latency: float = 0.0, metrics: Optional[Metrics] = None,
+               seed: int = 0) -> ImprovedNatuurhuisjeAgent:
+    """Agent wired to the fake clients and the in-memory corpus"""
+    return ImprovedNatuurhuisjeAgent(
+        training_file=training_file,
+        few_shot=few_shot,
+        fetcher=CorpusFetcher(pages, latency=fetch_latency),
+        metrics=metrics,
+        client=FakeAnthropic(latency=latency, error_rate=error_rate, seed=seed),
+        async_client=FakeAsyncAnthropic(latency=latency, error_rate=error_rate, seed=seed),
+    )
+
+
+def bench_steps(agent: ImprovedNatuurhuisjeAgent, nearest_agent: ImprovedNatuurhuisjeAgent,
+                pages: Dict[str, List[str]], repeat: int) -> Dict[str, Dict]:
+    """Microbenchmarks of the individual analysis steps"""
+    results = {}
+    for size_kb, html_list in pages.items():
+        results[f"extract_listing_data[{size_kb}kb]"] = time_calls(agent._extract_listing_data, html_list, repeat)
+
+    listings = [agent._extract_listing_data(html) for html_list in pages.values() for html in html_list]
+    results["build_few_shot_prompt[fixed]"] = time_calls(agent._build_few_shot_prompt, listings, repeat)
+    results["build_few_shot_prompt[nearest]"] = time_calls(nearest_agent._build_few_shot_prompt, listings, repeat)
+    results["message_request[fixed]"] = time_calls(agent._message_request, listings, repeat)
+
+    responses = [FakeAnthropic.answer(agent._build_listing_prompt(listing)) for listing in listings]
+    results["parse_response"] = time_calls(agent._parse_response, responses, repeat)
+
+    analyses = [agent._parse_response(text) for text in responses]
+    results["calculate_final_score"] = time_calls(agent._calculate_final_score, analyses, repeat)
+
+    items = [(f"https://www.natuurhuisje.nl/vakantiehuisje/{i}", html)
+             for i, html in enumerate(html for html_list in pages.values() for html in html_list)]
+    results["analyze_listing[end_to_end]"] = time_calls(lambda item: agent.analyze_listing(*item), items, repeat)
+    return results
+
+
+def bench_throughput(corpus: Dict[str, str], training_file: str, levels: Sequence[int], latency: float,
+                     fetch_latency: float, error_rate: float) -> List[Dict]:
+    """analyze_many over the whole corpus at each concurrency level"""
+    runs = []
+    for concurrency in levels:
+        agent = make_agent(corpus, training_file, latency=latency, error_rate=error_rate,
+                           fetch_latency=fetch_latency, metrics=Metrics())
+
+        async def run():
+            return [result async for result in agent.analyze_many(corpus, concurrency=concurrency)]
+
+        started = time.perf_counter()
+        results = asyncio.run(run())
+        elapsed = time.perf_counter() - started
+
+        usage = agent.usage_report()
+        stages = agent.metrics.snapshot()["stages"]
+        runs.append({
+            "concurrency": concurrency,
+            "listings": len(results),
+            "seconds": elapsed,
+            "listings_per_second": len(results) / elapsed if elapsed else 0.0,
+            "errors": sum(1 for result in results if result.error),
+            "max_in_flight": agent.async_client.stats["max_in_flight"],
+            "input_tokens": usage["input_tokens"],
+            "cache_read_input_tokens": usage["cache_read_input_tokens"],
+            "output_tokens": usage["output_tokens"],
+            "stage_mean_ms": {name: stats["mean"] * 1000 for name, stats in stages.items()},
+        })
+    return runs
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(old: Dict, new: Dict, tolerance: float) -> List[str]:
+    """Print old vs. new per benchmark; returns the names that regressed by more than `tolerance`"""
+    regressions = []
+    print(f"\n{'vergelijking':<36}{'oud':>12}{'nieuw':>12}{'verschil':>10}")
+    for name, stats in new["benchmarks"].items():
+        if name not in old.get("benchmarks", {}):
+            continue
+        before, after = old["benchmarks"][name]["median"], stats["median"]
+        change = (after - before) / before if before else 0.0
+        flag = "  ⚠️" if change > tolerance else ""
+        print(f"{name:<36}{before:>10.1f}us{after:>10.1f}us{change:>+10.0%}{flag}")
+        if flag:
+            regressions.append(name)
+
+    old_runs = {run["concurrency"]: run for run in old.get("throughput", [])}
+    for run in new["throughput"]:
+        previous = old_runs.get(run["concurrency"])
+        if previous is None or not previous["listings_per_second"]:
+            continue
+        name = f"throughput[c={run['concurrency']}]"
+        before, after = previous["listings_per_second"], run["listings_per_second"]
+        change = (after - before) / before
+        flag = "  ⚠️" if change < -tolerance else ""
+        print(f"{name:<36}{before:>10.1f}/s{after:>10.1f}/s{change:>+10.0%}{flag}")
+        if flag:
+            regressions.append(name)
+    return regressions
+
+
+def main(argv: Optional[Sequence[str]] = None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('-o', '--output', default='bench_results.json')
+    parser.add_argument('--training-file', default=os.path.join(os.path.dirname(os.path.dirname(
+        os.path.abspath(__file__))), 'training_data.csv'))
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--listings', type=int, default=300, help='listings per throughput run')
+    parser.add_argument('--concurrency', default='1,4,16,64', help='comma separated concurrency levels')
+    parser.add_argument('--latency', type=float, default=0.05, help='fake model latency in seconds')
+    parser.add_argument('--fetch-latency', type=float, default=0.01, help='fake page fetch latency in seconds')
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--quick', action='store_true', help='fewer rounds and listings, for a smoke run')
+    parser.add_argument('--compare', help='earlier results JSON to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.10, help='allowed slowdown before --compare fails')
+    args = parser.parse_args(argv)
+
+    if args.quick:
+        args.repeat, args.listings = 3, 60
+    levels = [int(level) for level in args.concurrency.split(',')]
+
+    pages = {kb: [synthetic_listing(kb, natuurhuisje=i % 2 == 0, seed=i) for i in range(4)] for kb in PAGE_SIZES_KB}
+    agent = make_agent({}, args.training_file)
+    nearest_agent = make_agent({}, args.training_file, few_shot="nearest")
+
+    print("⏱️  Stappen...")
+    steps = bench_steps(agent, nearest_agent, pages, args.repeat)
+    print(f"{'benchmark':<36}{'median':>12}{'p95':>12}{'runs':>8}")
+    for name, stats in steps.items():
+        print(f"{name:<36}{stats['median']:>10.1f}us{stats['p95']:>10.1f}us{stats['runs']:>8}")
+
+    print(f"\n⏱️  Doorvoer analyze_many ({args.listings} listings, model {args.latency * 1000:.0f} ms, "
+          f"fetch {args.fetch_latency * 1000:.0f} ms)...")
+    corpus = synthetic_corpus(args.listings)
+    throughput = bench_throughput(corpus, args.training_file, levels, args.latency, args.fetch_latency,
+                                  args.error_rate)
+    print(f"{'concurrency':>12}{'listings/s':>12}{'seconden':>10}{'fouten':>8}{'max in flight':>15}")
+    for run in throughput:
+        print(f"{run['concurrency']:>12}{run['listings_per_second']:>12.1f}{run['seconds']:>10.2f}"
+              f"{run['errors']:>8}{run['max_in_flight']:>15}")
+
+    report = {
+        "version": RESULTS_VERSION,
+        "meta": {
+            "timestamp": time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            "git_commit": git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "prompt_version": PROMPT_VERSION,
+            "args": vars(args),
+        },
+        "benchmarks": steps,
+        "throughput": throughput,
+    }
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    print(f"\n✅ Resultaten opgeslagen in {args.output}")
+
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            regressions = compare(json.load(f), report, args.tolerance)
+        if regressions:
+            print(f"❌ {len(regressions)} regressie(s) boven {args.tolerance:.0%}")
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,122 @@
+"""
+Benchmark: extract_listing_data vs. de oorspronkelijke regex/split implementatie
+
+Usage:
+    python benchmarks/bench_extraction.py                 # synthetische pagina's
+    python benchmarks/bench_extraction.py --pages saved/  # opgeslagen .html pagina's
+
+Controleert dat beide implementaties identieke listing_data opleveren en meet
+tijd en piekgeheugen per pagina.
+"""
+
+import argparse
+import glob
+import os
+import re
+import statistics
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from natuurhuisje_agent_v2 import extract_listing_data
+
+
+def legacy_extract_listing_data(html_content: str) -> dict:
+    """The original _extract_listing_data, kept here as the reference"""
+    data = {
+        "description": "",
+        "location_info": "",
+        "type": "",
+        "facilities": []
+    }
+
+    desc_pattern = r'<h2>.*?</h2>\s*<p>(.*?)</p>'
+    matches = re.findall(desc_pattern, html_content, re.DOTALL)
+    if matches:
+        data["description"] = " ".join(matches)
+
+    if "Natuur en omgeving" in html_content:
+        env_section = html_content.split("Natuur en omgeving")[1].split("</div>")[0]
+        data["location_info"] = re.sub(r'<[^>]+>', '', env_section)[:1000]
+
+    type_patterns = [
+        r'(Kleinschalig vakantiepark)',
+        r'(Vrijstaand)',
+        r'(Chalet)',
+        r'(Blokhut)',
+        r'(Boomhut)',
+    ]
+    for pattern in type_patterns:
+        if re.search(pattern, html_content):
+            data["type"] = re.search(pattern, html_content).group(1)
+            break
+
+    return data
+
+
+def synthetic_page(size_kb: int, headings: bool = False) -> str:
+    """
+    A natuurhuisje-like page padded with markup up to roughly size_kb.
+
+    With headings=True the padding contains <h2> tags that are not followed
+    by a <p>, which makes the old description regex rescan the rest of the
+    page for every heading.
+    """
+    head = '<html><head><script>' + 'var x = 1;' * 2000 + '</script></head><body>'
+    body = (
+        '<div class="listing"><h2>Over dit huisje</h2>\n<p>Vrijstaand boshuisje aan de rand van de Veluwe, '
+        'midden in het bos met veel privacy.</p></div>'
+        '<div class="env"><h3>Natuur en omgeving</h3><p>Direct aan de <b>heide</b> en uitgestrekte bossen. '
+        'Wandelroutes starten bij de deur.</p></div>'
+    )
+    heading = 'h2' if headings else 'h3'
+    filler = f'<div class="review"><{heading}>Review</{heading}><span>Mooi huisje, fijne plek</span></div>\n'
+    repeats = max(0, size_kb * 1024 - len(head) - len(body)) // len(filler)
+    return head + body + filler * repeats + '<h2>Reviews</h2><footer>Chalet Blokhut</footer></body></html>'
+
+
+def measure(func, html_content: str, repeat: int):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func(html_content)
+        timings.append(time.perf_counter() - started)
+
+    tracemalloc.start()
+    func(html_content)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return statistics.median(timings), peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--pages', help='directory with saved listing pages (*.html)')
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    if args.pages:
+        pages = {}
+        for path in sorted(glob.glob(os.path.join(args.pages, '*.html'))):
+            with open(path, 'r', encoding='utf-8', errors='replace') as f:
+                pages[os.path.basename(path)] = f.read()
+    else:
+        pages = {f'synthetic_{kb}kb': synthetic_page(kb) for kb in (50, 300, 800)}
+        pages['synthetic_50kb_headings'] = synthetic_page(50, headings=True)
+
+    print(f"{'pagina':<28}{'KB':>7}{'oud ms':>10}{'nieuw ms':>10}{'oud piek KB':>14}{'nieuw piek KB':>15}")
+    for name, html_content in pages.items():
+        if legacy_extract_listing_data(html_content) != extract_listing_data(html_content):
+            print(f"❌ {name}: output verschilt van de oude implementatie")
+            sys.exit(1)
+
+        old_time, old_peak = measure(legacy_extract_listing_data, html_content, args.repeat)
+        new_time, new_peak = measure(extract_listing_data, html_content, args.repeat)
+        print(f"{name:<28}{len(html_content) / 1024:>7.0f}{old_time * 1000:>10.2f}{new_time * 1000:>10.2f}"
+              f"{old_peak / 1024:>14.0f}{new_peak / 1024:>15.0f}")
+
+
+if __name__ == '__main__':
+    main()
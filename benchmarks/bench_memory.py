@@ -0,0 +1,160 @@
+"""
+Benchmark: geheugen van veel ScoringResults, oude dataclass vs. slotted en kolomgewijs
+
+Usage:
+    python benchmarks/bench_memory.py                          # 100k en 1M resultaten
+    python benchmarks/bench_memory.py --sizes 10000 100000 -o memory.json
+
+Bouwt N synthetische resultaten zoals ze uit JSON terugkomen (cache, batch
+state, scoring service: elk resultaat met eigen strings) en meet met
+tracemalloc wat er na het opbouwen in gebruik blijft, per representatie:
+de oorspronkelijke dataclass, de slotted ScoringResult met gedeelde labels,
+een ResultTable en een ResultTable met de redenering op schijf. Controleert
+ook dat de ResultTable dezelfde waarden teruggeeft.
+"""
+
+import argparse
+import gc
+import json
+import os
+import platform
+import random
+import sys
+import time
+import tracemalloc
+from dataclasses import dataclass
+from typing import Dict, Iterator, List, Optional
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from compact_results import ResultTable
+from natuurhuisje_agent_v2 import DEFAULT_CRITERIA, SCORE_THRESHOLD, ScoringResult
+
+
+@dataclass
+class LegacyScoringResult:
+    """ScoringResult as it was before slots and interned labels, kept here as the reference"""
+    is_natuurhuisje: bool
+    confidence_score: float
+    category: str
+    reasoning: str
+    breakdown: Dict[str, float]
+    similar_to: Optional[str] = None
+    url: Optional[str] = None
+    error: Optional[str] = None
+    source: str = "model"
+    derived_from: Optional[str] = None
+
+
+REASONING = ("De accommodatie ligt {where} en is {kind}. {extra} Privacy is {privacy} en de directe omgeving "
+             "bestaat uit {area}, wat de natuurbeleving {effect}.")
+
+
+def templates(count: int = 1000, seed: int = 7) -> List[str]:
+    """Distinct synthetic results as JSON, about as long as real model answers"""
+    rng = random.Random(seed)
+    lines = []
+    for _ in range(count):
+        breakdown = {criterion: rng.randint(0, 10) for criterion in DEFAULT_CRITERIA}
+        score = sum(breakdown[criterion] / 10 * config["weight"] for criterion, config in DEFAULT_CRITERIA.items())
+        failed = rng.random() < 0.01
+        category = "✅ Natuurhuisje" if score >= SCORE_THRESHOLD else "❌ Geen natuurhuisje"
+        lines.append(json.dumps({
+            "is_natuurhuisje": score >= SCORE_THRESHOLD,
+            "confidence_score": score,
+            "category": "⚠️ Analyse mislukt" if failed else category,
+            "reasoning": REASONING.format(
+                where=rng.choice(("midden in het bos", "aan de rand van een dorp", "op een vakantiepark")),
+                kind=rng.choice(("een vrijstaande blokhut", "een chalet tussen andere chalets", "een boerderij")),
+                extra=rng.choice(("Er is een eigen tuin.", "De receptie is vlakbij.", "")),
+                privacy=rng.choice(("groot", "beperkt", "redelijk")),
+                area=rng.choice(("heide en bos", "weilanden", "bebouwing en wegen")),
+                effect=rng.choice(("versterkt", "beperkt"))),
+            "breakdown": {} if failed else breakdown,
+            "similar_to": None if failed else ("ja" if score >= SCORE_THRESHOLD else "nee"),
+            "url": None,
+            "error": "TimeoutError: read timeout" if failed else None,
+            "source": "model",
+            "derived_from": None,
+        }, ensure_ascii=False))
+    return lines
+
+
+def records(count: int, lines: List[str]) -> Iterator[Dict]:
+    """Result fields as read back from JSON: every string a separate object, reasoning unique per listing"""
+    for i in range(count):
+        fields = json.loads(lines[i % len(lines)])
+        fields["url"] = f"https://www.natuurhuisje.nl/vakantiehuisje/{100000 + i}"
+        fields["reasoning"] += f" Listing {i}."
+        yield fields
+
+
+def build(kind: str, fields: Iterator[Dict]):
+    if kind == "dataclass (oud)":
+        return [LegacyScoringResult(**result) for result in fields]
+    if kind == "slotted":
+        return [ScoringResult(**result) for result in fields]
+    table = ResultTable(DEFAULT_CRITERIA, reasoning_on_disk=kind == "ResultTable, redenering op schijf")
+    for result in fields:
+        table.append(ScoringResult(**result))
+    return table
+
+
+KINDS = ("dataclass (oud)", "slotted", "ResultTable", "ResultTable, redenering op schijf")
+
+
+def measure(kind: str, count: int, lines: List[str]) -> Dict:
+    gc.collect()
+    tracemalloc.start()
+    started = time.perf_counter()
+    built = build(kind, records(count, lines))
+    seconds = time.perf_counter() - started
+    gc.collect()
+    retained, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    started = time.perf_counter()
+    total = sum(result.breakdown.get("natuur_nabijheid", 0) for result in built)
+    scan = time.perf_counter() - started
+    if isinstance(built, ResultTable):
+        verify(built, count, lines)
+        built.close()
+    return {"bytes": retained, "bytes_per_result": retained / count, "build_seconds": seconds,
+            "scan_seconds": scan, "checksum": total}
+
+
+def verify(table: ResultTable, count: int, lines: List[str]):
+    """Every 997th row read back equals the result it was built from"""
+    for row, fields in enumerate(records(count, lines)):
+        if row % 997 == 0 and table[row].to_result() != ScoringResult(**fields):
+            print(f"❌ rij {row} verschilt van het oorspronkelijke resultaat")
+            sys.exit(1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100_000, 1_000_000])
+    parser.add_argument('-o', '--output', help='write the results as JSON')
+    args = parser.parse_args()
+
+    lines = templates()
+    results: Dict[str, List[Dict]] = {}
+    print(f"{'resultaten':>10}  {'representatie':<34}{'MB':>9}{'B/result':>10}{'x oud':>8}"
+          f"{'opbouw s':>10}{'scan s':>8}")
+    for count in args.sizes:
+        baseline = None
+        for kind in KINDS:
+            measured = measure(kind, count, lines)
+            baseline = baseline or measured["bytes"]
+            measured["ratio"] = measured["bytes"] / baseline
+            results.setdefault(kind, []).append({"results": count, **measured})
+            print(f"{count:>10}  {kind:<34}{measured['bytes'] / 1e6:>9.1f}{measured['bytes_per_result']:>10.0f}"
+                  f"{measured['ratio']:>8.2f}{measured['build_seconds']:>10.2f}{measured['scan_seconds']:>8.2f}")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({"python": platform.python_version(), "results": results}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
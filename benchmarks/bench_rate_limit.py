@@ -0,0 +1,91 @@
+"""
+Benchmark: analyze_many tegen een nep API met account limieten, met en zonder RateLimiter
+
+Usage:
+    python benchmarks/bench_rate_limit.py
+    python benchmarks/bench_rate_limit.py --rpm 300 --itpm 400000 --overload-above 8 --concurrency 64
+
+De nep client (fake_anthropic.py) handhaaft RPM/ITPM zoals de API en geeft
+429 met retry-after, of 529 boven `--overload-above` gelijktijdige calls.
+Zonder limiter worden die fouten mislukte listings; met limiter zouden alle
+listings moeten slagen bij een doorvoer dicht bij de limiet.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from natuurhuisje_agent_v2 import ImprovedNatuurhuisjeAgent
+from rate_limiter import RateLimiter
+
+from corpus import CorpusFetcher, synthetic_corpus
+from fake_anthropic import FakeAnthropic, FakeAsyncAnthropic
+
+
+def run(corpus, args, limiter=None):
+    fake = FakeAsyncAnthropic(latency=args.latency, jitter=args.latency / 2, requests_per_minute=args.rpm,
+                              input_tokens_per_minute=args.itpm, overload_above=args.overload_above)
+    agent = ImprovedNatuurhuisjeAgent(training_file=args.training_file, fetcher=CorpusFetcher(corpus),
+                                      client=FakeAnthropic(), async_client=fake, rate_limiter=limiter)
+
+    async def collect():
+        return [result async for result in agent.analyze_many(corpus, concurrency=args.concurrency)]
+
+    started = time.perf_counter()
+    results = asyncio.run(collect())
+    elapsed = time.perf_counter() - started
+    succeeded = sum(1 for result in results if not result.error)
+    return {
+        "limiter": limiter is not None,
+        "listings": len(results),
+        "succeeded": succeeded,
+        "failed": len(results) - succeeded,
+        "seconds": elapsed,
+        "succeeded_per_minute": succeeded / elapsed * 60 if elapsed else 0.0,
+        "api_calls": fake.stats["calls"],
+        "rate_limited": fake.stats["rate_limited"],
+        "overloaded": fake.stats["overloaded"],
+        "retries": limiter.stats["retries"] if limiter else 0,
+        "final_concurrency": limiter.concurrency if limiter else args.concurrency,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--listings', type=int, default=150)
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--rpm', type=float, default=600, help='account requests per minute')
+    parser.add_argument('--itpm', type=float, default=1_000_000, help='account input tokens per minute')
+    parser.add_argument('--overload-above', type=int, default=12, help='concurrent calls before 529')
+    parser.add_argument('--latency', type=float, default=0.2)
+    parser.add_argument('--training-file', default=os.path.join(os.path.dirname(os.path.dirname(
+        os.path.abspath(__file__))), 'training_data.csv'))
+    parser.add_argument('-o', '--output', help='write the results as JSON')
+    args = parser.parse_args()
+
+    corpus = synthetic_corpus(args.listings)
+    limiter = RateLimiter(requests_per_minute=args.rpm * 0.95, input_tokens_per_minute=args.itpm * 0.95,
+                          max_concurrency=args.concurrency, base_backoff=0.2, seed=0)
+    runs = [run(corpus, args), run(corpus, args, limiter)]
+
+    print(f"\n{'':<14}{'gelukt':>8}{'mislukt':>9}{'per min':>9}{'seconden':>10}{'calls':>7}{'429':>6}{'529':>6}"
+          f"{'retries':>9}{'window':>8}")
+    for result in runs:
+        label = "met limiter" if result["limiter"] else "zonder"
+        print(f"{label:<14}{result['succeeded']:>8}{result['failed']:>9}{result['succeeded_per_minute']:>9.0f}"
+              f"{result['seconds']:>10.1f}{result['api_calls']:>7}{result['rate_limited']:>6}"
+              f"{result['overloaded']:>6}{result['retries']:>9}{result['final_concurrency']:>8}")
+    print(f"(account limiet: {args.rpm:.0f} requests/min)")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({"args": vars(args), "runs": runs}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,122 @@
+"""
+Benchmark: cold start van de agent (import tijd en time-to-first-ready)
+
+Usage:
+    python benchmarks/bench_startup.py
+    python benchmarks/bench_startup.py --examples 5000 --runs 9 -o startup.json
+
+Elke meting draait in een vers Python proces, zoals een nieuwe Streamlit
+worker of CLI aanroep. Gemeten worden: import van natuurhuisje_agent_v2,
+constructie van de agent zonder snapshot, met een nieuwe snapshot (koud) en
+met een bestaande snapshot (warm), en het aanmaken van de Anthropic client
+bij de eerste analyse. Ook wordt bijgehouden welke zware modules al na de
+import geladen zijn.
+"""
+
+import argparse
+import csv
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY_MODULES = ('anthropic', 'numpy', 'pandas', 'requests', 'httpx', 'streamlit')
+
+# Runs inside the child process; prints one JSON line
+PROBE = r'''
+import json, os, sys, time
+started = time.perf_counter()
+sys.path.insert(0, {root!r})
+import natuurhuisje_agent_v2
+imported = time.perf_counter()
+loaded = [name for name in {heavy!r} if name in sys.modules]
+
+agent = natuurhuisje_agent_v2.ImprovedNatuurhuisjeAgent(
+    api_key='offline', training_file={training_file!r}, few_shot={few_shot!r}, snapshot={snapshot!r})
+ready = time.perf_counter()
+agent.client
+client = time.perf_counter()
+print(json.dumps({{"import": imported - started, "ready": ready - imported, "client": client - ready,
+                  "heavy_after_import": loaded}}))
+'''
+
+
+def probe(training_file: str, few_shot: str, snapshot: bool) -> dict:
+    code = PROBE.format(root=ROOT, heavy=HEAVY_MODULES, training_file=training_file,
+                        few_shot=few_shot, snapshot=snapshot)
+    started = time.perf_counter()
+    output = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True).stdout
+    result = json.loads(output.strip().splitlines()[-1])
+    result["process"] = time.perf_counter() - started
+    return result
+
+
+def write_training_file(path: str, examples: int):
+    """Copy of training_data.csv, repeated with fresh URLs up to `examples` rows"""
+    with open(os.path.join(ROOT, 'training_data.csv'), 'r', encoding='utf-8') as f:
+        rows = list(csv.DictReader(f))
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=['URL', 'Categorie', 'Score', 'Redenering', 'Kenmerken'])
+        writer.writeheader()
+        for i in range(examples):
+            row = dict(rows[i % len(rows)])
+            row['URL'] = f"{row['URL']}-{i}"
+            writer.writerow(row)
+
+
+def summarise(samples: list) -> dict:
+    return {key: statistics.median(sample[key] for sample in samples)
+            for key in ("import", "ready", "client", "process")} | {"heavy_after_import": samples[-1]["heavy_after_import"]}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--examples', type=int, default=0, help='synthetic training set size (0: training_data.csv)')
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('-o', '--output', help='write the results as JSON')
+    args = parser.parse_args()
+
+    from training_snapshot import snapshot_path
+
+    with tempfile.TemporaryDirectory() as directory:
+        training_file = os.path.join(directory, 'training_data.csv')
+        if args.examples:
+            write_training_file(training_file, args.examples)
+        else:
+            with open(os.path.join(ROOT, 'training_data.csv'), 'rb') as src, open(training_file, 'wb') as dst:
+                dst.write(src.read())
+
+        results = {}
+        for few_shot in ("fixed", "nearest"):
+            results[f"{few_shot}/no_snapshot"] = summarise(
+                [probe(training_file, few_shot, False) for _ in range(args.runs)])
+
+            cold = []
+            for _ in range(args.runs):
+                if os.path.exists(snapshot_path(training_file)):
+                    os.remove(snapshot_path(training_file))
+                cold.append(probe(training_file, few_shot, True))
+            results[f"{few_shot}/snapshot_cold"] = summarise(cold)
+            results[f"{few_shot}/snapshot_warm"] = summarise(
+                [probe(training_file, few_shot, True) for _ in range(args.runs)])
+
+    print(f"{'scenario':<26}{'import ms':>11}{'ready ms':>10}{'client ms':>11}{'proces ms':>11}")
+    for name, result in results.items():
+        print(f"{name:<26}{result['import'] * 1000:>11.1f}{result['ready'] * 1000:>10.1f}"
+              f"{result['client'] * 1000:>11.1f}{result['process'] * 1000:>11.1f}")
+    heavy = results["fixed/snapshot_warm"]["heavy_after_import"]
+    print(f"\nZware modules na import: {', '.join(heavy) or 'geen'}")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({"python": platform.python_version(), "args": vars(args), "results": results}, f, indent=2)
+
+
+if __name__ == '__main__':
+    sys.path.insert(0, ROOT)
+    main()
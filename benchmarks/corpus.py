@@ -0,0 +1,110 @@
+"""
+Synthetische natuurhuisje.nl pagina's voor offline benchmarks
+Pagina's met dezelfde structuur als echte listings (h2 + p, "Natuur en omgeving", type), in variabele grootte
+"""
+
+import asyncio
+import contextlib
+import random
+import time
+from typing import Dict, Iterable, Optional
+
+TYPES = ('Vrijstaand', 'Blokhut', 'Boomhut', 'Chalet', 'Kleinschalig vakantiepark')
+
+NATURE_SENTENCES = (
+    'Het huisje ligt midden in het bos, op loopafstand van de heide.',
+    'Vanuit de tuin kijk je vrij uit over de weilanden.',
+    'Afgelegen plek met veel privacy en rust.',
+    'De duinen en het strand liggen op tien minuten fietsen.',
+    'Wandelroutes beginnen direct bij de deur.',
+    'Je hoort hier alleen de vogels en soms een ree.',
+)
+PARK_SENTENCES = (
+    'Gelegen op een vakantiepark met receptie en zwembad.',
+    'Het centrum met winkels en restaurants is vlakbij.',
+    'Op de camping is een speeltuin en animatie voor kinderen.',
+    'Appartement in een rustige woonwijk.',
+    'Gezellig park met meerdere bungalows naast elkaar.',
+)
+
+
+def synthetic_listing(size_kb: int = 80, natuurhuisje: bool = True, seed: int = 0) -> str:
+    """
+    One listing page of roughly size_kb.
+
+    Natuurhuisjes get nature sentences and a detached type, the others park
+    sentences; both are padded with scripts, reviews and a footer like a
+    real page, so extraction has to skip realistic amounts of markup.
+    """
+    rng = random.Random(seed)
+    sentences = NATURE_SENTENCES if natuurhuisje else PARK_SENTENCES
+    listing_type = rng.choice(TYPES[:3] if natuurhuisje else TYPES[3:])
+
+    description = ' '.join(rng.choice(sentences) for _ in range(rng.randint(3, 8)))
+    environment = ' '.join(rng.choice(sentences) for _ in range(rng.randint(2, 5)))
+
+    head = '<html><head><title>Vakantiehuisje</title><script>' + 'window.dataLayer.push({});' * 400 + '</script></head><body>'
+    body = (
+        f'<div class="listing"><span class="type">{listing_type}</span>'
+        f'<h2>Over dit huisje</h2>\n<p>{description}</p>'
+        f'<h2>Indeling</h2>\n<p>{rng.randint(2, 8)} personen, {rng.randint(1, 4)} slaapkamers.</p></div>'
+        f'<div class="env"><h3>Natuur en omgeving</h3><p>{environment} <b>Tip:</b> neem een verrekijker mee.</p></div>'
+    )
+    review = '<div class="review"><h3>Review</h3><span>{}</span></div>\n'
+    filler = []
+    length = len(head) + len(body)
+    while length < size_kb * 1024:
+        chunk = review.format(rng.choice(sentences))
+        filler.append(chunk)
+        length += len(chunk)
+    return head + body + ''.join(filler) + '<footer>natuurhuisje.nl</footer></body></html>'
+
+
+def synthetic_corpus(n: int, sizes: Iterable[int] = (20, 80, 300), ja_fraction: float = 0.5,
+                     seed: int = 0) -> Dict[str, str]:
+    """url -> page for n listings, cycling through `sizes`; pages are deterministic per seed"""
+    sizes = tuple(sizes)
+    rng = random.Random(seed)
+    corpus = {}
+    for i in range(n):
+        url = f'https://www.natuurhuisje.nl/vakantiehuisje/{100000 + i}'
+        corpus[url] = synthetic_listing(sizes[i % len(sizes)], rng.random() < ja_fraction, seed=seed * 1_000_003 + i)
+    return corpus
+
+
+class CorpusFetcher:
+    """
+    PageFetcher stand-in that serves pages from memory.
+
+    Implements the parts of PageFetcher the agent uses (fetch, cached,
+    async_client, afetch); `latency` simulates the network per request.
+    """
+
+    def __init__(self, pages: Dict[str, str], latency: float = 0.0):
+        self.pages = pages
+        self.latency = latency
+        self.stats = {"requests": 0, "bytes_downloaded": 0}
+
+    def fetch(self, url: str) -> str:
+        if self.latency:
+            time.sleep(self.latency)
+        return self._serve(url)
+
+    def cached(self, url: str) -> Optional[str]:
+        return self.pages.get(url)
+
+    @contextlib.asynccontextmanager
+    async def async_client(self, max_connections: int = 8):
+        yield None
+
+    async def afetch(self, client, url: str) -> str:
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return self._serve(url)
+
+    def _serve(self, url: str) -> str:
+        if url not in self.pages:
+            raise KeyError(f"Niet in corpus: {url}")
+        self.stats["requests"] += 1
+        self.stats["bytes_downloaded"] += len(self.pages[url])
+        return self.pages[url]
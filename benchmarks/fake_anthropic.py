@@ -0,0 +1,301 @@
+"""
+Nep Anthropic client voor offline benchmarks
+Zelfde messages.create interface als anthropic.Anthropic / AsyncAnthropic, zonder netwerk of API key
+"""
+
+import asyncio
+import json
+import random
+import threading
+import time
+from types import SimpleNamespace
+from typing import Dict, Optional
+
+import httpx
+from anthropic import APIStatusError, InternalServerError, RateLimitError
+
+# Smallest prefix the API will cache for Sonnet, mirrored so usage looks realistic
+MIN_CACHEABLE_TOKENS = 1024
+
+_POSITIVE = ('bos', 'heide', 'duinen', 'vrijstaand', 'privacy', 'afgelegen', 'boomhut', 'blokhut')
+_NEGATIVE = ('vakantiepark', 'camping', 'zwembad', 'receptie', 'centrum', 'appartement')
+
+STREAM_CHUNK_CHARS = 4  # About one token per streamed text chunk
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (about 4 characters per token for Dutch text)"""
+    return max(1, len(text) // 4)
+
+
+def api_error(status_code: int, retry_after: Optional[float] = None) -> APIStatusError:
+    """A real anthropic exception for `status_code`, as the SDK would raise it"""
+    headers = {'retry-after': str(retry_after)} if retry_after is not None else {}
+    request = httpx.Request('POST', 'https://api.anthropic.com/v1/messages')
+    response = httpx.Response(status_code, headers=headers, request=request)
+    error_class = {429: RateLimitError}.get(status_code, InternalServerError if status_code >= 500 else APIStatusError)
+    return error_class(f"fake {status_code}", response=response, body=None)
+
+
+class FakeAnthropic:
+    """
+    Stand-in for anthropic.Anthropic.
+
+    messages.create() sleeps for `latency` (+ up to `jitter`) seconds, then
+    answers with a JSON analysis whose scores follow a few keywords in the
+    listing text, so results vary between listings. With probability
+    `error_rate` it raises the SDK error for `error_status` instead.
+    Usage follows the prompt: the block marked with cache_control is
+    reported as cache creation on the first call and as a cache read after
+    that, once it is at least MIN_CACHEABLE_TOKENS long.
+
+    Account limits can be emulated too: requests_per_minute and
+    input_tokens_per_minute are enforced like the API does (token buckets
+    with about one second of burst), answering 429 with a retry-after when
+    exceeded; more than `overload_above` concurrent calls get 529.
+
+    messages.stream() answers the same way: `latency` is the time to the
+    first chunk, after which chunks arrive at `tokens_per_second` (None:
+    all at once). stats["streamed_chars"] counts what was actually sent,
+    so closing a stream early shows up as output that was never produced.
+    A request with tools gets a tool_use block with the analysis as input.
+    With probability `malformed_rate` the answer is unusable: prose
+    without JSON, or a tool call with a criterion missing.
+    """
+
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0, error_rate: float = 0.0,
+                 error_status: int = 529, output_tokens: Optional[int] = None, seed: int = 0,
+                 requests_per_minute: Optional[float] = None, input_tokens_per_minute: Optional[float] = None,
+                 overload_above: Optional[int] = None, tokens_per_second: Optional[float] = None,
+                 malformed_rate: float = 0.0):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.output_tokens = output_tokens
+        self.overload_above = overload_above
+        self.tokens_per_second = tokens_per_second
+        self.malformed_rate = malformed_rate
+        self.messages = SimpleNamespace(create=self._create, stream=self._stream)
+
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._cached_prefixes = set()
+        self._limits = {name: {"rate": per_minute / 60.0, "level": max(1.0, per_minute / 60.0),
+                               "updated": time.monotonic()}
+                        for name, per_minute in (("requests", requests_per_minute),
+                                                 ("input_tokens", input_tokens_per_minute)) if per_minute}
+        self.stats = {"calls": 0, "errors": 0, "rate_limited": 0, "overloaded": 0,
+                      "in_flight": 0, "max_in_flight": 0, "streamed_chars": 0, "malformed": 0}
+
+    def _create(self, **request):
+        delay, error = self._begin(request)
+        try:
+            time.sleep(delay)
+            if error is not None:
+                raise error
+            return self._respond(request)
+        finally:
+            self._end()
+
+    def _stream(self, **request) -> 'FakeMessageStream':
+        return FakeMessageStream(self, request)
+
+    def _begin(self, request: Dict):
+        """Count the call and decide its delay and outcome (under the lock, so seeded runs repeat)"""
+        with self._lock:
+            self.stats["calls"] += 1
+            self.stats["in_flight"] += 1
+            self.stats["max_in_flight"] = max(self.stats["max_in_flight"], self.stats["in_flight"])
+            delay = self.latency + self._random.uniform(0, self.jitter)
+
+            if self.overload_above is not None and self.stats["in_flight"] > self.overload_above:
+                self.stats["overloaded"] += 1
+                return 0.0, api_error(529)
+            retry_after = self._check_limits({"requests": 1, "input_tokens": self._uncached_tokens(request)})
+            if retry_after is not None:
+                self.stats["rate_limited"] += 1
+                return 0.0, api_error(429, retry_after=retry_after)
+            if self.error_rate and self._random.random() < self.error_rate:
+                self.stats["errors"] += 1
+                return delay, api_error(self.error_status)
+            return delay, None
+
+    def _check_limits(self, amounts: Dict[str, float]) -> Optional[float]:
+        """Charge the account limits; seconds until there is room again if a limit is exceeded"""
+        now = time.monotonic()
+        retry_after = None
+        for name, bucket in self._limits.items():
+            capacity = max(1.0, bucket["rate"])
+            bucket["level"] = min(capacity, bucket["level"] + (now - bucket["updated"]) * bucket["rate"])
+            bucket["updated"] = now
+            needed = min(amounts[name], capacity)
+            if bucket["level"] < needed:
+                wait = (needed - bucket["level"]) / bucket["rate"]
+                retry_after = max(retry_after or 0.0, wait)
+        if retry_after is None:
+            for name, bucket in self._limits.items():
+                bucket["level"] -= amounts[name]
+        return retry_after
+
+    def _uncached_tokens(self, request: Dict) -> int:
+        """Input tokens that count towards the limit (everything except cache reads)"""
+        tokens = 0
+        for message in request.get("messages", []):
+            content = message["content"]
+            for block in [{"text": content}] if isinstance(content, str) else content:
+                if not (block.get("cache_control") and block["text"] in self._cached_prefixes):
+                    tokens += estimate_tokens(block.get("text", ""))
+        return tokens
+
+    def _end(self):
+        with self._lock:
+            self.stats["in_flight"] -= 1
+
+    def _respond(self, request: Dict):
+        usage = {"input_tokens": 0, "cache_creation_input_tokens": 0, "cache_read_input_tokens": 0}
+        listing_text = ""
+        for message in request.get("messages", []):
+            content = message["content"]
+            blocks = [{"type": "text", "text": content}] if isinstance(content, str) else content
+            for block in blocks:
+                tokens = estimate_tokens(block.get("text", ""))
+                if block.get("cache_control") and tokens >= MIN_CACHEABLE_TOKENS:
+                    with self._lock:
+                        hit = block["text"] in self._cached_prefixes
+                        self._cached_prefixes.add(block["text"])
+                    usage["cache_read_input_tokens" if hit else "cache_creation_input_tokens"] += tokens
+                else:
+                    usage["input_tokens"] += tokens
+                    if not block.get("cache_control"):
+                        listing_text += block.get("text", "")
+
+        with self._lock:
+            malformed = bool(self.malformed_rate) and self._random.random() < self.malformed_rate
+            self.stats["malformed"] += malformed
+        tools = request.get("tools")
+        if tools:
+            analysis = self.analysis(listing_text)
+            if malformed:
+                del analysis["omgeving_kwaliteit"]
+            text = json.dumps(analysis, ensure_ascii=False)
+            content = [SimpleNamespace(type="tool_use", id="toolu_fake", name=tools[0]["name"], input=analysis)]
+            stop_reason = "tool_use"
+        else:
+            text = "Dat is lastig te zeggen zonder foto's." if malformed else self.answer(listing_text)
+            content = [SimpleNamespace(type="text", text=text)]
+            stop_reason = "end_turn"
+        usage["output_tokens"] = self.output_tokens or estimate_tokens(text)
+        return SimpleNamespace(content=content, usage=SimpleNamespace(**usage), stop_reason=stop_reason)
+
+    @classmethod
+    def answer(cls, listing_text: str) -> str:
+        """A plausible model answer: short preamble plus the JSON analysis"""
+        return "Hier is mijn analyse:\n\n" + json.dumps(cls.analysis(listing_text), ensure_ascii=False, indent=4)
+
+    @staticmethod
+    def analysis(listing_text: str) -> Dict:
+        """Scores that follow a few keywords in the listing text"""
+        text = listing_text.lower()
+        signal = sum(word in text for word in _POSITIVE) - sum(word in text for word in _NEGATIVE)
+        base = max(1, min(9, 5 + 2 * signal))
+        analysis = {
+            "natuur_nabijheid": base,
+            "privacy_rust": max(0, base - 1),
+            "omgeving_kwaliteit": base,
+            "authenticiteit": min(10, base + 1),
+            "bebouwing": base,
+            "reasoning": "Op basis van type en omgeving " + ("lijkt dit op de JA voorbeelden." if signal > 0
+                                                              else "lijkt dit op de NEE voorbeelden."),
+            "similar_to": "ja" if signal > 0 else "nee",
+            "key_observations": ["type", "omgeving", "privacy"],
+        }
+        return analysis
+
+
+class FakeAsyncAnthropic(FakeAnthropic):
+    """Stand-in for anthropic.AsyncAnthropic; waits with asyncio.sleep so calls overlap"""
+
+    async def _create(self, **request):
+        delay, error = self._begin(request)
+        try:
+            await asyncio.sleep(delay)
+            if error is not None:
+                raise error
+            return self._respond(request)
+        finally:
+            self._end()
+
+    def _stream(self, **request) -> 'FakeAsyncMessageStream':
+        return FakeAsyncMessageStream(self, request)
+
+
+class FakeMessageStream:
+    """What FakeAnthropic.messages.stream() returns: a context manager with text_stream, like the SDK's"""
+
+    def __init__(self, client: FakeAnthropic, request: Dict):
+        self.client = client
+        self.request = request
+        self.message = None
+        self.current_message_snapshot = None
+        self.text_stream = None
+
+    def _started(self, message):
+        # Like the SDK: the snapshot carries the input usage from message_start, output only at the end
+        self.message = message
+        self.current_message_snapshot = SimpleNamespace(
+            content=[], stop_reason=None, usage=SimpleNamespace(**dict(vars(message.usage), output_tokens=1)))
+
+    def _chunks(self):
+        text = self.message.content[0].text
+        return [text[i:i + STREAM_CHUNK_CHARS] for i in range(0, len(text), STREAM_CHUNK_CHARS)]
+
+    def _sent(self, chunk: str):
+        with self.client._lock:
+            self.client.stats["streamed_chars"] += len(chunk)
+
+    def __enter__(self):
+        self._started(self.client._create(**self.request))
+        self.text_stream = self._iter_text()
+        return self
+
+    def __exit__(self, *exc):
+        self.text_stream.close()
+        return False
+
+    def _iter_text(self):
+        for chunk in self._chunks():
+            if self.client.tokens_per_second:
+                time.sleep(1 / self.client.tokens_per_second)
+            self._sent(chunk)
+            yield chunk
+
+    def get_final_message(self):
+        for _ in self.text_stream:
+            pass
+        return self.message
+
+
+class FakeAsyncMessageStream(FakeMessageStream):
+    """Async counterpart of FakeMessageStream"""
+
+    async def __aenter__(self):
+        self._started(await self.client._create(**self.request))
+        self.text_stream = self._aiter_text()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.text_stream.aclose()
+        return False
+
+    async def _aiter_text(self):
+        for chunk in self._chunks():
+            if self.client.tokens_per_second:
+                await asyncio.sleep(1 / self.client.tokens_per_second)
+            self._sent(chunk)
+            yield chunk
+
+    async def get_final_message(self):
+        async for _ in self.text_stream:
+            pass
+        return self.message
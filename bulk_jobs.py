@@ -0,0 +1,220 @@
+"""
+Bulk scoring jobs voor de web interface
+Scoort een geüploade lijst URLs op een achtergrond thread, los van de Streamlit reruns
+"""
+
+import asyncio
+import csv
+import io
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from compact_results import CompactResult, ResultTable
+from natuurhuisje_agent_v2 import ImprovedNatuurhuisjeAgent, ScoringResult
+
+URL_COLUMNS = ('url', 'urls', 'link', 'listing')
+
+
+def read_url_csv(content: bytes) -> List[str]:
+    """
+    URLs from an uploaded CSV, in order and without duplicates.
+
+    Takes the column named url/link/listing (any case), otherwise the
+    first column whose values look like URLs; a file without a header
+    row works too.
+    """
+    text = content.decode('utf-8-sig', errors='replace')
+    rows = [row for row in csv.reader(io.StringIO(text)) if any(cell.strip() for cell in row)]
+    if not rows:
+        return []
+
+    header = [cell.strip().lower() for cell in rows[0]]
+    column = next((header.index(name) for name in URL_COLUMNS if name in header), None)
+    if column is None:
+        # No named column: the first one holding a URL in the first rows (a header row has none)
+        column = next((i for row in rows[:2] for i, cell in enumerate(row) if cell.strip().startswith('http')), 0)
+
+    # Header and other non-URL cells drop out here
+    urls = (row[column].strip() for row in rows if len(row) > column)
+    return list(dict.fromkeys(url for url in urls if url.startswith('http')))
+
+
+class BulkJob:
+    """
+    One uploaded URL list being scored.
+
+    The manager's event loop adds results as listings finish, into a
+    ResultTable (criterion scores as arrays, so an upload of a few hundred
+    thousand URLs stays small); the UI only reads progress() and rows(), so
+    a rerun never waits for or repeats any scoring.
+    """
+
+    def __init__(self, name: str, urls: List[str], criteria: Iterable[str]):
+        self.id = uuid.uuid4().hex[:12]
+        self.name = name
+        self.urls = urls
+        self.results = ResultTable(criteria)
+        self._rows: Dict[str, CompactResult] = {}  # url -> its row in results
+        self.reused = 0
+        self.started = time.time()
+        self.finished: Optional[float] = None
+        self.error: Optional[str] = None
+        self._future = None
+
+    @property
+    def running(self) -> bool:
+        return self.finished is None
+
+    def cancel(self):
+        if self._future is not None:
+            self._future.cancel()
+
+    def _done(self, future):
+        # Also runs for a job cancelled before it started, when _run never gets to its finally
+        if future.cancelled():
+            self.error = "Geannuleerd"
+        if self.finished is None:
+            self.finished = time.time()
+
+    def add(self, result) -> CompactResult:
+        row = self.results.append(result)
+        self._rows[row.url] = row
+        return row
+
+    def result(self, url: str) -> Optional[CompactResult]:
+        return self._rows.get(url)
+
+    def progress(self) -> Dict:
+        """Done, failed and reused counts, throughput (listings/s, excluding reused ones) and ETA in seconds"""
+        done = len(self._rows)
+        failed = self.results.failed
+        elapsed = (self.finished or time.time()) - self.started
+        scored = done - self.reused
+        rate = scored / elapsed if elapsed > 0 else 0.0
+        remaining = len(self.urls) - done
+        return {
+            "total": len(self.urls),
+            "done": done,
+            "failed": failed,
+            "reused": self.reused,
+            "elapsed": elapsed,
+            "rate": rate,
+            "eta": remaining / rate if rate > 0 and self.running else None,
+        }
+
+    def rows(self, criteria: Dict[str, Dict]) -> List[Dict]:
+        """Results table in input order, one row per finished URL"""
+        rows = []
+        for url in self.urls:
+            result = self._rows.get(url)
+            if result is None:
+                continue
+            row = {
+                "url": url,
+                "categorie": result.category,
+                "score": round(result.confidence_score, 1),
+                "vergelijkbaar_met": result.similar_to,
+                "bron": result.source,
+            }
+            row.update({criterion: result.breakdown.get(criterion) for criterion in criteria})
+            row["redenering"] = result.reasoning
+            row["fout"] = result.error or ""
+            rows.append(row)
+        return rows
+
+    def to_csv(self, criteria: Dict[str, Dict]) -> bytes:
+        rows = self.rows(criteria)
+        output = io.StringIO()
+        if rows:
+            writer = csv.DictWriter(output, fieldnames=list(rows[0]))
+            writer.writeheader()
+            writer.writerows(rows)
+        return output.getvalue().encode('utf-8')
+
+
+class BulkJobManager:
+    """
+    Runs BulkJobs on one background thread with its own event loop.
+
+    One loop for all jobs, so the agent's async Anthropic and HTTP clients
+    stay bound to a single loop; each job scores through analyze_many with
+    `concurrency` workers. Model results (not errors or neutral fallbacks
+    for an unparseable answer) are remembered per URL and version (prompt,
+    training data, model), so a URL that was scored before (in this or an
+    earlier job) is not fetched or scored again while nothing changed; the
+    agent's result cache covers the rest. At most `max_scored` URLs are
+    remembered (least recently used go first), and finished jobs are
+    dropped `job_ttl` seconds after they end. Create it once per process
+    (st.cache_resource), not per session.
+    """
+
+    def __init__(self, agent: ImprovedNatuurhuisjeAgent, concurrency: int = 8, job_ttl: float = 3600.0,
+                 max_scored: int = 100_000):
+        self.agent = agent
+        self.concurrency = concurrency
+        self.job_ttl = job_ttl
+        self.max_scored = max_scored
+        self.jobs: Dict[str, BulkJob] = {}
+        # url -> (result version, result); own objects, so they do not keep a job's table alive
+        self.scored: 'OrderedDict[str, Tuple[str, ScoringResult]]' = OrderedDict()
+        self._lock = threading.Lock()
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="bulk-jobs", daemon=True)
+        self._thread.start()
+
+    def submit(self, name: str, urls: List[str]) -> BulkJob:
+        """Start scoring `urls` in the background and return the job right away"""
+        job = BulkJob(name, urls, self.agent.criteria)
+        version = self.agent._result_version()
+        with self._lock:
+            self._evict_jobs()
+            self.jobs[job.id] = job
+            for url in urls:
+                scored_version, result = self.scored.get(url, (None, None))
+                if scored_version == version:
+                    self.scored.move_to_end(url)
+                    job.add(result)
+                    job.reused += 1
+        pending = [url for url in urls if job.result(url) is None]
+        job._future = asyncio.run_coroutine_threadsafe(self._run(job, pending), self._loop)
+        job._future.add_done_callback(job._done)
+        return job
+
+    def get(self, job_id: str) -> Optional[BulkJob]:
+        with self._lock:
+            self._evict_jobs()
+            return self.jobs.get(job_id)
+
+    def discard(self, job_id: str):
+        """Forget a job (cancelled first if it is still running)"""
+        with self._lock:
+            job = self.jobs.pop(job_id, None)
+        if job is not None:
+            job.cancel()
+
+    def _evict_jobs(self):
+        cutoff = time.time() - self.job_ttl
+        for job_id in [job_id for job_id, job in self.jobs.items() if job.finished and job.finished < cutoff]:
+            del self.jobs[job_id]
+
+    def _remember(self, result: ScoringResult):
+        with self._lock:
+            self.scored[result.url] = (self.agent._result_version(), result)
+            self.scored.move_to_end(result.url)
+            while len(self.scored) > self.max_scored:
+                self.scored.popitem(last=False)
+
+    async def _run(self, job: BulkJob, urls: List[str]):
+        try:
+            async for result in self.agent.analyze_many(urls, self.concurrency):
+                job.add(result)
+                # Like the agent's result cache: a neutral fallback must not be handed out again
+                if not result.error and result.source != "fallback":
+                    self._remember(result)
+        except Exception as e:
+            job.error = f"{type(e).__name__}: {e}"
+        finally:
+            job.finished = time.time()
@@ -0,0 +1,228 @@
+"""
+Compacte, kolomgewijze opslag van ScoringResults voor grote runs
+Criterium scores in vaste-positie float arrays, gedeelde labels en optioneel de redenering op schijf
+"""
+
+import math
+import tempfile
+import threading
+from array import array
+from typing import Dict, Iterable, Iterator, List, Optional
+
+from natuurhuisje_agent_v2 import ScoringResult, intern_label
+
+
+class ResultTable:
+    """
+    Append-only table of scoring results, stored per column.
+
+    Criterion scores go into one flat array('d') with a fixed slot per
+    criterion, in the order of `criteria` (normally agent.criteria), so a
+    row costs 8 bytes per criterion instead of a breakdown dict with its
+    own keys and float objects. A criterion missing from a breakdown is
+    stored as NaN and left out again when read back; a criterion that is
+    not in `criteria` raises ValueError. category, similar_to and source
+    are codes into one table of interned labels; error and derived_from are
+    kept only for the rows that have them.
+
+    Reasoning is kept in memory by default. With reasoning_on_disk=True it
+    is appended to an anonymous temporary file (in `directory`, default the
+    system temp dir) instead and read back per row when accessed, so only
+    its offset and length stay in memory.
+
+    Indexing and iterating give CompactResult views with the attributes of
+    a ScoringResult. One thread may append while others read: a row counts
+    in len() only once all its columns are written.
+    """
+
+    def __init__(self, criteria: Iterable[str], reasoning_on_disk: bool = False, directory: Optional[str] = None):
+        self.criteria = tuple(criteria)
+        self._slots = {criterion: i for i, criterion in enumerate(self.criteria)}
+        self._scores = array('d')
+        self._confidence = array('d')
+        self._labels: List[Optional[str]] = [None]  # Code 0 is None
+        self._label_codes: Dict[str, int] = {}
+        self._category = array('I')
+        self._similar_to = array('I')
+        self._source = array('I')
+        self._urls: List[Optional[str]] = []
+        self._errors: Dict[int, str] = {}
+        self._derived_from: Dict[int, str] = {}
+        self._flags = bytearray()  # is_natuurhuisje; written last, so its length is the row count
+
+        self._reasoning: Optional[List[str]] = None
+        self._file = None
+        self._file_lock = threading.Lock()
+        if not reasoning_on_disk:
+            self._reasoning = []
+        else:
+            self._file = tempfile.TemporaryFile(dir=directory)
+            self._reasoning_offset = array('q')
+            self._reasoning_length = array('I')
+            self._file_size = 0
+
+    def append(self, result) -> 'CompactResult':
+        """Add a ScoringResult (or anything with its attributes, e.g. a CompactResult); returns its row"""
+        row = len(self._flags)
+        scores = [math.nan] * len(self.criteria)
+        for criterion, score in result.breakdown.items():
+            slot = self._slots.get(criterion)
+            if slot is None:
+                raise ValueError(f"onbekend criterium {criterion!r} (tabel heeft {', '.join(self.criteria)})")
+            scores[slot] = score
+        self._scores.extend(scores)
+        self._confidence.append(result.confidence_score)
+        self._category.append(self._code(result.category))
+        self._similar_to.append(self._code(result.similar_to))
+        self._source.append(self._code(result.source))
+        self._urls.append(result.url)
+        if result.error is not None:
+            self._errors[row] = result.error
+        if result.derived_from is not None:
+            self._derived_from[row] = result.derived_from
+        self._store_reasoning(result.reasoning)
+        self._flags.append(1 if result.is_natuurhuisje else 0)
+        return CompactResult(self, row)
+
+    def extend(self, results: Iterable) -> None:
+        for result in results:
+            self.append(result)
+
+    def __len__(self) -> int:
+        return len(self._flags)
+
+    def __getitem__(self, row: int) -> 'CompactResult':
+        count = len(self._flags)
+        if row < 0:
+            row += count
+        if not 0 <= row < count:
+            raise IndexError("ResultTable index out of range")
+        return CompactResult(self, row)
+
+    def __iter__(self) -> Iterator['CompactResult']:
+        for row in range(len(self._flags)):
+            yield CompactResult(self, row)
+
+    def column(self, criterion: str) -> array:
+        """One criterion's score for every row, NaN where it was missing"""
+        width = len(self.criteria)
+        return self._scores[self._slots[criterion]:len(self._flags) * width:width]
+
+    def confidence_scores(self) -> array:
+        return self._confidence[:len(self._flags)]
+
+    @property
+    def failed(self) -> int:
+        """Rows with an error"""
+        return len(self._errors)
+
+    def close(self):
+        """Drop the reasoning file (reasoning_on_disk); the rows' reasoning is unreadable afterwards"""
+        if self._file is not None:
+            self._file.close()
+
+    def _code(self, label: Optional[str]) -> int:
+        if label is None:
+            return 0
+        code = self._label_codes.get(label)
+        if code is None:
+            code = self._label_codes[label] = len(self._labels)
+            self._labels.append(intern_label(label))
+        return code
+
+    def _store_reasoning(self, reasoning: str):
+        if self._reasoning is not None:
+            self._reasoning.append(reasoning)
+            return
+        data = reasoning.encode('utf-8')
+        with self._file_lock:
+            self._file.seek(self._file_size)
+            self._file.write(data)
+            self._reasoning_offset.append(self._file_size)
+            self._reasoning_length.append(len(data))
+            self._file_size += len(data)
+
+    def _read_reasoning(self, row: int) -> str:
+        if self._reasoning is not None:
+            return self._reasoning[row]
+        length = self._reasoning_length[row]
+        if not length:
+            return ""
+        with self._file_lock:
+            self._file.seek(self._reasoning_offset[row])
+            return self._file.read(length).decode('utf-8')
+
+
+class CompactResult:
+    """
+    Read-only view of one ResultTable row, with the attributes of a
+    ScoringResult. breakdown is built on access (in criteria order);
+    to_result() gives a regular, mutable ScoringResult.
+    """
+
+    __slots__ = ('_table', '_row')
+
+    def __init__(self, table: ResultTable, row: int):
+        self._table = table
+        self._row = row
+
+    @property
+    def is_natuurhuisje(self) -> bool:
+        return bool(self._table._flags[self._row])
+
+    @property
+    def confidence_score(self) -> float:
+        return self._table._confidence[self._row]
+
+    @property
+    def category(self) -> str:
+        return self._table._labels[self._table._category[self._row]]
+
+    @property
+    def reasoning(self) -> str:
+        return self._table._read_reasoning(self._row)
+
+    @property
+    def breakdown(self) -> Dict[str, float]:
+        table = self._table
+        start = self._row * len(table.criteria)
+        scores = table._scores[start:start + len(table.criteria)]
+        return {criterion: score for criterion, score in zip(table.criteria, scores) if not math.isnan(score)}
+
+    @property
+    def similar_to(self) -> Optional[str]:
+        return self._table._labels[self._table._similar_to[self._row]]
+
+    @property
+    def url(self) -> Optional[str]:
+        return self._table._urls[self._row]
+
+    @property
+    def error(self) -> Optional[str]:
+        return self._table._errors.get(self._row)
+
+    @property
+    def source(self) -> str:
+        return self._table._labels[self._table._source[self._row]]
+
+    @property
+    def derived_from(self) -> Optional[str]:
+        return self._table._derived_from.get(self._row)
+
+    def to_result(self) -> ScoringResult:
+        return ScoringResult(
+            is_natuurhuisje=self.is_natuurhuisje,
+            confidence_score=self.confidence_score,
+            category=self.category,
+            reasoning=self.reasoning,
+            breakdown=self.breakdown,
+            similar_to=self.similar_to,
+            url=self.url,
+            error=self.error,
+            source=self.source,
+            derived_from=self.derived_from,
+        )
+
+    def __repr__(self) -> str:
+        return f"Compact{self.to_result()!r}"
+
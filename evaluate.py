@@ -0,0 +1,267 @@
+"""
+Evaluatie van prompt, model en scoring op de gelabelde voorbeelden in training_data.csv
+Leave-one-out, parallel, met opname en offline replay van de ruwe model antwoorden
+
+Usage:
+    python evaluate.py --record responses.jsonl              # Live, antwoorden worden opgenomen
+    python evaluate.py --replay responses.jsonl              # Offline, zonder API calls
+    python evaluate.py --few-shot nearest --concurrency 16 -o eval_report.json
+"""
+
+import asyncio
+import dataclasses
+import hashlib
+import json
+import math
+import threading
+import time
+from types import SimpleNamespace
+from typing import Dict, Iterable, List, Optional
+
+from natuurhuisje_agent_v2 import USAGE_FIELDS, ImprovedNatuurhuisjeAgent, LabeledExample, TrainingState, message_text
+
+
+def request_key(request: Dict) -> str:
+    """Everything that determines the model's answer, hashed"""
+    payload = json.dumps({field: request.get(field) for field in ("model", "max_tokens", "system", "messages")},
+                         sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def percentile(values: List[float], q: float) -> float:
+    """Nearest-rank percentile, 0.0 for no values"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, math.ceil(q / 100 * len(ordered)) - 1))]
+
+
+class RecordingClient:
+    """
+    AsyncAnthropic wrapper that appends every answer to a JSONL file.
+
+    Each line holds the request key, the model, the raw response text, its
+    usage and how long the call took, so ReplayClient can serve it again.
+    """
+
+    def __init__(self, client, path: str):
+        self.client = client
+        self.path = path
+        self.seconds: List[float] = []
+        self._lock = threading.Lock()
+        self.messages = SimpleNamespace(create=self._create)
+
+    async def _create(self, **request):
+        started = time.perf_counter()
+        message = await self.client.messages.create(**request)
+        seconds = time.perf_counter() - started
+        usage = getattr(message, "usage", None)
+        entry = {
+            "key": request_key(request),
+            "model": request.get("model"),
+            "text": message_text(message),
+            "usage": {field: getattr(usage, field, 0) or 0 for field in USAGE_FIELDS},
+            "stop_reason": getattr(message, "stop_reason", None),
+            "seconds": seconds,
+        }
+        with self._lock:
+            self.seconds.append(seconds)
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(entry, ensure_ascii=False) + '\n')
+        return message
+
+
+class ReplayClient:
+    """
+    AsyncAnthropic stand-in that answers from a RecordingClient file.
+
+    Answers come back immediately with the recorded usage; `seconds` holds
+    the recorded latencies of the answers served. A request that was never
+    recorded (the prompt changed) raises KeyError.
+    """
+
+    def __init__(self, path: str):
+        self.responses: Dict[str, Dict] = {}
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    entry = json.loads(line)
+                    self.responses[entry["key"]] = entry  # Latest recording wins
+        self.seconds: List[float] = []
+        self.messages = SimpleNamespace(create=self._create)
+
+    async def _create(self, **request):
+        entry = self.responses.get(request_key(request))
+        if entry is None:
+            raise KeyError("geen opgenomen antwoord voor deze prompt (prompt gewijzigd? neem opnieuw op)")
+        self.seconds.append(entry["seconds"])
+        return SimpleNamespace(
+            content=[SimpleNamespace(type="text", text=entry["text"])],
+            usage=SimpleNamespace(**entry["usage"]),
+            stop_reason=entry.get("stop_reason"),
+        )
+
+
+class Evaluation:
+    """
+    Score every labeled example in the agent's training data, leave-one-out.
+
+    Each example is scored with a training state that does not contain it,
+    so it can never be its own few-shot example: in "fixed" mode the prefix
+    is rebuilt only for the examples that are part of it, in "nearest" mode
+    the example is removed from a copy of the similarity index. The reduced
+    set gets its own fingerprint, so its scores never land under (or come
+    from) the full set's cache and near-duplicate keys. Pass an
+    agent without result cache, near-duplicate index or pre-classifier, so
+    every listing reaches the model.
+    """
+
+    def __init__(self, agent: ImprovedNatuurhuisjeAgent, concurrency: int = 8):
+        self.agent = agent
+        self.concurrency = concurrency
+
+    def examples(self) -> List[LabeledExample]:
+        return [ex for examples in self.agent.training_examples.values() for ex in examples]
+
+    def training_without(self, example: LabeledExample) -> TrainingState:
+        """The agent's training state minus `example`"""
+        base = self.agent._training
+        examples = {category: [ex for ex in exs if ex is not example] for category, exs in base.examples.items()}
+        in_prefix = (self.agent.few_shot == "fixed" and
+                     example in base.examples.get(example.category, [])[:self.agent.examples_per_category])
+        index = None
+        if base.index is not None:
+            index = base.index.copy()
+            index.remove(example.url)
+        return dataclasses.replace(
+            base, examples=examples, index=index, fingerprint=self.agent._fingerprint_examples(examples),
+            prefix=self.agent._build_static_prefix(examples) if in_prefix else base.prefix,
+        )
+
+    async def run(self) -> List[Dict]:
+        """One row per example: url, label, predicted, score, seconds and error"""
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async with self.agent.fetcher.async_client(self.concurrency) as http:
+            async def score(example: LabeledExample) -> Dict:
+                async with semaphore:
+                    started = time.perf_counter()
+                    try:
+                        html_content = await self.agent.fetcher.afetch(http, example.url)
+                        listing_data = await self.agent._aextract_listing_data(html_content)
+                        result = await self.agent._ascore_listing_data(
+                            example.url, listing_data, training=self.training_without(example))
+                        error = None
+                    except Exception as e:
+                        result, error = None, f"{type(e).__name__}: {e}"
+                    return {
+                        "url": example.url,
+                        "label": example.category,
+                        "predicted": None if result is None else ("ja" if result.is_natuurhuisje else "nee"),
+                        "score": None if result is None else result.confidence_score,
+                        "seconds": time.perf_counter() - started,
+                        "error": error,
+                    }
+
+            return await asyncio.gather(*(score(example) for example in self.examples()))
+
+    def report(self, rows: List[Dict], model_seconds: Optional[List[float]] = None) -> Dict:
+        """Accuracy, confusion matrix, latency percentiles, token usage and invalid answers"""
+        scored = [row for row in rows if row["error"] is None]
+        confusion = {actual: {predicted: 0 for predicted in ("ja", "nee")} for actual in ("ja", "nee")}
+        for row in scored:
+            confusion[row["label"]][row["predicted"]] += 1
+        correct = confusion["ja"]["ja"] + confusion["nee"]["nee"]
+        predicted_ja = confusion["ja"]["ja"] + confusion["nee"]["ja"]
+        actual_ja = confusion["ja"]["ja"] + confusion["ja"]["nee"]
+
+        latencies = [row["seconds"] for row in scored]
+        report = {
+            "examples": len(rows),
+            "scored": len(scored),
+            "errors": len(rows) - len(scored),
+            "accuracy": correct / len(scored) if scored else 0.0,
+            "precision_ja": confusion["ja"]["ja"] / predicted_ja if predicted_ja else 0.0,
+            "recall_ja": confusion["ja"]["ja"] / actual_ja if actual_ja else 0.0,
+            "confusion": confusion,
+            "latency_seconds": {f"p{q}": percentile(latencies, q) for q in (50, 90, 99)},
+            "usage": self.agent.usage_report(),
+            "parsing": self.agent.parse_report(),
+        }
+        if model_seconds:
+            report["model_seconds"] = {f"p{q}": percentile(model_seconds, q) for q in (50, 90, 99)}
+        if self.agent.cascade_model is not None:
+            report["cascade"] = self.agent.cascade_report()
+        return report
+
+
+def main(argv: Optional[Iterable[str]] = None):
+    import argparse
+    from page_fetcher import PageFetcher
+
+    parser = argparse.ArgumentParser(description="Evalueer de agent leave-one-out op training_data.csv")
+    parser.add_argument('--training-file', default='training_data.csv')
+    parser.add_argument('--few-shot', choices=('fixed', 'nearest'), default='fixed')
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--summary-tokens', type=int, default=200, help="0: oude [:500] afkapping")
+    parser.add_argument('--cascade-model')
+    parser.add_argument('--output-mode', choices=('text', 'tool'), default='text')
+    parser.add_argument('--reasoning-chars', type=int, help="maximale lengte van de redenering")
+    parser.add_argument('--cascade-band', type=float, default=10.0)
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument('--record', metavar='JSONL', help="neem de ruwe antwoorden op in dit bestand")
+    mode.add_argument('--replay', metavar='JSONL', help="gebruik opgenomen antwoorden, zonder API calls")
+    parser.add_argument('-o', '--output', help="schrijf rapport en resultaten per listing als JSON")
+    args = parser.parse_args(argv)
+
+    client = None
+    if args.replay:
+        client = ReplayClient(args.replay)
+    # A replay run must not touch the network for pages either: serve everything from the page cache
+    fetcher = PageFetcher(offline=True) if args.replay else PageFetcher()
+    agent = ImprovedNatuurhuisjeAgent(
+        training_file=args.training_file, few_shot=args.few_shot, fetcher=fetcher, async_client=client,
+        summary_tokens=args.summary_tokens or None, cascade_model=args.cascade_model,
+        cascade_band=args.cascade_band, output_mode=args.output_mode, reasoning_chars=args.reasoning_chars,
+        reload_interval=None, snapshot=False,
+    )
+    if args.record:
+        client = agent.async_client = RecordingClient(agent.async_client, args.record)
+
+    evaluation = Evaluation(agent, args.concurrency)
+    started = time.perf_counter()
+    rows = asyncio.run(evaluation.run())
+    report = evaluation.report(rows, client.seconds if client is not None else None)
+    report["seconds"] = time.perf_counter() - started
+
+    confusion = report["confusion"]
+    print(f"✅ {report['scored']}/{report['examples']} voorbeelden gescoord in {report['seconds']:.1f}s"
+          f"{' (replay)' if args.replay else ''}")
+    print(f"   Nauwkeurigheid: {report['accuracy']:.1%}  (precisie JA {report['precision_ja']:.1%}, "
+          f"recall JA {report['recall_ja']:.1%})")
+    print(f"   {'':>12}{'voorspeld JA':>14}{'voorspeld NEE':>15}")
+    for actual in ("ja", "nee"):
+        print(f"   {'echt ' + actual.upper():>12}{confusion[actual]['ja']:>14}{confusion[actual]['nee']:>15}")
+    latency = report["latency_seconds"]
+    print(f"   Latency p50/p90/p99: {latency['p50']:.2f}/{latency['p90']:.2f}/{latency['p99']:.2f}s")
+    if "model_seconds" in report:
+        model = report["model_seconds"]
+        print(f"   Model latency{' (opgenomen)' if args.replay else ''} p50/p90/p99: "
+              f"{model['p50']:.2f}/{model['p90']:.2f}/{model['p99']:.2f}s")
+    usage = report["usage"]
+    print(f"   Tokens: {usage['total_input_tokens']} input ({usage['cached_input_ratio']:.0%} uit cache), "
+          f"{usage['output_tokens']} output over {usage['requests']} calls")
+    parsing = report["parsing"]
+    print(f"   Ongeldige antwoorden: {parsing['invalid_rate']:.1%} ({parsing['retries']} opnieuw gevraagd, "
+          f"{parsing['fallbacks']} fallback)")
+    for row in rows:
+        if row["error"]:
+            print(f"   ⚠️  {row['url']}: {row['error']}")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({"args": vars(args), "report": report, "rows": rows}, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == '__main__':
+    main()
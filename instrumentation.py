@@ -0,0 +1,172 @@
+"""
+Instrumentatie voor de Natuurhuisje Agent
+Tijd per stap (fetch, extract, prompt, model, parse, score), token telling en events, exporteerbaar als Prometheus tekst
+"""
+
+import bisect
+import threading
+import time
+from typing import Dict, List
+
+# Upper bounds in seconds; the last bucket (+Inf) catches everything slower
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+class Histogram:
+    """Cumulative-bucket histogram in the Prometheus style"""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q: float) -> float:
+        """Upper bound of the bucket holding the q-th observation"""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets + (float('inf'),), self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return float('inf')
+
+    def snapshot(self) -> Dict:
+        return {
+            "count": self.count,
+            "sum": self.sum,
+            "mean": self.sum / self.count if self.count else 0.0,
+            "p50": self.quantile(0.5),
+            "p95": self.quantile(0.95),
+            "buckets": dict(zip([str(b) for b in self.buckets] + ["+Inf"], self.counts)),
+        }
+
+
+class _Stage:
+    """Context manager that times one stage into a Metrics histogram"""
+
+    __slots__ = ("metrics", "name", "started")
+
+    def __init__(self, metrics: 'Metrics', name: str):
+        self.metrics = metrics
+        self.name = name
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.metrics.observe(self.name, time.perf_counter() - self.started)
+        return False
+
+
+class Metrics:
+    """
+    In-process metrics for the agent's hot path.
+
+    stage(name) times a block into a per-stage histogram; count(name, n)
+    increments a counter (tokens, retries, fallback parses, ...).
+    snapshot() returns everything as a dict, to_prometheus() as text in the
+    Prometheus exposition format.
+    """
+
+    enabled = True
+
+    def __init__(self, namespace: str = 'natuurhuisje', buckets=DEFAULT_BUCKETS):
+        self.namespace = namespace
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._stages: Dict[str, Histogram] = {}
+        self._counters: Dict[str, float] = {}
+
+    def stage(self, name: str) -> _Stage:
+        return _Stage(self, name)
+
+    def observe(self, stage: str, seconds: float):
+        with self._lock:
+            histogram = self._stages.get(stage)
+            if histogram is None:
+                histogram = self._stages[stage] = Histogram(self.buckets)
+            histogram.observe(seconds)
+
+    def count(self, name: str, amount: float = 1):
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + amount
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            return {
+                "stages": {name: h.snapshot() for name, h in self._stages.items()},
+                "counters": dict(self._counters),
+            }
+
+    def reset(self):
+        with self._lock:
+            self._stages.clear()
+            self._counters.clear()
+
+    def to_prometheus(self) -> str:
+        """All metrics in the Prometheus text exposition format"""
+        ns = self.namespace
+        lines: List[str] = []
+        with self._lock:
+            if self._stages:
+                lines.append(f"# HELP {ns}_stage_seconds Wall time per analysis stage")
+                lines.append(f"# TYPE {ns}_stage_seconds histogram")
+                for stage, histogram in sorted(self._stages.items()):
+                    cumulative = 0
+                    for bound, count in zip(list(histogram.buckets) + ["+Inf"], histogram.counts):
+                        cumulative += count
+                        lines.append(f'{ns}_stage_seconds_bucket{{stage="{stage}",le="{bound}"}} {cumulative}')
+                    lines.append(f'{ns}_stage_seconds_sum{{stage="{stage}"}} {histogram.sum}')
+                    lines.append(f'{ns}_stage_seconds_count{{stage="{stage}"}} {histogram.count}')
+
+            for name, value in sorted(self._counters.items()):
+                lines.append(f"# TYPE {ns}_{name}_total counter")
+                lines.append(f"{ns}_{name}_total {value}")
+        return "\n".join(lines) + "\n"
+
+
+class _NullStage:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+class NullMetrics:
+    """Drop-in for Metrics that records nothing; used when instrumentation is off"""
+
+    enabled = False
+    _stage = _NullStage()
+
+    def stage(self, name: str) -> _NullStage:
+        return self._stage
+
+    def observe(self, stage: str, seconds: float):
+        pass
+
+    def count(self, name: str, amount: float = 1):
+        pass
+
+    def snapshot(self) -> Dict:
+        return {"stages": {}, "counters": {}}
+
+    def reset(self):
+        pass
+
+    def to_prometheus(self) -> str:
+        return ""
+
+
+NULL_METRICS = NullMetrics()
@@ -0,0 +1,130 @@
+"""
+Compacte samenvatting van een listing voor de prompt
+Rangschikt zinnen op relevantie voor de criteria, ontdubbelt herhaalde tekst en past binnen een token budget
+"""
+
+import re
+from typing import Dict, Iterable, List, Tuple
+
+from prescreen import NEGATIVE_KEYWORDS, POSITIVE_KEYWORDS
+from rate_limiter import CHARS_PER_TOKEN
+
+# Signals per criterion, on top of the words in each criterion's description.
+# Negative signals count as relevant too: "naast de receptie" matters as much as "midden in het bos".
+CRITERION_TERMS = {
+    "natuur_nabijheid": ('natuur', 'midden in', 'aan de rand', 'grenst', 'wandel', 'fiets', 'uitzicht',
+                         'loopafstand', 'op het terrein'),
+    "privacy_rust": ('vrijstaand', 'privacy', 'rust', 'stil', 'afgelegen', 'buren', 'kleinschalig',
+                     'omheind', 'eigen tuin', 'geen inkijk'),
+    "omgeving_kwaliteit": ('bos', 'heide', 'duinen', 'strand', 'bergen', 'natuurgebied', 'weiland',
+                           'rivier', 'meer', 'nationaal park', 'polder', 'water'),
+    "authenticiteit": ('boomhut', 'blokhut', 'houten', 'boerderij', 'hut', 'authentiek', 'vakantiepark',
+                       'bungalowpark', 'camping', 'receptie', 'animatie', 'chalet'),
+    "bebouwing": ('centrum', 'dorp', 'stad', 'winkels', 'restaurant', 'woonwijk', 'drukte', 'snelweg',
+                  'appartement', 'zwembad', 'speeltuin'),
+}
+KEYWORD_TERMS = POSITIVE_KEYWORDS + NEGATIVE_KEYWORDS  # Prescreener signals, relevant to every criterion
+
+_SENTENCE_END = re.compile(r'(?<=[.!?])\s+|\s*\n+\s*')
+_WORD = re.compile(r'\w+', re.UNICODE)
+_STOPWORDS = frozenset(('van', 'het', 'een', 'met', 'tot', 'voor', 'mate', 'en', 'vs', 'standaard'))
+
+MIN_SENTENCE_WORDS = 3
+DUPLICATE_OVERLAP = 0.8  # Word-set Jaccard above which a sentence counts as a repeat
+
+
+def estimate_tokens(text: str) -> int:
+    """Local token estimate, same ratio as the rate limiter uses"""
+    return int(len(text) / CHARS_PER_TOKEN) + 1 if text else 0
+
+
+def split_sentences(text: str) -> List[str]:
+    return [sentence.strip() for sentence in _SENTENCE_END.split(text) if sentence and sentence.strip()]
+
+
+def criteria_terms(criteria: Dict[str, Dict]) -> Dict[str, float]:
+    """Term -> weight: CRITERION_TERMS plus description words, weighted by the criterion's weight"""
+    total = sum(config["weight"] for config in criteria.values()) or 1.0
+    weights: Dict[str, float] = {}
+    for name, config in criteria.items():
+        description_words = [word for word in _WORD.findall(config.get("description", "").lower())
+                             if len(word) > 3 and word not in _STOPWORDS]
+        for term in set(CRITERION_TERMS.get(name, ())) | set(description_words):
+            weights[term] = weights.get(term, 0.0) + config["weight"] / total
+    for term in KEYWORD_TERMS:
+        weights[term] = max(weights.get(term, 0.0), 0.2)
+    return weights
+
+
+class ListingSummarizer:
+    """
+    Pack the most relevant sentences of a listing into a token budget.
+
+    Description and location text are split into sentences; exact and near
+    repeats (word-set Jaccard >= DUPLICATE_OVERLAP) and fragments shorter
+    than MIN_SENTENCE_WORDS are dropped. Each sentence is scored by the
+    weighted criteria terms it contains, with a small bonus for coming
+    early, and sentences are taken best-first while they fit the budget.
+    The kept sentences are put back in page order per field, so the text
+    still reads naturally. Text that already fits is returned as is.
+    """
+
+    def __init__(self, criteria: Dict[str, Dict], token_budget: int = 200):
+        self.token_budget = token_budget
+        self.weights = criteria_terms(criteria)
+        # One pass per sentence; terms match at word starts ("bos" in "bosrijk", not "stad" in "afstand")
+        alternation = "|".join(re.escape(term) for term in sorted(self.weights, key=len, reverse=True))
+        self._pattern = re.compile(rf"\b(?:{alternation})", re.UNICODE)
+
+    def summarize(self, listing_data: Dict, fields: Iterable[str] = ("description", "location_info")) -> Dict:
+        """Copy of listing_data with the text fields compacted to the budget together"""
+        fields = [field for field in fields if listing_data.get(field)]
+        summary = dict(listing_data)
+        if sum(estimate_tokens(listing_data[field]) for field in fields) <= self.token_budget:
+            return summary
+
+        candidates = []  # (score, field, position, sentence)
+        kept_words: List[set] = []
+        for field in fields:
+            sentences = split_sentences(listing_data[field])
+            for position, sentence in enumerate(sentences):
+                words = set(_WORD.findall(sentence.lower()))
+                if len(words) < MIN_SENTENCE_WORDS or self._is_repeat(words, kept_words):
+                    continue
+                kept_words.append(words)
+                early = 0.1 * (1 - position / len(sentences))
+                candidates.append((self._relevance(sentence.lower()) + early, field, position, sentence))
+
+        chosen: Dict[str, List[Tuple[int, str]]] = {field: [] for field in fields}
+        budget = self.token_budget
+        for score, field, position, sentence in sorted(candidates, key=lambda item: -item[0]):
+            tokens = estimate_tokens(sentence) + 1
+            if tokens <= budget:
+                chosen[field].append((position, sentence))
+                budget -= tokens
+            elif not any(chosen.values()):
+                # Best sentence alone is over budget: keep its start rather than nothing
+                chosen[field].append((position, self._truncate(sentence, budget)))
+                budget = 0
+            if budget <= MIN_SENTENCE_WORDS:
+                break
+
+        for field in fields:
+            summary[field] = " ".join(sentence for _, sentence in sorted(chosen[field]))
+        return summary
+
+    def _relevance(self, sentence: str) -> float:
+        return sum(self.weights[term] for term in set(self._pattern.findall(sentence)))
+
+    @staticmethod
+    def _is_repeat(words: set, kept_words: List[set]) -> bool:
+        for other in kept_words:
+            if len(words & other) >= DUPLICATE_OVERLAP * len(words | other):
+                return True
+        return False
+
+    @staticmethod
+    def _truncate(sentence: str, tokens: int) -> str:
+        cut = sentence[:max(0, int(tokens * CHARS_PER_TOKEN) - 1)]
+        return (cut.rsplit(' ', 1)[0] if ' ' in cut else cut) + "…"
+
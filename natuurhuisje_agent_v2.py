@@ -3,15 +3,204 @@ Natuurhuisje Agent V2 - Improved with Few-Shot Learning
 Gebruikt jouw gelabelde voorbeelden voor betere resultaten
 """
 
+import asyncio
+import copy
+import dataclasses
+import functools
+import hashlib
+import io
 import json
 import re
 import csv
-from typing import Dict, List, Tuple, Optional
+import sys
+import threading
+import time
+from concurrent.futures import Executor
+from types import SimpleNamespace
+from typing import TYPE_CHECKING, Any, AsyncIterator, Callable, Dict, Iterable, List, Tuple, Optional
 from dataclasses import dataclass
-from anthropic import Anthropic
-import os
 
-@dataclass
+from instrumentation import NULL_METRICS, Metrics
+from listing_summary import ListingSummarizer, estimate_tokens
+from page_fetcher import PageFetcher
+from prescreen import Prescreener, listing_features
+from rate_limiter import CHARS_PER_TOKEN, RateLimiter
+from result_cache import ResultCache, make_cache_key
+from similarity_index import ExampleIndex
+from streaming_json import IncrementalJSONParser
+from training_snapshot import TrainingSnapshot, snapshot_path, source_stamp
+
+if TYPE_CHECKING:
+    # Heavy imports, only loaded when actually used (see the client properties)
+    from anthropic import Anthropic, AsyncAnthropic
+    from near_duplicates import NearDuplicateIndex
+    from results_store import ResultsStore
+
+DEFAULT_MODEL = "claude-sonnet-4-20250514"
+# Cheap first tier for the model cascade (see cascade_model)
+CASCADE_MODEL = "claude-3-5-haiku-20241022"
+
+SCORE_THRESHOLD = 60  # Vanaf hier JA
+CASCADE_BIN = 5       # Width (points from the threshold) of the bins in cascade_report()
+
+OUTPUT_MODES = ("text", "tool")
+SCORE_TOOL = "record_score"  # Tool the model must call in output_mode="tool"
+
+USAGE_FIELDS = ("input_tokens", "cache_creation_input_tokens", "cache_read_input_tokens", "output_tokens")
+CACHE_CHECK_REQUESTS = 20  # usage_report() warns once when this many calls read nothing from the prompt cache
+
+# Verhoog bij elke wijziging aan de prompt, zodat oude cache entries niet meer matchen
+PROMPT_VERSION = "4"
+
+# Criteria en gewichten (samen 100 punten)
+DEFAULT_CRITERIA = {
+    "natuur_nabijheid": {
+        "weight": 30,
+        "description": "Afstand tot en integratie met natuur"
+    },
+    "privacy_rust": {
+        "weight": 20,
+        "description": "Mate van privacy en rust (vrijstaand, kleinschalig)"
+    },
+    "omgeving_kwaliteit": {
+        "weight": 25,
+        "description": "Kwaliteit natuuromgeving (bos, strand, heide, bergen)"
+    },
+    "authenticiteit": {
+        "weight": 15,
+        "description": "Natuurhuisje gevoel vs. standaard vakantiepark"
+    },
+    "bebouwing": {
+        "weight": 10,
+        "description": "Afwezigheid van stedelijke bebouwing/massa toerisme"
+    }
+}
+
+# Listing types, in order of precedence: the first one found on the page wins
+LISTING_TYPES = (
+    'Kleinschalig vakantiepark',
+    'Vrijstaand',
+    'Chalet',
+    'Blokhut',
+    'Boomhut',
+)
+
+LOCATION_MARKER = "Natuur en omgeving"
+
+_DESCRIPTION_ANCHOR = re.compile(r'</h2>\s*<p>')
+_HTML_TAG = re.compile(r'<[^>]+>')
+
+
+def parse_analysis(response_text: str) -> Optional[Dict]:
+    """The JSON analysis in Claude's answer, or None if it has none (module level, so a process pool can run it)"""
+    json_match = re.search(r'\{.*\}', response_text, re.DOTALL)
+    if json_match:
+        try:
+            analysis = json.loads(json_match.group())
+        except ValueError:
+            return None
+        return analysis if isinstance(analysis, dict) else None
+    return None
+
+
+def message_text(message) -> str:
+    """The answer as text; a tool call's input as its JSON, so both output modes parse the same way"""
+    parts = []
+    for block in message.content:
+        if getattr(block, "type", "text") == "tool_use":
+            return json.dumps(block.input, ensure_ascii=False)
+        parts.append(getattr(block, "text", "") or "")
+    return "".join(parts)
+
+
+def validate_analysis(analysis: Dict, criteria: Iterable[str]) -> List[str]:
+    """What is wrong with an analysis (empty if nothing): every criterion a number 0-10, similar_to ja/nee, reasoning text"""
+    errors = []
+    for criterion in criteria:
+        score = analysis.get(criterion)
+        if isinstance(score, bool) or not isinstance(score, (int, float)):
+            errors.append(f"{criterion} ontbreekt of is geen getal")
+        elif not 0 <= score <= 10:
+            errors.append(f"{criterion} = {score} valt buiten 0-10")
+    if analysis.get("similar_to") not in ("ja", "nee"):
+        errors.append(f"similar_to = {analysis.get('similar_to')!r}, verwacht 'ja' of 'nee'")
+    if not isinstance(analysis.get("reasoning"), str):
+        errors.append("reasoning ontbreekt")
+    return errors
+
+
+def extract_listing_data(html_content: str) -> Dict:
+    """
+    Extract description, location text and type from a listing page.
+    
+    Walks the page with str.find and compiled patterns using start/end
+    positions, so the page is never split or copied; only the extracted
+    fields are materialised. Output is identical to the original
+    regex/split implementation.
+    """
+    data = {
+        "description": "",
+        "location_info": "",
+        "type": "",
+        "facilities": []
+    }
+    
+    # Description: the <p> right after each <h2>...</h2>
+    paragraphs = []
+    pos = 0
+    while True:
+        h2_start = html_content.find('<h2>', pos)
+        if h2_start < 0:
+            break
+        anchor = _DESCRIPTION_ANCHOR.search(html_content, h2_start + 4)
+        if anchor is None:
+            break
+        p_end = html_content.find('</p>', anchor.end())
+        if p_end < 0:
+            break
+        paragraphs.append(html_content[anchor.end():p_end])
+        pos = p_end + 4
+    if paragraphs:
+        data["description"] = " ".join(paragraphs)
+    
+    # Location: text after the marker, up to the next </div> (or next marker)
+    marker = html_content.find(LOCATION_MARKER)
+    if marker >= 0:
+        start = marker + len(LOCATION_MARKER)
+        end = len(html_content)
+        for terminator in ('</div>', LOCATION_MARKER):
+            found = html_content.find(terminator, start, end)
+            if found >= 0:
+                end = found
+        
+        # Strip tags chunk by chunk and stop once we have 1000 characters
+        text = []
+        length = 0
+        pos = start
+        while pos < end and length < 1000:
+            tag = _HTML_TAG.search(html_content, pos, end)
+            chunk_end = tag.start() if tag else end
+            chunk = html_content[pos:min(chunk_end, pos + 1000 - length)]
+            text.append(chunk)
+            length += len(chunk)
+            pos = tag.end() if tag else end
+        data["location_info"] = "".join(text)
+    
+    # Type
+    for listing_type in LISTING_TYPES:
+        if listing_type in html_content:
+            data["type"] = listing_type
+            break
+    
+    return data
+
+
+def intern_label(value: Optional[str]) -> Optional[str]:
+    """One shared copy of a short, often repeated label (category, similar_to, source)"""
+    return sys.intern(value) if type(value) is str else value
+
+
+@dataclass(slots=True)
 class LabeledExample:
     """Een gelabeld voorbeeld natuurhuisje"""
     url: str
@@ -20,83 +209,421 @@ class LabeledExample:
     reasoning: str
     key_features: List[str]
 
-@dataclass
+    def __post_init__(self):
+        self.category = intern_label(self.category)
+
+@dataclass(slots=True)
 class ScoringResult:
+    """
+    One scored listing. Slotted, with interned labels: results read back
+    from JSON (cache, batch state, service) would otherwise each carry an
+    attribute dict and their own copies of the same few category strings.
+    For very many results at once see ResultTable in compact_results.py.
+    """
     is_natuurhuisje: bool
     confidence_score: float
     category: str
     reasoning: str
     breakdown: Dict[str, float]
     similar_to: Optional[str] = None  # Welk voorbeeld lijkt het meest op
+    url: Optional[str] = None  # Welke listing is gescoord
+    error: Optional[str] = None  # Gezet als ophalen of scoren mislukte
+    source: str = "model"  # Welk pad het resultaat leverde: model, fast_path, near_duplicate of fallback
+    derived_from: Optional[str] = None  # Bij near_duplicate: de listing waarvan de score is overgenomen
+
+    def __post_init__(self):
+        self.category = intern_label(self.category)
+        self.similar_to = intern_label(self.similar_to)
+        self.source = intern_label(self.source)
+
+    def __getstate__(self):
+        return tuple(getattr(self, field.name) for field in dataclasses.fields(self))
+
+    def __setstate__(self, state):
+        # Pickles from before the class was slotted (near-duplicate index) hold an attribute dict
+        if isinstance(state, dict):
+            state = tuple(state.get(field.name, field.default) for field in dataclasses.fields(self))
+        for field, value in zip(dataclasses.fields(self), state):
+            object.__setattr__(self, field.name, value)
+        self.__post_init__()
+
+@dataclass
+class TrainingState:
+    """One consistent version of the training data and everything derived from it; replaced as a whole"""
+    examples: Dict[str, List[LabeledExample]]
+    fingerprint: str
+    prefix: str
+    index: Optional[ExampleIndex] = None
+    stamp: Optional[Tuple[int, int]] = None  # (size, mtime_ns) of the CSV it was read from
+    content_hash: Optional[str] = None  # sha256 of that CSV content
 
 class ImprovedNatuurhuisjeAgent:
     """
     Verbeterde agent met few-shot learning
     """
     
-    def __init__(self, api_key: str = None, training_file: str = 'training_data.csv'):
-        """Initialize with optional training data"""
-        self.client = Anthropic(api_key=api_key) if api_key else Anthropic()
+    def __init__(self, api_key: str = None, training_file: str = 'training_data.csv',
+                 model: str = DEFAULT_MODEL, cache: Optional[ResultCache] = None,
+                 examples_per_category: int = 2, fetcher: Optional[PageFetcher] = None,
+                 prescreener: Optional[Prescreener] = None, few_shot: str = "fixed",
+                 results_store: Optional['ResultsStore'] = None, metrics: Optional[Metrics] = None,
+                 client: Optional['Anthropic'] = None, async_client: Optional['AsyncAnthropic'] = None,
+                 rate_limiter: Optional[RateLimiter] = None, snapshot: bool = True,
+                 reload_interval: Optional[float] = 5.0,
+                 near_duplicates: Optional['NearDuplicateIndex'] = None,
+                 cascade_model: Optional[str] = None, cascade_band: float = 10.0,
+                 summary_tokens: Optional[int] = 200, streaming: bool = False, stop_early: bool = True,
+                 output_mode: str = "text", reasoning_chars: Optional[int] = None, invalid_retries: int = 1):
+        """
+        Initialize with optional training data, result cache, page fetcher and pre-classifier.
+        
+        few_shot="fixed" uses the first examples of each category for every
+        listing; few_shot="nearest" picks the most similar ones per listing.
+        client/async_client replace the default Anthropic clients (e.g. the
+        fake client in benchmarks/fake_anthropic.py). With a rate_limiter all
+        model calls go through it, and the default clients leave retrying to
+        the limiter. The Anthropic clients are created on first use. With
+        snapshot=True the parsed training data is kept in a binary snapshot
+        next to the CSV (see training_snapshot.py) and reused while the CSV
+        is unchanged. Edits to the CSV are picked up while running, checked
+        at most every reload_interval seconds (None: only on
+        refresh_training_data()). With a near_duplicates index a listing
+        that is nearly identical to one already scored reuses that score
+        (source="near_duplicate") instead of calling the model. With a
+        cascade_model (e.g. CASCADE_MODEL) that model scores every listing
+        first, and only scores within cascade_band points of the threshold
+        are scored again by `model`; see cascade_report(). Description and
+        location text go into the prompt compacted to about summary_tokens
+        tokens, most relevant sentences first (see listing_summary.py);
+        None falls back to the first 500 characters of each. With
+        streaming=True answers are streamed and parsed while they arrive
+        (analyze_listing with on_field streams too); stop_early then ends
+        the answer as soon as every field the score needs is in, skipping
+        key_observations. output_mode="tool" declares the answer as a tool
+        (see score_tool()) that the model must call, instead of asking for
+        JSON in the text. Every answer is validated; an invalid one is
+        asked again up to invalid_retries times before the neutral fallback
+        (see parse_report()). reasoning_chars caps the reasoning length, in
+        the prompt, the schema and max_tokens.
+        """
+        if few_shot not in ("fixed", "nearest"):
+            raise ValueError(f"few_shot moet 'fixed' of 'nearest' zijn, niet {few_shot!r}")
+        if output_mode not in OUTPUT_MODES:
+            raise ValueError(f"output_mode moet 'text' of 'tool' zijn, niet {output_mode!r}")
+        
+        self.api_key = api_key
+        self.model = model
+        self.cache = cache
+        self.fetcher = fetcher or PageFetcher()
+        self.prescreener = prescreener
+        self.few_shot = few_shot
+        self.results_store = results_store
+        self.metrics = metrics or NULL_METRICS
+        self.examples_per_category = examples_per_category
+        self.rate_limiter = rate_limiter
+        self.near_duplicates = near_duplicates
+        self.cascade_model = cascade_model
+        self.cascade_band = cascade_band
+        self.streaming = streaming
+        self.stop_early = stop_early
+        self.output_mode = output_mode
+        self.reasoning_chars = reasoning_chars
+        self.invalid_retries = invalid_retries
+        self.use_snapshot = snapshot
+        self.reload_interval = reload_interval
+        self._reload_lock = threading.Lock()
+        self._next_reload_check = time.monotonic() + (reload_interval or 0)
+        self._client = client
+        self._async_client = async_client
         
         # Criteria (same as before)
-        self.criteria = {
-            "natuur_nabijheid": {
-                "weight": 30,
-                "description": "Afstand tot en integratie met natuur"
-            },
-            "privacy_rust": {
-                "weight": 20,
-                "description": "Mate van privacy en rust (vrijstaand, kleinschalig)"
-            },
-            "omgeving_kwaliteit": {
-                "weight": 25,
-                "description": "Kwaliteit natuuromgeving (bos, strand, heide, bergen)"
-            },
-            "authenticiteit": {
-                "weight": 15,
-                "description": "Natuurhuisje gevoel vs. standaard vakantiepark"
-            },
-            "bebouwing": {
-                "weight": 10,
-                "description": "Afwezigheid van stedelijke bebouwing/massa toerisme"
-            }
-        }
+        self.criteria = copy.deepcopy(DEFAULT_CRITERIA)
+        self.summary_tokens = summary_tokens
+        self.summarizer = ListingSummarizer(self.criteria, summary_tokens) if summary_tokens else None
+        # What _calculate_final_score uses; a streamed answer can stop once these are in
+        self.required_fields = frozenset(self.criteria) | {"reasoning", "similar_to"}
         
         # Load training data if available
-        self.training_examples = self._load_training_data(training_file)
+        self.training_file = training_file
+        self.reload_training_data()
+        
+        # Token accounting over all calls, see usage_report()
+        self._usage_lock = threading.Lock()
+        self.usage = {
+            "requests": 0,
+            "input_tokens": 0,
+            "cache_creation_input_tokens": 0,
+            "cache_read_input_tokens": 0,
+            "output_tokens": 0,
+        }
+        self._cache_warning_shown = False
+        # Calls and model seconds per cascade tier, plus what escalating changed
+        self.cascade_stats = {
+            "fast": {"calls": 0, "seconds": 0.0},
+            "full": {"calls": 0, "seconds": 0.0},
+            "escalated": 0,
+            "flipped": 0,
+            "by_distance": {},  # bin -> [escalated, flipped], keyed by distance of the fast score to the threshold
+        }
+        # Model answers checked by _checked_analysis, see parse_report()
+        self.parse_stats = {"responses": 0, "invalid": 0, "retries": 0, "fallbacks": 0}
+    
+    @property
+    def training_examples(self) -> Dict[str, List[LabeledExample]]:
+        return self._training.examples
+    
+    @property
+    def training_fingerprint(self) -> str:
+        return self._training.fingerprint
+    
+    @property
+    def example_index(self) -> Optional[ExampleIndex]:
+        return self._training.index
+    
+    @property
+    def _prompt_prefix(self) -> str:
+        return self._training.prefix
+    
+    def reload_training_data(self):
+        """(Re)load training_file from scratch, via the snapshot when the CSV is unchanged"""
+        with self._reload_lock:
+            snapshot = self._training_snapshot() if self.use_snapshot else None
+            if snapshot is not None:
+                examples = {
+                    category: [LabeledExample(url, category, score, reasoning, list(features))
+                               for url, score, reasoning, features in rows]
+                    for category, rows in snapshot.examples.items()
+                }
+                stamp, content_hash, fingerprint = snapshot.stamp, snapshot.content_hash, snapshot.fingerprint
+            else:
+                stamp, content = self._read_training_file()
+                examples = self._parse_or_warn(content)
+                content_hash = hashlib.sha256(content).hexdigest() if stamp else None
+                fingerprint = self._fingerprint_examples(examples)
+            
+            index = self._snapshot_example_index(snapshot, examples) if self.few_shot == "nearest" else None
+            prefix = (snapshot.derive(self._prefix_key(), lambda: self._build_static_prefix(examples)) if snapshot is not None
+                      else self._build_static_prefix(examples))
+            
+            self._training = TrainingState(examples, fingerprint, prefix, index, stamp, content_hash)
+            if snapshot is not None and snapshot.dirty:
+                snapshot.save(snapshot_path(self.training_file))
         print(f"✅ Geladen: {self._count_examples()} training voorbeelden")
     
-    def _load_training_data(self, filename: str) -> Dict[str, List[LabeledExample]]:
-        """Load training examples from CSV"""
-        examples = {"ja": [], "nee": []}
+    def refresh_training_data(self) -> bool:
+        """
+        Apply edits to training_file without a restart; returns True if the examples changed.
         
-        if not os.path.exists(filename):
-            print(f"⚠️  Geen training data gevonden ({filename})")
+        Rows appended to the file are parsed on their own. After any other
+        edit the file is re-read, but only rows that actually changed are
+        re-indexed. The new state is built next to the current one and
+        swapped in with a single assignment, so analyses in flight keep a
+        consistent view and never wait. Returns False straight away if
+        another thread is already reloading.
+        """
+        if not self._reload_lock.acquire(blocking=False):
+            return False
+        try:
+            current = self._training
+            stamp = source_stamp(self.training_file)
+            if stamp is None or stamp == current.stamp:
+                return False
+            
+            stamp, content = self._read_training_file()
+            content_hash = hashlib.sha256(content).hexdigest()
+            if content_hash == current.content_hash:
+                self._training = dataclasses.replace(current, stamp=stamp)  # Touched, not edited
+                return False
+            
+            try:
+                examples, added, removed = self._apply_training_changes(current, content)
+            except Exception as e:
+                print(f"⚠️  Kon gewijzigde training data niet laden, vorige versie blijft actief: {e}")
+                return False
+            
+            fingerprint = self._fingerprint_examples(examples)
+            if fingerprint == current.fingerprint:
+                # Only comments, template rows or formatting changed
+                self._training = dataclasses.replace(current, stamp=stamp, content_hash=content_hash)
+                return False
+            
+            index = None
+            if current.index is not None:
+                index = current.index.copy()
+                for url in removed:
+                    index.remove(url)
+                for ex in added:
+                    index.add(ex.url, ex.category, self._example_text(ex))
+            
+            state = TrainingState(examples, fingerprint, self._build_static_prefix(examples), index, stamp, content_hash)
+            self._training = state
+            if self.use_snapshot:
+                self._save_snapshot(state)
+        finally:
+            self._reload_lock.release()
+        
+        print(f"🔄 Training data bijgewerkt: +{len(added)} / -{len(removed)} voorbeelden, "
+              f"nu {self._count_examples()}")
+        return True
+    
+    def _apply_training_changes(self, current: 'TrainingState', content: bytes
+                                ) -> Tuple[Dict[str, List[LabeledExample]], List[LabeledExample], List[str]]:
+        """New examples for `content`, plus the examples that are new or changed and the urls that are gone"""
+        old_size = current.stamp[0] if current.stamp else 0
+        appended = (
+            current.content_hash is not None and 0 < old_size < len(content)
+            and content[old_size - 1:old_size] == b'\n'
+            and hashlib.sha256(content[:old_size]).hexdigest() == current.content_hash
+        )
+        if appended:
+            header = content[:content.index(b'\n') + 1]
+            new_rows = self._parse_training_csv(header + content[old_size:])
+            examples = {category: current.examples.get(category, []) + new_rows.get(category, [])
+                        for category in current.examples}
+            return examples, [ex for exs in new_rows.values() for ex in exs], []
+        
+        # Edited or deleted rows: keep the parsed example for every unchanged row
+        known = {self._example_key(ex): ex for exs in current.examples.values() for ex in exs}
+        examples = {
+            category: [known.get(self._example_key(ex), ex) for ex in exs]
+            for category, exs in self._parse_training_csv(content).items()
+        }
+        kept = {id(ex) for ex in known.values()}
+        added = [ex for exs in examples.values() for ex in exs if id(ex) not in kept]
+        new_urls = {ex.url for exs in examples.values() for ex in exs}
+        removed = [ex.url for ex in known.values() if ex.url not in new_urls]
+        return examples, added, removed
+    
+    @staticmethod
+    def _example_key(example: LabeledExample) -> Tuple:
+        return (example.url, example.category, example.score, example.reasoning, tuple(example.key_features))
+    
+    def _maybe_refresh_training_data(self):
+        """Start a background refresh if training_file changed; checked at most every reload_interval seconds"""
+        if self.reload_interval is None:
+            return
+        now = time.monotonic()
+        if now < self._next_reload_check:
+            return
+        self._next_reload_check = now + self.reload_interval
+        if source_stamp(self.training_file) != self._training.stamp and not self._reload_lock.locked():
+            threading.Thread(target=self.refresh_training_data, daemon=True).start()
+    
+    def _training_snapshot(self) -> Optional[TrainingSnapshot]:
+        """Snapshot matching the current CSV, parsing the CSV into a fresh one if there is none"""
+        stamp = source_stamp(self.training_file)
+        if stamp is None:
+            return None
+        
+        snapshot = TrainingSnapshot.load(snapshot_path(self.training_file), stamp)
+        if snapshot is None:
+            stamp, content = self._read_training_file()
+            examples = self._parse_or_warn(content)
+            snapshot = TrainingSnapshot(stamp, self._example_rows(examples), self._fingerprint_examples(examples),
+                                        content_hash=hashlib.sha256(content).hexdigest())
+        return snapshot
+    
+    def _save_snapshot(self, state: 'TrainingState'):
+        """Write a snapshot for a state built by refresh_training_data"""
+        snapshot = TrainingSnapshot(state.stamp, self._example_rows(state.examples), state.fingerprint,
+                                    content_hash=state.content_hash)
+        snapshot.derive(self._prefix_key(), lambda: state.prefix)
+        cache_signature = getattr(self.fetcher, "cache_signature", None)
+        if state.index is not None and cache_signature is not None:
+            urls = [ex.url for examples in state.examples.values() for ex in examples]
+            snapshot.derive(("index", cache_signature(urls)), lambda: state.index)
+        snapshot.save(snapshot_path(self.training_file))
+    
+    def _prefix_key(self) -> Tuple:
+        """Snapshot key of the static prefix: everything besides the examples that shapes it"""
+        return ("prefix", PROMPT_VERSION, self.few_shot, self.examples_per_category, self.output_mode,
+                self.reasoning_chars)
+    
+    @staticmethod
+    def _example_rows(examples: Dict[str, List[LabeledExample]]) -> Dict:
+        return {category: [(ex.url, ex.score, ex.reasoning, ex.key_features) for ex in exs]
+                for category, exs in examples.items()}
+    
+    def _snapshot_example_index(self, snapshot: Optional[TrainingSnapshot],
+                                examples: Dict[str, List[LabeledExample]]) -> ExampleIndex:
+        """Example index from the snapshot, rebuilt when a cached example page changed"""
+        cache_signature = getattr(self.fetcher, "cache_signature", None)
+        if snapshot is None or cache_signature is None:
+            return self._build_example_index(examples)
+        
+        urls = [ex.url for exs in examples.values() for ex in exs]
+        return snapshot.derive(("index", cache_signature(urls)), lambda: self._build_example_index(examples),
+                               exclusive=True)
+    
+    def _read_training_file(self) -> Tuple[Optional[Tuple[int, int]], bytes]:
+        """(stamp, raw bytes) of training_file; the stamp is taken first, so a concurrent edit is never missed"""
+        stamp = source_stamp(self.training_file)
+        if stamp is None:
+            print(f"⚠️  Geen training data gevonden ({self.training_file})")
             print("   Run eerst: python training_data_tool.py")
+            return None, b''
+        with open(self.training_file, 'rb') as f:
+            return stamp, f.read()
+    
+    def _parse_training_csv(self, content: bytes) -> Dict[str, List[LabeledExample]]:
+        """Parse CSV bytes (header included) into examples per category"""
+        examples = {"ja": [], "nee": []}
+        if not content:
             return examples
         
+        reader = csv.DictReader(io.StringIO(content.decode('utf-8-sig')))
+        for row in reader:
+            # Skip template rows
+            if 'XXXXX' in row['URL'] or 'YYYYY' in row['URL']:
+                continue
+            
+            example = LabeledExample(
+                url=row['URL'],
+                category=row['Categorie'],
+                score=float(row['Score']) if row['Score'] else 50.0,
+                reasoning=row['Redenering'],
+                key_features=row['Kenmerken'].split('; ') if row['Kenmerken'] else []
+            )
+            
+            if example.category in examples:
+                examples[example.category].append(example)
+        
+        return examples
+    
+    def _parse_or_warn(self, content: bytes) -> Dict[str, List[LabeledExample]]:
+        """_parse_training_csv for a full (re)load: a broken file means no examples, not a crash"""
         try:
-            with open(filename, 'r', encoding='utf-8') as f:
-                reader = csv.DictReader(f)
-                for row in reader:
-                    # Skip template rows
-                    if 'XXXXX' in row['URL'] or 'YYYYY' in row['URL']:
-                        continue
-                    
-                    example = LabeledExample(
-                        url=row['URL'],
-                        category=row['Categorie'],
-                        score=float(row['Score']) if row['Score'] else 50.0,
-                        reasoning=row['Redenering'],
-                        key_features=row['Kenmerken'].split('; ') if row['Kenmerken'] else []
-                    )
-                    
-                    if example.category in examples:
-                        examples[example.category].append(example)
+            return self._parse_training_csv(content)
         except Exception as e:
             print(f"⚠️  Kon training data niet laden: {e}")
-        
-        return examples
+            return {"ja": [], "nee": []}
+    
+    def add_training_example(self, example: LabeledExample):
+        """Add one labeled example without touching the CSV (swapped in like refresh_training_data)"""
+        with self._reload_lock:
+            current = self._training
+            if example.category not in current.examples:
+                return
+            
+            examples = {category: list(exs) for category, exs in current.examples.items()}
+            examples[example.category].append(example)
+            index = None
+            if current.index is not None:
+                index = current.index.copy()
+                index.add(example.url, example.category, self._example_text(example))
+            self._training = dataclasses.replace(
+                current, examples=examples, fingerprint=self._fingerprint_examples(examples),
+                prefix=self._build_static_prefix(examples), index=index)
+    
+    def _fingerprint_examples(self, examples: Dict[str, List[LabeledExample]]) -> str:
+        """Stable hash of the loaded training set, part of the result cache key"""
+        digest = hashlib.sha256()
+        for category in sorted(examples):
+            for ex in examples[category]:
+                digest.update(json.dumps(
+                    [category, ex.url, ex.score, ex.reasoning, ex.key_features], ensure_ascii=False
+                ).encode('utf-8'))
+        return digest.hexdigest()[:16]
     
     def _count_examples(self) -> str:
         """Count training examples"""
@@ -104,45 +631,31 @@ class ImprovedNatuurhuisjeAgent:
         total = sum(counts.values())
         return f"{total} total (JA: {counts.get('ja', 0)}, NEE: {counts.get('nee', 0)})"
     
-    def _build_few_shot_prompt(self, listing_data: Dict) -> str:
-        """Build improved prompt with few-shot examples"""
+    def _build_static_prefix(self, examples: Dict[str, List[LabeledExample]]) -> str:
+        """
+        Build the part of the prompt that is the same for every listing.
+        
+        Called once when training data is (re)loaded. It is sent as its own
+        content block with cache_control, so repeated calls read it from the
+        prompt cache instead of paying for it as fresh input tokens. The API
+        only caches prefixes above a model-specific minimum (1024 tokens for
+        Sonnet); raise examples_per_category if usage_report() shows no reads.
+        With few_shot="nearest" the examples vary per listing and move to the
+        listing part instead.
+        """
         
         prompt = """Analyseer deze vakantieaccommodatie en bepaal of het een echt "natuurhuisje" is.
 
 """
         
-        # Add examples if we have them
-        if any(len(exs) > 0 for exs in self.training_examples.values()):
-            prompt += """Ik heb al enkele voorbeelden gelabeld. Gebruik deze als referentie:
-
-"""
-            
-            # Add JA examples
-            ja_examples = self.training_examples.get('ja', [])[:2]  # Max 2
-            if ja_examples:
-                prompt += "═══ JA - NATUURHUISJE (60-100 punten) ═══\n\n"
-                for ex in ja_examples:
-                    prompt += f"""✓ Voorbeeld (Score: {ex.score}/100):
-   Redenering: {ex.reasoning}
-   Kenmerken: {', '.join(ex.key_features[:3])}
-
-"""
-            
-            # Add NEE examples
-            nee_examples = self.training_examples.get('nee', [])[:2]
-            if nee_examples:
-                prompt += "═══ NEE - GEEN NATUURHUISJE (0-59 punten) ═══\n\n"
-                for ex in nee_examples:
-                    prompt += f"""✗ Voorbeeld (Score: {ex.score}/100):
-   Redenering: {ex.reasoning}
-   Kenmerken: {', '.join(ex.key_features[:3])}
-
-"""
-            
-            prompt += "═══════════════════════════════════════════════\n\n"
+        if self.few_shot == "fixed":
+            prompt += self._format_examples(
+                examples.get('ja', [])[:self.examples_per_category],
+                examples.get('nee', [])[:self.examples_per_category]
+            )
         
-        # Add base criteria
-        prompt += f"""
+        # Add base criteria and answer format
+        prompt += """
 CRITERIA (gebruik de voorbeelden als kalibratie):
 
 1. natuur_nabijheid (30% gewicht): Hoe dichtbij en toegankelijk is de natuur?
@@ -151,105 +664,728 @@ CRITERIA (gebruik de voorbeelden als kalibratie):
 4. authenticiteit (15% gewicht): Voelt het als authentiek natuurhuisje?
 5. bebouwing (10% gewicht): Hoe afwezig is stedelijke bebouwing?
 
-TE ANALYSEREN HUISJE:
-Type: {listing_data.get('type', 'Onbekend')}
-Beschrijving: {listing_data.get('description', 'Niet beschikbaar')[:500]}
-Omgeving: {listing_data.get('location_info', 'Niet beschikbaar')[:500]}
-
 Geef voor elk criterium een score van 0-10, en vermeld welk voorbeeld (JA/NEE) het meest lijkt.
 
-Antwoord in dit exacte JSON formaat:
-{{
+"""
+        prompt += self._answer_format()
+        
+        return prompt
+    
+    def _answer_format(self) -> str:
+        """How the model should answer: the JSON template, or a call to SCORE_TOOL"""
+        reasoning = ("gedetailleerde uitleg, refereer naar voorbeelden als relevant" if self.reasoning_chars is None
+                     else f"korte uitleg, maximaal {self.reasoning_chars} tekens")
+        if self.output_mode == "tool":
+            return (f"Geef je oordeel uitsluitend door de tool {SCORE_TOOL} aan te roepen, zonder tekst ernaast.\n"
+                    f"reasoning: {reasoning}.\n")
+        return """Antwoord in dit exacte JSON formaat:
+{
     "natuur_nabijheid": <score 0-10>,
     "privacy_rust": <score 0-10>,
     "omgeving_kwaliteit": <score 0-10>,
     "authenticiteit": <score 0-10>,
     "bebouwing": <score 0-10>,
-    "reasoning": "<gedetailleerde uitleg, refereer naar voorbeelden als relevant>",
+    "reasoning": "<""" + reasoning + """>",
     "similar_to": "<'ja' of 'nee' - welke categorie lijkt het meest op>",
     "key_observations": ["<observatie 1>", "<observatie 2>", "<observatie 3>"]
-}}
+}
+"""
+    
+    def score_tool(self) -> Dict:
+        """The answer schema as a tool definition: the criteria in self.criteria plus reasoning, similar_to, key_observations"""
+        properties = {
+            criterion: {"type": "number", "minimum": 0, "maximum": 10, "description": config["description"]}
+            for criterion, config in self.criteria.items()
+        }
+        properties["reasoning"] = {"type": "string", "description": "Uitleg, refereer naar voorbeelden als relevant"}
+        if self.reasoning_chars is not None:
+            properties["reasoning"]["maxLength"] = self.reasoning_chars
+        properties["similar_to"] = {"type": "string", "enum": ["ja", "nee"],
+                                    "description": "Welke categorie voorbeelden lijkt het meest op"}
+        properties["key_observations"] = {"type": "array", "items": {"type": "string"}, "maxItems": 3}
+        return {
+            "name": SCORE_TOOL,
+            "description": "Leg de scores en het oordeel over de accommodatie vast",
+            "input_schema": {
+                "type": "object",
+                "properties": properties,
+                "required": [*self.criteria, "reasoning", "similar_to"],
+            },
+        }
+    
+    def _format_examples(self, ja_examples: List[LabeledExample], nee_examples: List[LabeledExample]) -> str:
+        """Few-shot block with the given JA and NEE examples"""
+        if not ja_examples and not nee_examples:
+            return ""
+        
+        prompt = """Ik heb al enkele voorbeelden gelabeld. Gebruik deze als referentie:
+
 """
         
+        # Add JA examples
+        if ja_examples:
+            prompt += "═══ JA - NATUURHUISJE (60-100 punten) ═══\n\n"
+            for ex in ja_examples:
+                prompt += f"""✓ Voorbeeld (Score: {ex.score}/100):
+   Redenering: {ex.reasoning}
+   Kenmerken: {', '.join(ex.key_features[:3])}
+
+"""
+        
+        # Add NEE examples
+        if nee_examples:
+            prompt += "═══ NEE - GEEN NATUURHUISJE (0-59 punten) ═══\n\n"
+            for ex in nee_examples:
+                prompt += f"""✗ Voorbeeld (Score: {ex.score}/100):
+   Redenering: {ex.reasoning}
+   Kenmerken: {', '.join(ex.key_features[:3])}
+
+"""
+        
+        prompt += "═══════════════════════════════════════════════\n\n"
         return prompt
     
-    def analyze_listing(self, url: str, html_content: str) -> ScoringResult:
-        """Main analysis function with few-shot learning"""
+    def _nearest_examples(self, listing_data: Dict, category: str, training: TrainingState) -> List[LabeledExample]:
+        """The most similar examples of one category, topped up in file order"""
+        k = self.examples_per_category
+        examples = training.examples.get(category, [])
+        by_url = {ex.url: ex for ex in examples}
+        
+        chosen = [by_url[url] for url, _ in training.index.nearest(
+            self._listing_text(listing_data), k=k, category=category) if url in by_url]
+        for ex in examples:
+            if len(chosen) >= k:
+                break
+            if ex not in chosen:
+                chosen.append(ex)
+        return chosen
+    
+    def _build_example_index(self, examples: Dict[str, List[LabeledExample]]) -> ExampleIndex:
+        """Similarity index over reasoning, features and any locally cached page text"""
+        index = ExampleIndex()
+        for category, exs in examples.items():
+            for ex in exs:
+                index.add(ex.url, category, self._example_text(ex))
+        return index
+    
+    def _example_text(self, example: LabeledExample) -> str:
+        """Text an example is indexed on; uses the page cache, never the network"""
+        text = f"{example.reasoning} {' '.join(example.key_features)}"
+        html_content = self.fetcher.cached(example.url)
+        if html_content:
+            text += " " + self._listing_text(self._extract_listing_data(html_content))
+        return text
+    
+    @staticmethod
+    def _listing_text(listing_data: Dict) -> str:
+        return f"{listing_data.get('type', '')} {listing_data.get('description', '')} {listing_data.get('location_info', '')}"
+    
+    def _build_listing_prompt(self, listing_data: Dict, training: Optional[TrainingState] = None) -> str:
+        """The listing-specific part of the prompt, appended after the static prefix"""
+        training = training or self._training
+        examples = ""
+        if self.few_shot == "nearest":
+            examples = "\n" + self._format_examples(
+                self._nearest_examples(listing_data, 'ja', training),
+                self._nearest_examples(listing_data, 'nee', training)
+            )
+        
+        compact = self._compact_listing(listing_data)
+        return examples + f"""
+TE ANALYSEREN HUISJE:
+Type: {listing_data.get('type', 'Onbekend')}
+Beschrijving: {compact.get('description', 'Niet beschikbaar')}
+Omgeving: {compact.get('location_info', 'Niet beschikbaar')}
+"""
+    
+    def _compact_listing(self, listing_data: Dict) -> Dict:
+        """listing_data with description and location text as they go into the prompt"""
+        if self.summarizer is None:
+            return {field: listing_data[field][:500]
+                    for field in ('description', 'location_info') if field in listing_data}
+        
+        with self.metrics.stage("compact"):
+            compact = self.summarizer.summarize(listing_data)
+        if self.metrics.enabled:
+            saved = sum(estimate_tokens(listing_data.get(field, "")) - estimate_tokens(compact.get(field, ""))
+                        for field in ('description', 'location_info'))
+            self.metrics.count("listing_tokens_saved", saved)
+        return compact
+    
+    def _build_few_shot_prompt(self, listing_data: Dict) -> str:
+        """Build improved prompt with few-shot examples (prefix + listing as one string)"""
+        training = self._training
+        return training.prefix + self._build_listing_prompt(listing_data, training)
+    
+    def analyze_listing(self, url: str, html_content: str,
+                        on_field: Optional[Callable[[str, Any, bool], None]] = None) -> ScoringResult:
+        """
+        Main analysis function with few-shot learning.
+        
+        With on_field the answer is streamed: on_field(key, value, True) is
+        called for every field of the analysis as soon as it is complete,
+        and on_field(key, text so far, False) while a text field (reasoning)
+        is still arriving. Listings scored without the model (cache, near
+        duplicate, fast path) make no calls.
+        """
+        
+        # One training state for the whole analysis, even if a reload swaps in a new one meanwhile
+        self._maybe_refresh_training_data()
+        training = self._training
         
         # Extract listing data
-        listing_data = self._extract_listing_data(html_content)
+        with self.metrics.stage("extract"):
+            listing_data = self._extract_listing_data(html_content)
+        
+        # Unchanged, near-duplicate or clear-cut listing: no model call needed
+        cache_key, result = self._local_result(listing_data, training, url)
+        if result is not None:
+            result.url = url
+            return result
+        
+        # Build request (static prefix + listing-specific prompt)
+        with self.metrics.stage("prompt"):
+            request = self._message_request(listing_data, training)
+        
+        # Call Claude (cheap model first when cascading), parse response and calculate score
+        analysis, result, api_seconds = None, None, 0.0
+        for tier, model in self._model_tiers():
+            analysis, seconds = self._request_analysis(dict(request, model=model), on_field)
+            api_seconds += seconds
+            
+            with self.metrics.stage("score"):
+                tier_result = self._calculate_final_score(analysis)
+            self._record_tier(tier, seconds, result, tier_result)
+            result = tier_result
+            if not self._needs_escalation(tier, analysis, result):
+                break
+        
+        result.url = url
+        self._store_result(cache_key, analysis, result, api_seconds, listing_data, training)
+        
+        return result
+    
+    def _request_analysis(self, request: Dict, on_field: Optional[Callable[[str, Any, bool], None]] = None
+                          ) -> Tuple[Dict, float]:
+        """(validated analysis, model seconds) for one request; invalid answers are asked again"""
+        seconds = 0.0
+        for attempt in range(self.invalid_retries + 1):
+            started = time.perf_counter()
+            with self.metrics.stage("model"):
+                message = self._create_message(request, on_field)
+            seconds += time.perf_counter() - started
+            self._record_usage(message)
+            
+            with self.metrics.stage("parse"):
+                analysis = self._checked_analysis(getattr(message, "analysis", None)
+                                                  or parse_analysis(message_text(message)), attempt)
+            if analysis is not None:
+                if on_field is not None and getattr(message, "analysis", None) is None:
+                    for key, value in analysis.items():  # Not streamed (tool mode): report it all at once
+                        on_field(key, value, True)
+                return analysis, seconds
+        return self._fallback_analysis(), seconds
+    
+    async def _arequest_analysis(self, request: Dict, executor: Optional[Executor] = None) -> Tuple[Dict, float]:
+        """Async counterpart of _request_analysis, parsing in `executor` when one is given"""
+        seconds = 0.0
+        for attempt in range(self.invalid_retries + 1):
+            started = time.perf_counter()
+            with self.metrics.stage("model"):
+                message = await self._acreate_message(request)
+            seconds += time.perf_counter() - started
+            self._record_usage(message)
+            
+            with self.metrics.stage("parse"):
+                analysis = getattr(message, "analysis", None)
+                if analysis is None:
+                    analysis = await self._aparse_analysis(message_text(message), executor)
+                analysis = self._checked_analysis(analysis, attempt)
+            if analysis is not None:
+                return analysis, seconds
+        return self._fallback_analysis(), seconds
+    
+    def _checked_analysis(self, analysis: Optional[Dict], attempt: int = 0) -> Optional[Dict]:
+        """The analysis normalised (similar_to lower case, reasoning capped), or None if it is invalid"""
+        if analysis is not None:
+            analysis = dict(analysis)
+            if isinstance(analysis.get("similar_to"), str):
+                analysis["similar_to"] = analysis["similar_to"].strip().lower()
+            reasoning = analysis.get("reasoning")
+            if self.reasoning_chars is not None and isinstance(reasoning, str) and len(reasoning) > self.reasoning_chars:
+                analysis["reasoning"] = reasoning[:self.reasoning_chars - 1].rstrip() + "…"
+        valid = analysis is not None and not validate_analysis(analysis, self.criteria)
+        with self._usage_lock:
+            self.parse_stats["responses"] += 1
+            self.parse_stats["retries"] += attempt > 0
+            self.parse_stats["invalid"] += not valid
+        if attempt > 0:
+            self.metrics.count("invalid_retries")
+        if not valid:
+            self.metrics.count("invalid_responses")
+            return None
+        return analysis
+    
+    def parse_report(self) -> Dict:
+        """How many model answers were invalid, retried, or ended in the neutral fallback"""
+        with self._usage_lock:
+            stats = dict(self.parse_stats)
+        responses = stats["responses"]
+        stats["invalid_rate"] = stats["invalid"] / responses if responses else 0.0
+        stats["fallback_rate"] = stats["fallbacks"] / (responses - stats["retries"]) if responses else 0.0
+        return stats
+    
+    def _model_tiers(self) -> List[Tuple[str, str]]:
+        """(tier, model) in the order they are tried"""
+        if self.cascade_model is None:
+            return [("full", self.model)]
+        return [("fast", self.cascade_model), ("full", self.model)]
+    
+    def _needs_escalation(self, tier: str, analysis: Dict, result: ScoringResult) -> bool:
+        """A fast-tier score that is unparseable or too close to the threshold goes to the full model"""
+        return tier == "fast" and (analysis.get("parse_failed", False)
+                                   or abs(result.confidence_score - SCORE_THRESHOLD) < self.cascade_band)
+    
+    def _record_tier(self, tier: str, seconds: float, previous: Optional[ScoringResult], result: ScoringResult):
+        """Count one model call per tier; for an escalation also whether the full model changed the verdict"""
+        self.metrics.observe(f"model_{tier}", seconds)
+        self.metrics.count(f"cascade_{tier}_calls")
+        with self._usage_lock:
+            self.cascade_stats[tier]["calls"] += 1
+            self.cascade_stats[tier]["seconds"] += seconds
+            if previous is None:
+                return
+            flipped = previous.is_natuurhuisje != result.is_natuurhuisje
+            distance = int(abs(previous.confidence_score - SCORE_THRESHOLD) // CASCADE_BIN) * CASCADE_BIN
+            counts = self.cascade_stats["by_distance"].setdefault(distance, [0, 0])
+            counts[0] += 1
+            counts[1] += flipped
+            self.cascade_stats["escalated"] += 1
+            self.cascade_stats["flipped"] += flipped
+        self.metrics.count("cascade_escalations")
+        if flipped:
+            self.metrics.count("cascade_flips")
+    
+    def cascade_report(self) -> Dict:
+        """
+        Calls, mean latency per tier and escalation outcomes so far.
+        
+        `flip_rate_by_distance` maps the distance of the fast score to the
+        threshold (in CASCADE_BIN-point bins) to how often the full model
+        reversed the verdict there: bins that never flip can be left out of
+        cascade_band, bins that often do argue for widening it.
+        """
+        with self._usage_lock:
+            stats = copy.deepcopy(self.cascade_stats)
+        report = {
+            tier: {"calls": stats[tier]["calls"],
+                   "mean_seconds": stats[tier]["seconds"] / stats[tier]["calls"] if stats[tier]["calls"] else 0.0}
+            for tier in ("fast", "full")
+        }
+        report["escalated"] = stats["escalated"]
+        report["escalation_rate"] = stats["escalated"] / stats["fast"]["calls"] if stats["fast"]["calls"] else 0.0
+        report["flipped"] = stats["flipped"]
+        report["flip_rate_by_distance"] = {
+            f"{low}-{low + CASCADE_BIN}": {"escalated": escalated, "flip_rate": flipped / escalated}
+            for low, (escalated, flipped) in sorted(stats["by_distance"].items())
+        }
+        return report
+    
+    def _model_signature(self) -> str:
+        """Which model(s) produce the scores, part of cache keys"""
+        if self.cascade_model is None:
+            return self.model
+        return f"{self.cascade_model}>{self.model}±{self.cascade_band:g}"
+    
+    def _local_result(self, listing_data: Dict, training: Optional[TrainingState] = None,
+                      url: Optional[str] = None) -> Tuple[Optional[str], Optional[ScoringResult]]:
+        """Result cache, then near duplicates, then the fast-path pre-classifier; (cache key, result or None)"""
+        cache_key, result = self._cached_result(listing_data, training)
+        if result is not None:
+            self.metrics.count("cache_hits")
+            return cache_key, result
         
-        # Build improved prompt
-        prompt = self._build_few_shot_prompt(listing_data)
+        if self.near_duplicates is not None:
+            result = self._near_duplicate_result(listing_data, training, url)
+            if result is not None:
+                self.metrics.count("near_duplicate_results")
+                return cache_key, result
         
-        # Call Claude
-        message = self.client.messages.create(
-            model="claude-sonnet-4-20250514",
-            max_tokens=1000,
-            messages=[{
+        if self.prescreener is not None:
+            result = self._fast_path_result(listing_data)
+            if result is not None:
+                self.metrics.count("fast_path_results")
+        return cache_key, result
+    
+    def _near_duplicate_result(self, listing_data: Dict, training: Optional[TrainingState],
+                               url: Optional[str]) -> Optional[ScoringResult]:
+        """Copy of the stored result of a nearly identical listing (not the listing itself), or None"""
+        from near_duplicates import listing_text, minhash_signature
+        
+        match = self.near_duplicates.nearest(minhash_signature(listing_text(listing_data)),
+                                             self._result_version(training), exclude=url)
+        if match is None:
+            return None
+        source_url, similarity, source = match
+        return dataclasses.replace(source, breakdown=dict(source.breakdown), url=None,
+                                   source="near_duplicate", derived_from=source_url)
+    
+    def _result_version(self, training: Optional[TrainingState] = None) -> str:
+        """Everything besides the listing that a score depends on"""
+        training = training or self._training
+        return f"{self._prompt_version()}:{training.fingerprint}:{self._model_signature()}"
+    
+    def _prompt_version(self) -> str:
+        """Everything besides the listing and the training set that shapes the prompt"""
+        return (f"{PROMPT_VERSION}:{self.few_shot}:{self.examples_per_category}:{self.summary_tokens}:"
+                f"{self.output_mode}:{self.reasoning_chars}")
+    
+    def _fast_path_result(self, listing_data: Dict) -> Optional[ScoringResult]:
+        """ScoringResult from the pre-classifier, or None for borderline listings"""
+        score = self.prescreener.decide(listing_data)
+        if score is None:
+            return None
+        
+        signals = [name.split(':', 1)[1] for name in listing_features(listing_data) if ':' in name]
+        analysis = {criterion: score / 10 for criterion in self.criteria}
+        analysis["reasoning"] = f"Snelle pre-classificatie op basis van: {', '.join(signals) or 'geen signalen'}"
+        analysis["similar_to"] = "ja" if score >= SCORE_THRESHOLD else "nee"
+        
+        result = self._calculate_final_score(analysis)
+        result.source = "fast_path"
+        return result
+    
+    def _cached_result(self, listing_data: Dict, training: Optional[TrainingState] = None
+                       ) -> Tuple[Optional[str], Optional[ScoringResult]]:
+        """Look up listing_data in the result cache, returns (cache key, result or None)"""
+        if self.cache is None:
+            return None, None
+        
+        training = training or self._training
+        cache_key = make_cache_key(listing_data, self._prompt_version(), training.fingerprint, self._model_signature())
+        fields = self.cache.get(cache_key)
+        return cache_key, ScoringResult(**fields) if fields is not None else None
+    
+    def _store_result(self, cache_key: Optional[str], analysis: Dict, result: ScoringResult,
+                      api_seconds: float, listing_data: Optional[Dict] = None,
+                      training: Optional[TrainingState] = None):
+        """Cache a fresh model result, keep its raw scores and index it for near duplicates, unless the answer could not be parsed"""
+        if analysis.get("parse_failed"):
+            return
+        if cache_key is not None:
+            self.cache.put(cache_key, result, api_seconds)
+        if self.results_store is not None:
+            self.results_store.append(result.url, result.breakdown)
+        if self.near_duplicates is not None and listing_data is not None and result.url:
+            from near_duplicates import listing_text, minhash_signature
+            self.near_duplicates.add(result.url, minhash_signature(listing_text(listing_data)),
+                                     self._result_version(training), result)
+    
+    def _message_request(self, listing_data: Dict, training: Optional[TrainingState] = None) -> Dict:
+        """Arguments for messages.create, shared by the sync, async and batch paths"""
+        training = training or self._training
+        request = {
+            "model": self.model,
+            "max_tokens": self._max_tokens(),
+            "messages": [{
                 "role": "user",
-                "content": prompt
+                "content": [
+                    {
+                        "type": "text",
+                        "text": training.prefix,
+                        "cache_control": {"type": "ephemeral"}
+                    },
+                    {
+                        "type": "text",
+                        "text": self._build_listing_prompt(listing_data, training)
+                    }
+                ]
             }]
+        }
+        if self.output_mode == "tool":
+            request["tools"] = [self.score_tool()]
+            request["tool_choice"] = {"type": "tool", "name": SCORE_TOOL}
+        return request
+    
+    def _max_tokens(self) -> int:
+        """Output budget: generous by default, just above what a capped reasoning needs otherwise"""
+        if self.reasoning_chars is None:
+            return 1000
+        return 250 + int(self.reasoning_chars / CHARS_PER_TOKEN)
+    
+    def _client_options(self) -> Dict:
+        """Constructor arguments for the default Anthropic clients"""
+        options = {"api_key": self.api_key} if self.api_key else {}
+        if self.rate_limiter is not None:
+            options["max_retries"] = 0  # The limiter retries, with its own pacing
+        return options
+    
+    def _create_message(self, request: Dict, on_field: Optional[Callable[[str, Any, bool], None]] = None):
+        """messages.create (or a stream, see _stream_message), through the rate limiter when there is one"""
+        if (self.streaming or on_field is not None) and self.output_mode == "text":
+            create = functools.partial(self._stream_message, on_field)
+        else:
+            create = self.client.messages.create
+        if self.rate_limiter is None:
+            return create(**request)
+        return self.rate_limiter.call(create, request)
+    
+    async def _acreate_message(self, request: Dict):
+        """Async counterpart of _create_message"""
+        streaming = self.streaming and self.output_mode == "text"
+        create = self._astream_message if streaming else self.async_client.messages.create
+        if self.rate_limiter is None:
+            return await create(**request)
+        return await self.rate_limiter.acall(create, request)
+    
+    def _stream_message(self, on_field: Optional[Callable[[str, Any, bool], None]], **request):
+        """
+        messages.stream, parsed while it arrives.
+        
+        Returns a message-like object with the text, the usage and, when
+        every required field came in, the parsed `analysis`. With
+        stop_early the stream is closed once the required fields are
+        complete, which ends the generation: the rest of the answer is
+        never produced or billed.
+        """
+        parser, started = IncrementalJSONParser(), time.perf_counter()
+        with self.client.messages.stream(**request) as stream:
+            for chunk in stream.text_stream:
+                if self._on_stream_chunk(parser, chunk, on_field, started):
+                    return self._streamed_message(stream.current_message_snapshot, parser, stopped=True)
+            return self._streamed_message(stream.get_final_message(), parser, stopped=False)
+    
+    async def _astream_message(self, **request):
+        """Async counterpart of _stream_message"""
+        parser, started = IncrementalJSONParser(), time.perf_counter()
+        async with self.async_client.messages.stream(**request) as stream:
+            async for chunk in stream.text_stream:
+                if self._on_stream_chunk(parser, chunk, None, started):
+                    return self._streamed_message(stream.current_message_snapshot, parser, stopped=True)
+            return self._streamed_message(await stream.get_final_message(), parser, stopped=False)
+    
+    def _on_stream_chunk(self, parser: IncrementalJSONParser, chunk: str,
+                         on_field: Optional[Callable[[str, Any, bool], None]], started: float) -> bool:
+        """Feed one chunk, report fields to on_field; True when the stream can stop"""
+        first = not parser.fields
+        completed = parser.feed(chunk)
+        if completed and first:
+            self.metrics.observe("first_field", time.perf_counter() - started)
+        if on_field is not None:
+            for key, value in completed:
+                on_field(key, value, True)
+            partial = parser.partial("reasoning")
+            if partial is not None:
+                on_field("reasoning", partial, False)
+        return self.stop_early and self.required_fields <= parser.fields.keys()
+    
+    def _streamed_message(self, message, parser: IncrementalJSONParser, stopped: bool):
+        usage = getattr(message, "usage", None)
+        if stopped:
+            # The final output count never arrives for a closed stream: estimate it from the text
+            self.metrics.count("stream_early_stops")
+            usage = SimpleNamespace(**{field: getattr(usage, field, 0) or 0 for field in USAGE_FIELDS})
+            usage.output_tokens = max(usage.output_tokens, estimate_tokens(parser.text))
+        return SimpleNamespace(
+            content=[SimpleNamespace(type="text", text=parser.text)],
+            usage=usage,
+            stop_reason="fields_complete" if stopped else getattr(message, "stop_reason", None),
+            analysis=dict(parser.fields) if self.required_fields <= parser.fields.keys() else None,
         )
+    
+    def _record_usage(self, message):
+        """Add the token counts of one response to self.usage"""
+        usage = getattr(message, "usage", None)
+        if usage is None:
+            return
         
-        # Parse response
-        response_text = message.content[0].text
-        json_match = re.search(r'\{.*\}', response_text, re.DOTALL)
+        with self._usage_lock:
+            self.usage["requests"] += 1
+            for field in USAGE_FIELDS:
+                tokens = getattr(usage, field, 0) or 0
+                self.usage[field] += tokens
+                self.metrics.count(field, tokens)
+    
+    def usage_report(self) -> Dict[str, float]:
+        """
+        Cached vs. uncached input tokens over all calls so far.
         
-        if json_match:
-            analysis = json.loads(json_match.group())
-        else:
-            # Fallback
-            analysis = {
-                "natuur_nabijheid": 5,
-                "privacy_rust": 5,
-                "omgeving_kwaliteit": 5,
-                "authenticiteit": 5,
-                "bebouwing": 5,
-                "reasoning": "Kon analyse niet voltooien",
-                "similar_to": "nee",
-                "key_observations": []
-            }
+        Warns once when CACHE_CHECK_REQUESTS calls have read nothing from the
+        prompt cache: the static prefix is then most likely below the API's
+        minimum cacheable length and cache_control saves nothing.
+        """
+        with self._usage_lock:
+            usage = dict(self.usage)
+            warn = (not self._cache_warning_shown and usage["requests"] >= CACHE_CHECK_REQUESTS
+                    and usage["cache_read_input_tokens"] == 0)
+            self._cache_warning_shown |= warn
         
-        # Calculate score
-        result = self._calculate_final_score(analysis)
+        if warn:
+            print(f"⚠️  Geen prompt cache hits na {usage['requests']} calls: de vaste prefix "
+                  f"(~{estimate_tokens(self._training.prefix)} tokens) is waarschijnlijk korter dan het API "
+                  f"minimum (1024 tokens voor Sonnet). Verhoog examples_per_category (ongeveer 12 haalt het).")
         
-        return result
+        total_input = (usage["input_tokens"] + usage["cache_creation_input_tokens"]
+                       + usage["cache_read_input_tokens"])
+        usage["total_input_tokens"] = total_input
+        usage["cached_input_ratio"] = usage["cache_read_input_tokens"] / total_input if total_input else 0.0
+        return usage
     
-    def _extract_listing_data(self, html_content: str) -> Dict:
-        """Extract relevant data from HTML (same as before)"""
-        data = {
-            "description": "",
-            "location_info": "",
-            "type": "",
-            "facilities": []
+    def _parse_response(self, response_text: str) -> Dict:
+        """Pull the JSON analysis out of Claude's answer, validated; the neutral fallback if it has none"""
+        analysis = self._checked_analysis(parse_analysis(response_text))
+        return analysis if analysis is not None else self._fallback_analysis()
+    
+    async def _aparse_analysis(self, response_text: str, executor: Optional[Executor] = None) -> Optional[Dict]:
+        """parse_analysis, run in `executor` when one is given"""
+        if executor is None:
+            return parse_analysis(response_text)
+        return await asyncio.get_running_loop().run_in_executor(executor, parse_analysis, response_text)
+    
+    def _fallback_analysis(self) -> Dict:
+        """Neutral analysis for an answer without (valid) JSON"""
+        self.metrics.count("fallback_parses")
+        with self._usage_lock:
+            self.parse_stats["fallbacks"] += 1
+        return {
+            "natuur_nabijheid": 5,
+            "privacy_rust": 5,
+            "omgeving_kwaliteit": 5,
+            "authenticiteit": 5,
+            "bebouwing": 5,
+            "reasoning": "Kon analyse niet voltooien",
+            "similar_to": "nee",
+            "key_observations": [],
+            "parse_failed": True
         }
+    
+    @property
+    def client(self) -> 'Anthropic':
+        """Anthropic client, created (and the SDK imported) on first use"""
+        if self._client is None:
+            from anthropic import Anthropic
+            self._client = Anthropic(**self._client_options())
+        return self._client
+    
+    @client.setter
+    def client(self, client: 'Anthropic'):
+        self._client = client
+    
+    @property
+    def async_client(self) -> 'AsyncAnthropic':
+        """AsyncAnthropic client, created on first use by analyze_many"""
+        if self._async_client is None:
+            from anthropic import AsyncAnthropic
+            self._async_client = AsyncAnthropic(**self._client_options())
+        return self._async_client
+    
+    @async_client.setter
+    def async_client(self, client: 'AsyncAnthropic'):
+        self._async_client = client
+    
+    def fetch_page(self, url: str) -> str:
+        """Fetch a listing page through the shared PageFetcher"""
+        with self.metrics.stage("fetch"):
+            return self.fetcher.fetch(url)
+    
+    async def analyze_many(self, urls: Iterable[str], concurrency: int = 8,
+                           executor: Optional[Executor] = None) -> AsyncIterator[ScoringResult]:
+        """
+        Fetch, extract and score many URLs concurrently.
         
-        # Extract description
-        desc_pattern = r'<h2>.*?</h2>\s*<p>(.*?)</p>'
-        matches = re.findall(desc_pattern, html_content, re.DOTALL)
-        if matches:
-            data["description"] = " ".join(matches)
-        
-        # Extract location
-        if "Natuur en omgeving" in html_content:
-            env_section = html_content.split("Natuur en omgeving")[1].split("</div>")[0]
-            data["location_info"] = re.sub(r'<[^>]+>', '', env_section)[:1000]
-        
-        # Extract type
-        type_patterns = [
-            r'(Kleinschalig vakantiepark)',
-            r'(Vrijstaand)',
-            r'(Chalet)',
-            r'(Blokhut)',
-            r'(Boomhut)',
-        ]
-        for pattern in type_patterns:
-            if re.search(pattern, html_content):
-                data["type"] = re.search(pattern, html_content).group(1)
-                break
+        At most `concurrency` listings are in flight at once. Results are
+        yielded as they complete (not in input order) and carry their `url`;
+        a listing that fails gets a result with `error` set instead of
+        aborting the whole run. With an `executor` (e.g. a
+        ProcessPoolExecutor) HTML extraction and response parsing run there
+        instead of on the event loop.
+        """
+        url_iter = iter(urls)
+        results: asyncio.Queue = asyncio.Queue()
         
-        return data
+        async with self.fetcher.async_client(concurrency) as http:
+            async def worker():
+                # Workers pull from the shared iterator, so input is consumed lazily
+                try:
+                    for url in url_iter:
+                        await results.put(await self._analyze_one_async(http, url, executor))
+                finally:
+                    await results.put(None)
+            
+            workers = [asyncio.create_task(worker()) for _ in range(max(1, concurrency))]
+            try:
+                running = len(workers)
+                while running:
+                    result = await results.get()
+                    if result is None:
+                        running -= 1
+                    else:
+                        yield result
+            finally:
+                for task in workers:
+                    task.cancel()
+    
+    async def _analyze_one_async(self, http, url: str, executor: Optional[Executor] = None) -> ScoringResult:
+        """Async counterpart of fetch + analyze_listing for a single URL"""
+        try:
+            with self.metrics.stage("fetch"):
+                html_content = await self.fetcher.afetch(http, url)
+            listing_data = await self._aextract_listing_data(html_content, executor)
+            result = await self._ascore_listing_data(url, listing_data, executor)
+        except Exception as e:
+            result = self._failed_result(f"{type(e).__name__}: {e}")
+        result.url = url
+        return result
+    
+    async def _aextract_listing_data(self, html_content: str, executor: Optional[Executor] = None) -> Dict:
+        """_extract_listing_data, run in `executor` when one is given"""
+        with self.metrics.stage("extract"):
+            if executor is None:
+                return self._extract_listing_data(html_content)
+            return await asyncio.get_running_loop().run_in_executor(executor, extract_listing_data, html_content)
+    
+    async def _ascore_listing_data(self, url: str, listing_data: Dict, executor: Optional[Executor] = None,
+                                   training: Optional[TrainingState] = None) -> ScoringResult:
+        """Score already extracted listing data: cache or fast path first, then the model"""
+        if training is None:
+            self._maybe_refresh_training_data()
+            training = self._training
+        cache_key, result = self._local_result(listing_data, training, url)
+        if result is None:
+            with self.metrics.stage("prompt"):
+                request = self._message_request(listing_data, training)
+            
+            analysis, api_seconds = None, 0.0
+            for tier, model in self._model_tiers():
+                analysis, seconds = await self._arequest_analysis(dict(request, model=model), executor)
+                api_seconds += seconds
+                
+                with self.metrics.stage("score"):
+                    tier_result = self._calculate_final_score(analysis)
+                self._record_tier(tier, seconds, result, tier_result)
+                result = tier_result
+                if not self._needs_escalation(tier, analysis, result):
+                    break
+            result.url = url
+            self._store_result(cache_key, analysis, result, api_seconds, listing_data, training)
+        result.url = url
+        return result
+    
+    def _failed_result(self, error: str) -> ScoringResult:
+        """Placeholder result for a listing that could not be fetched or scored"""
+        return ScoringResult(
+            is_natuurhuisje=False,
+            confidence_score=0.0,
+            category="⚠️ Analyse mislukt",
+            reasoning="",
+            breakdown={},
+            similar_to=None,
+            error=error
+        )
+    
+    def _extract_listing_data(self, html_content: str) -> Dict:
+        """Extract relevant data from HTML, see extract_listing_data"""
+        return extract_listing_data(html_content)
     
     def _calculate_final_score(self, analysis: Dict) -> ScoringResult:
         """Calculate final score (same as before, but with similar_to)"""
@@ -264,7 +1400,7 @@ Antwoord in dit exacte JSON formaat:
             breakdown[criterion] = score
         
         # Binary classification: only JA or NEE
-        if total_score >= 60:  # Threshold for JA
+        if total_score >= SCORE_THRESHOLD:
             category = "✅ Natuurhuisje"
             is_natuurhuisje = True
         else:
@@ -277,7 +1413,9 @@ Antwoord in dit exacte JSON formaat:
             category=category,
             reasoning=analysis.get("reasoning", ""),
             breakdown=breakdown,
-            similar_to=analysis.get("similar_to", "unknown")
+            similar_to=analysis.get("similar_to", "unknown"),
+            # Neutral scores for an answer that could not be parsed: not a judgement of the listing
+            source="fallback" if analysis.get("parse_failed") else "model"
         )
     
     def format_result(self, result: ScoringResult) -> str:
@@ -298,6 +1436,8 @@ SCORE: {result.confidence_score:.1f}/100
                 'nee': '✗ Lijkt op NEE voorbeelden'
             }
             output += f"VERGELIJKBAAR MET: {similarity_label.get(result.similar_to, result.similar_to)}\n"
+        if result.derived_from:
+            output += f"OVERGENOMEN VAN: {result.derived_from} (bijna identieke listing)\n"
         
         output += "\nCRITERIUM BREAKDOWN:\n"
         
@@ -317,13 +1457,20 @@ REDENERING:
 
 
 # Convenience function
-def analyze_with_training(url: str, html_content: str, training_file: str = 'training_data.csv'):
+def analyze_with_training(url: str, html_content: str, training_file: str = 'training_data.csv',
+                          cache: Optional[ResultCache] = None):
     """Quick function to analyze with training data"""
-    agent = ImprovedNatuurhuisjeAgent(training_file=training_file)
+    agent = ImprovedNatuurhuisjeAgent(training_file=training_file, cache=cache)
     return agent.analyze_listing(url, html_content)
 
 
 if __name__ == "__main__":
+    if sys.argv[1:2] == ["score"]:
+        # Headless scoring of a URL list, see stream_scoring.py
+        from stream_scoring import main
+        main(sys.argv[2:])
+        sys.exit()
+    
     print("""
 ╔════════════════════════════════════════════════════════════╗
 ║  Natuurhuisje Agent V2 - Improved with Training Data      ║
@@ -338,5 +1485,8 @@ USAGE:
     result = agent.analyze_listing(url, html)
     print(agent.format_result(result))
 
+Grote lijsten (hervatbaar, JSONL uitvoer):
+    python natuurhuisje_agent_v2.py score urls.txt -o results.jsonl
+
 Zorg dat training_data.csv bestaat en gevuld is!
 """)
@@ -0,0 +1,149 @@
+"""
+Near-duplicate detectie over geëxtraheerde listings (MinHash + LSH)
+Bijna identieke units op hetzelfde park hergebruiken de score van een al gescoorde listing in plaats van een nieuwe Claude call
+"""
+
+import os
+import pickle
+import re
+import threading
+import zlib
+from collections import defaultdict
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+_WORD = re.compile(r'\w+', re.UNICODE)
+
+NUM_PERM = 64        # MinHash permutations per signature
+BANDS = 16           # LSH bands of NUM_PERM // BANDS rows: a 0.8 similar pair shares a band with 99.9% probability
+SHINGLE_WORDS = 3
+MIN_SHINGLES = 20    # Shorter texts (failed extraction, one-liners) are never treated as duplicates
+TEXT_FIELDS = ("type", "description", "location_info")  # The listing_data fields listing_text reads
+_PRIME = (1 << 31) - 1  # a * hash stays below 2**62, so the permutations fit in uint64
+
+_rng = np.random.RandomState(1)  # Fixed, so signatures are comparable across processes and saved indexes
+_PERM_A = _rng.randint(1, _PRIME, size=NUM_PERM).astype(np.uint64)
+_PERM_B = _rng.randint(0, _PRIME, size=NUM_PERM).astype(np.uint64)
+
+
+def listing_text(listing_data: Dict) -> str:
+    """The part of a listing that decides its score: type, description and location text"""
+    return " ".join(listing_data.get(field, "") for field in TEXT_FIELDS)
+
+
+def minhash_signature(text: str) -> Optional[np.ndarray]:
+    """MinHash over word 3-shingles (crc32, stable across processes); None if the text is too short to compare"""
+    words = _WORD.findall(text.lower())
+    shingles = {' '.join(words[i:i + SHINGLE_WORDS]) for i in range(len(words) - SHINGLE_WORDS + 1)}
+    if len(shingles) < MIN_SHINGLES:
+        return None
+    hashes = np.fromiter((zlib.crc32(shingle.encode('utf-8')) for shingle in shingles),
+                         dtype=np.uint64, count=len(shingles)) % np.uint64(_PRIME)
+    return ((np.outer(_PERM_A, hashes) + _PERM_B[:, None]) % np.uint64(_PRIME)).min(axis=1).astype(np.uint32)
+
+
+class NearDuplicateIndex:
+    """
+    LSH index of MinHash signatures, one entry per scored listing.
+
+    Each signature is cut into BANDS bands; listings sharing any band are
+    candidates, and a candidate counts as a near duplicate when the share
+    of equal signature values (the estimated Jaccard similarity of the
+    shingle sets) reaches `threshold`. A lookup hashes the query, touches
+    BANDS buckets and compares a handful of signatures, so its cost does
+    not grow with the number of indexed listings.
+
+    Every entry carries a `version` (prompt, training set and model); only
+    entries of the caller's version match, so a new prompt or training set
+    never reuses old scores. Re-adding a key replaces its entry.
+    """
+
+    def __init__(self, threshold: float = 0.8):
+        self.threshold = threshold
+        self._lock = threading.Lock()
+        self._signatures = np.empty((1024, NUM_PERM), dtype=np.uint32)
+        self._keys: List[str] = []
+        self._versions: List[str] = []
+        self._payloads: List[Any] = []
+        self._by_key: Dict[str, int] = {}
+        self._buckets: Dict[int, List[int]] = defaultdict(list)
+
+    def __len__(self) -> int:
+        return len(self._by_key)
+
+    @staticmethod
+    def _band_keys(signature: np.ndarray) -> List[int]:
+        rows = NUM_PERM // BANDS
+        return [(band << 32) | zlib.crc32(signature[band * rows:(band + 1) * rows].tobytes())
+                for band in range(BANDS)]
+
+    def add(self, key: str, signature: Optional[np.ndarray], version: str, payload: Any):
+        """Index `payload` (e.g. a ScoringResult) under `key`"""
+        if signature is None:
+            return
+        with self._lock:
+            doc_id = len(self._keys)
+            if doc_id == len(self._signatures):
+                self._signatures = np.concatenate([self._signatures, np.empty_like(self._signatures)])
+            self._signatures[doc_id] = signature
+            self._keys.append(key)
+            self._versions.append(version)
+            self._payloads.append(payload)
+            previous = self._by_key.get(key)
+            if previous is not None:
+                self._payloads[previous] = None  # Replaced; its bucket entries are skipped from now on
+            self._by_key[key] = doc_id
+            for band_key in self._band_keys(signature):
+                self._buckets[band_key].append(doc_id)
+
+    def nearest(self, signature: Optional[np.ndarray], version: str,
+                exclude: Optional[str] = None) -> Optional[Tuple[str, float, Any]]:
+        """(key, estimated similarity, payload) of the most similar entry above the threshold, or None"""
+        if signature is None:
+            return None
+        with self._lock:
+            candidates = {doc_id for band_key in self._band_keys(signature)
+                          for doc_id in self._buckets.get(band_key, ())}
+            candidates = [doc_id for doc_id in candidates
+                          if self._by_key.get(self._keys[doc_id]) == doc_id
+                          and self._versions[doc_id] == version and self._keys[doc_id] != exclude]
+            if not candidates:
+                return None
+            similarity = (self._signatures[candidates] == signature).mean(axis=1)
+            best = int(similarity.argmax())
+            if similarity[best] < self.threshold:
+                return None
+            doc_id = candidates[best]
+            return self._keys[doc_id], float(similarity[best]), self._payloads[doc_id]
+
+    def save(self, path: str):
+        """Write atomically (pickle: only load indexes this code wrote itself)"""
+        with self._lock:
+            live = sorted(self._by_key.values())
+            data = {
+                "threshold": self.threshold,
+                "num_perm": NUM_PERM,
+                "signatures": self._signatures[live],
+                "keys": [self._keys[doc_id] for doc_id in live],
+                "versions": [self._versions[doc_id] for doc_id in live],
+                "payloads": [self._payloads[doc_id] for doc_id in live],
+            }
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(data, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str, threshold: Optional[float] = None) -> 'NearDuplicateIndex':
+        """The index saved at `path`, or an empty one if there is none"""
+        if not os.path.exists(path):
+            return cls(threshold if threshold is not None else 0.8)
+        with open(path, 'rb') as f:
+            data = pickle.load(f)
+        index = cls(threshold if threshold is not None else data["threshold"])
+        if data["num_perm"] == NUM_PERM:
+            for key, signature, version, payload in zip(data["keys"], data["signatures"],
+                                                        data["versions"], data["payloads"]):
+                index.add(key, signature, version, payload)
+        return index
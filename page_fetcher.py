@@ -0,0 +1,270 @@
+"""
+Gedeelde page fetcher voor de agent en de web UI
+Connection pooling, gzip/brotli, een lokale HTTP cache met ETag/Last-Modified revalidatie en per-host pacing
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import TYPE_CHECKING, Dict, Iterable, Optional, Tuple
+from urllib.parse import urlsplit
+
+if TYPE_CHECKING:
+    import httpx
+    import requests
+
+try:
+    import brotli  # noqa: F401  (urllib3 and httpx decode "br" when it is installed)
+    ACCEPT_ENCODING = 'gzip, deflate, br'
+except ImportError:
+    ACCEPT_ENCODING = 'gzip, deflate'
+
+def default_cache_dir() -> str:
+    """Per-user page cache ($XDG_CACHE_HOME or ~/.cache), shared by the web UI and the CLIs"""
+    base = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(base, 'natuurhuisje', 'pages')
+
+
+DEFAULT_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36',
+    'Accept-Encoding': ACCEPT_ENCODING,
+}
+
+
+DEFAULT_CACHE_DIR = default_cache_dir()
+
+
+class PageNotCached(LookupError):
+    """An offline PageFetcher has no cached copy of the page"""
+
+
+class PageFetcher:
+    """
+    Fetch listing pages with keep-alive connections and a conditional-GET cache.
+
+    Pages are stored under `cache_dir` (default: default_cache_dir(), made
+    on the first write; None disables the disk cache) together with their
+    ETag and Last-Modified headers. The next fetch of the same URL sends
+    If-None-Match / If-Modified-Since, and a 304 answer is served from disk
+    without downloading the page again. Pages younger than `fresh_for`
+    seconds are returned without any request at all. With offline=True the
+    fetcher never touches the network: it serves cached copies, however
+    old, and raises PageNotCached for the rest.
+
+    `min_interval` spaces out request starts per host (politeness); it is
+    shared between the sync `fetch` and the async `afetch`. It caps the
+    throughput per host regardless of concurrency: the default 0.25 s means
+    at most 4 fetches per second to natuurhuisje.nl, so 10,000 uncached
+    pages take at least 42 minutes. Lower it (0 turns pacing off) only for
+    hosts that allow more.
+    """
+
+    def __init__(self, cache_dir: Optional[str] = DEFAULT_CACHE_DIR, timeout: float = 10.0,
+                 min_interval: float = 0.25, fresh_for: float = 0.0, pool_size: int = 16,
+                 headers: Optional[Dict[str, str]] = None, offline: bool = False):
+        self.cache_dir = cache_dir
+        self.timeout = timeout
+        self.min_interval = min_interval
+        self.fresh_for = fresh_for
+        self.offline = offline
+        self.pool_size = pool_size
+        self.headers = dict(headers or DEFAULT_HEADERS)
+        self._session = None
+        self._session_lock = threading.Lock()
+
+        self._host_lock = threading.Lock()
+        self._next_slot: Dict[str, float] = {}
+        self._stats_lock = threading.Lock()
+        self.stats = {"requests": 0, "not_modified": 0, "fresh_hits": 0, "bytes_downloaded": 0}
+        self._cache_dir_made = False
+
+    # Sync API (web UI, CLI)
+
+    @property
+    def session(self) -> 'requests.Session':
+        """Pooled requests session, created (and requests imported) on first use"""
+        with self._session_lock:
+            if self._session is None:
+                import requests
+                from requests.adapters import HTTPAdapter
+
+                session = requests.Session()
+                session.headers.update(self.headers)
+                adapter = HTTPAdapter(pool_connections=self.pool_size, pool_maxsize=self.pool_size)
+                session.mount('http://', adapter)
+                session.mount('https://', adapter)
+                self._session = session
+            return self._session
+
+    def fetch(self, url: str) -> str:
+        """Return the HTML of `url`, revalidating a cached copy when there is one"""
+        cached = self._load(url)
+        if self._serve_cached(url, cached):
+            return cached[1]
+
+        time.sleep(self._reserve_slot(url))
+        response = self.session.get(url, headers=self._conditional_headers(cached), timeout=self.timeout)
+        self._count("requests")
+
+        if response.status_code == 304 and cached is not None:
+            self._count("not_modified")
+            self._touch(url, cached[0])
+            return cached[1]
+
+        response.raise_for_status()
+        self._count("bytes_downloaded", len(response.content))
+        self._store(url, response.headers, response.text)
+        return response.text
+
+    def cached(self, url: str) -> Optional[str]:
+        """The locally cached copy of `url`, without any network access"""
+        cached = self._load(url)
+        return cached[1] if cached is not None else None
+
+    def cache_signature(self, urls: Iterable[str]) -> str:
+        """
+        Cheap fingerprint of the cached copies of `urls` (one stat per url).
+
+        Changes whenever one of them is downloaded again, so data derived
+        from cached pages can be reused until then.
+        """
+        digest = hashlib.sha256()
+        for url in urls:
+            try:
+                stat = os.stat(self._paths(url)[1]) if self.cache_dir else None
+            except OSError:
+                stat = None
+            digest.update(f"{url}\0{stat.st_mtime_ns if stat else 0}\0{stat.st_size if stat else 0}\n".encode('utf-8'))
+        return digest.hexdigest()[:16]
+
+    # Async API (analyze_many)
+
+    def async_client(self, max_connections: Optional[int] = None) -> 'httpx.AsyncClient':
+        """An httpx.AsyncClient configured like the sync session, for use with afetch"""
+        import httpx
+
+        max_connections = max_connections or self.pool_size
+        return httpx.AsyncClient(
+            headers=self.headers,
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+            timeout=self.timeout,
+            follow_redirects=True,
+        )
+
+    async def afetch(self, client: 'httpx.AsyncClient', url: str) -> str:
+        """Async counterpart of fetch, using a client from async_client()"""
+        cached = self._load(url)
+        if self._serve_cached(url, cached):
+            return cached[1]
+
+        await asyncio.sleep(self._reserve_slot(url))
+        response = await client.get(url, headers=self._conditional_headers(cached))
+        self._count("requests")
+
+        if response.status_code == 304 and cached is not None:
+            self._count("not_modified")
+            self._touch(url, cached[0])
+            return cached[1]
+
+        response.raise_for_status()
+        self._count("bytes_downloaded", len(response.content))
+        self._store(url, response.headers, response.text)
+        return response.text
+
+    # Politeness
+
+    def _reserve_slot(self, url: str) -> float:
+        """Claim the next request slot for the url's host, returns how long to wait for it"""
+        if self.min_interval <= 0:
+            return 0.0
+
+        host = urlsplit(url).netloc
+        with self._host_lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot.get(host, 0.0))
+            self._next_slot[host] = slot + self.min_interval
+        return slot - now
+
+    # Disk cache
+
+    def _paths(self, url: str) -> Tuple[str, str]:
+        name = hashlib.sha256(url.encode('utf-8')).hexdigest()
+        return os.path.join(self.cache_dir, name + '.json'), os.path.join(self.cache_dir, name + '.html')
+
+    def _load(self, url: str) -> Optional[Tuple[Dict, str]]:
+        if not self.cache_dir:
+            return None
+
+        meta_path, body_path = self._paths(url)
+        try:
+            with open(meta_path, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+            with open(body_path, 'r', encoding='utf-8') as f:
+                return meta, f.read()
+        except (OSError, ValueError):
+            return None
+
+    def _store(self, url: str, headers, body: str):
+        if not self.cache_dir:
+            return
+
+        etag = headers.get('ETag')
+        last_modified = headers.get('Last-Modified')
+        if not etag and not last_modified and self.fresh_for <= 0:
+            return  # Nothing to revalidate with, so a cached copy would never be used
+
+        if not self._cache_dir_made:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            self._cache_dir_made = True
+        meta_path, body_path = self._paths(url)
+        self._write_atomic(body_path, body)
+        self._write_atomic(meta_path, json.dumps({
+            "url": url,
+            "etag": etag,
+            "last_modified": last_modified,
+            "fetched_at": time.time(),
+        }))
+
+    def _touch(self, url: str, meta: Dict):
+        if self.fresh_for > 0:
+            meta = dict(meta, fetched_at=time.time())
+            self._write_atomic(self._paths(url)[0], json.dumps(meta))
+
+    def _serve_cached(self, url: str, cached: Optional[Tuple[Dict, str]]) -> bool:
+        """Whether the cached copy is answered without a request; raises PageNotCached offline"""
+        if cached is not None and (self.offline or self._is_fresh(cached[0])):
+            self._count("fresh_hits")
+            return True
+        if self.offline:
+            raise PageNotCached(f"{url} staat niet in de page cache (offline)")
+        return False
+
+    def _is_fresh(self, meta: Dict) -> bool:
+        return self.fresh_for > 0 and time.time() - meta.get("fetched_at", 0) < self.fresh_for
+
+    @staticmethod
+    def _conditional_headers(cached: Optional[Tuple[Dict, str]]) -> Dict[str, str]:
+        if cached is None:
+            return {}
+
+        meta = cached[0]
+        headers = {}
+        if meta.get("etag"):
+            headers['If-None-Match'] = meta["etag"]
+        if meta.get("last_modified"):
+            headers['If-Modified-Since'] = meta["last_modified"]
+        return headers
+
+    @staticmethod
+    def _write_atomic(path: str, text: str):
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(text)
+        os.replace(tmp_path, path)
+
+    def _count(self, field: str, amount: int = 1):
+        with self._stats_lock:
+            self.stats[field] += amount
@@ -0,0 +1,196 @@
+"""
+Snelle, lokale pre-classificatie van listings
+Duidelijke gevallen krijgen direct een score; alleen twijfelgevallen gaan naar Claude
+"""
+
+import json
+import math
+import os
+import re
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# Woorden die op een natuurhuisje wijzen (+) of juist op een park/stad (-)
+POSITIVE_KEYWORDS = (
+    'bos', 'heide', 'duinen', 'strand', 'bergen', 'natuurgebied', 'vrijstaand', 'privacy',
+    'rust', 'afgelegen', 'vrij uitzicht', 'weiland', 'boerderij', 'rivier', 'wild',
+)
+NEGATIVE_KEYWORDS = (
+    'vakantiepark', 'bungalowpark', 'camping', 'receptie', 'zwembad', 'animatie',
+    'speeltuin', 'centrum', 'winkels', 'restaurant', 'appartement', 'woonwijk',
+)
+
+# Hand-set starting weights, used until calibrate() has been run
+DEFAULT_WEIGHTS = {
+    'bias': 0.0,
+    'type:Kleinschalig vakantiepark': -1.5,
+    'type:Vrijstaand': 1.0,
+    'type:Chalet': -0.3,
+    'type:Blokhut': 0.8,
+    'type:Boomhut': 1.5,
+    **{f'pos:{word}': 0.4 for word in POSITIVE_KEYWORDS},
+    **{f'neg:{word}': -0.5 for word in NEGATIVE_KEYWORDS},
+}
+
+THRESHOLD = 60  # Same JA/NEE cut-off as _calculate_final_score
+
+
+def _keyword_pattern(words: Iterable[str]) -> re.Pattern:
+    """Whole-word alternation, longest first, so 'bos' misses 'Den Bosch' and 'bergen' misses 'opbergen'"""
+    alternation = "|".join(re.escape(word) for word in sorted(words, key=len, reverse=True))
+    return re.compile(rf"\b(?:{alternation})\b", re.UNICODE)
+
+
+_POSITIVE_PATTERN = _keyword_pattern(POSITIVE_KEYWORDS)
+_NEGATIVE_PATTERN = _keyword_pattern(NEGATIVE_KEYWORDS)
+
+
+def listing_features(listing_data: Dict) -> Dict[str, float]:
+    """Binary features from the output of extract_listing_data"""
+    features = {'bias': 1.0}
+    if listing_data.get('type'):
+        features[f"type:{listing_data['type']}"] = 1.0
+
+    text = f"{listing_data.get('description', '')} {listing_data.get('location_info', '')}".lower()
+    for word in _POSITIVE_PATTERN.findall(text):
+        features[f'pos:{word}'] = 1.0
+    for word in _NEGATIVE_PATTERN.findall(text):
+        features[f'neg:{word}'] = 1.0
+    return features
+
+
+class Prescreener:
+    """
+    Logistic pre-scorer over cheap listing features.
+
+    The probability of JA is mapped onto the 0-100 scale so that p = 0.5
+    lands exactly on the 60-point threshold. Listings whose estimated score
+    is at least `margin` points away from the threshold are decided locally;
+    everything in between returns None and goes to the model.
+    """
+
+    def __init__(self, weights: Optional[Dict[str, float]] = None, margin: float = 30.0):
+        self.weights = dict(weights or DEFAULT_WEIGHTS)
+        self.margin = margin
+
+    def probability(self, listing_data: Dict) -> float:
+        features = listing_features(listing_data)
+        logit = sum(self.weights.get(name, 0.0) * value for name, value in features.items())
+        return 1.0 / (1.0 + math.exp(-max(-30.0, min(30.0, logit))))
+
+    def estimate_score(self, listing_data: Dict) -> float:
+        """Estimated 0-100 score, piecewise linear in the JA probability"""
+        p = self.probability(listing_data)
+        if p >= 0.5:
+            return THRESHOLD + (p - 0.5) / 0.5 * (100 - THRESHOLD)
+        return p / 0.5 * THRESHOLD
+
+    def decide(self, listing_data: Dict) -> Optional[float]:
+        """Estimated score if the listing is clear-cut, None if it needs the model"""
+        score = self.estimate_score(listing_data)
+        if abs(score - THRESHOLD) >= self.margin:
+            return score
+        return None
+
+    def calibrate(self, samples: List[Tuple[Dict, bool]], target_accuracy: float = 0.95,
+                  l2: float = 1.0, epochs: int = 300, learning_rate: float = 0.1) -> Dict[str, float]:
+        """
+        Fit the weights on (listing_data, is_ja) pairs and pick the margin.
+
+        Weights are fitted with L2-regularised logistic regression, shrunk
+        towards DEFAULT_WEIGHTS so rare keywords keep their prior. The margin
+        is then set to the smallest value whose fast-path decisions reach
+        `target_accuracy` on the samples. Returns coverage/accuracy stats.
+        """
+        data = [(listing_features(listing_data), 1.0 if is_ja else 0.0) for listing_data, is_ja in samples]
+        if not data:
+            return {"samples": 0, "coverage": 0.0, "fast_path_accuracy": 0.0, "margin": self.margin}
+
+        names = sorted({name for features, _ in data for name in features} | set(DEFAULT_WEIGHTS))
+        weights = {name: self.weights.get(name, 0.0) for name in names}
+
+        for _ in range(epochs):
+            gradient = {name: l2 * (weights[name] - DEFAULT_WEIGHTS.get(name, 0.0)) / len(data)
+                        for name in names}
+            for features, label in data:
+                logit = sum(weights[name] * value for name, value in features.items())
+                error = 1.0 / (1.0 + math.exp(-max(-30.0, min(30.0, logit)))) - label
+                for name, value in features.items():
+                    gradient[name] += error * value / len(data)
+            for name in names:
+                weights[name] -= learning_rate * gradient[name]
+        self.weights = weights
+
+        # Smallest margin that keeps the fast path accurate enough
+        scored = [(self.estimate_score(listing_data), is_ja) for listing_data, is_ja in samples]
+        self.margin = THRESHOLD
+        for margin in range(5, THRESHOLD + 1, 5):
+            decided = [(score >= THRESHOLD) == is_ja for score, is_ja in scored
+                       if abs(score - THRESHOLD) >= margin]
+            if decided and sum(decided) / len(decided) >= target_accuracy:
+                self.margin = float(margin)
+                break
+
+        decided = [(score >= THRESHOLD) == is_ja for score, is_ja in scored
+                   if abs(score - THRESHOLD) >= self.margin]
+        return {
+            "samples": len(samples),
+            "coverage": len(decided) / len(samples),
+            "fast_path_accuracy": sum(decided) / len(decided) if decided else 0.0,
+            "margin": self.margin,
+        }
+
+    def save(self, path: str):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({"weights": self.weights, "margin": self.margin}, f, ensure_ascii=False, indent=2)
+
+    @classmethod
+    def load(cls, path: str) -> 'Prescreener':
+        if not os.path.exists(path):
+            return cls()
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        return cls(weights=data.get("weights"), margin=data.get("margin", 30.0))
+
+
+def calibrate_from_training_data(agent, prescreener: Prescreener, target_accuracy: float = 0.95) -> Dict[str, float]:
+    """
+    Calibrate against the labeled URLs in the agent's training data.
+
+    Pages are fetched through agent.fetcher, so repeated calibrations reuse
+    the local page cache. URLs that cannot be fetched are skipped.
+    """
+    samples = []
+    for category, examples in agent.training_examples.items():
+        for example in examples:
+            try:
+                html_content = agent.fetch_page(example.url)
+            except Exception as e:
+                print(f"⚠️  Overgeslagen {example.url}: {e}")
+                continue
+            samples.append((agent._extract_listing_data(html_content), category == 'ja'))
+
+    return prescreener.calibrate(samples, target_accuracy=target_accuracy)
+
+
+def main(argv: Optional[Iterable[str]] = None):
+    import argparse
+    from natuurhuisje_agent_v2 import ImprovedNatuurhuisjeAgent
+
+    parser = argparse.ArgumentParser(description="Kalibreer de pre-classifier op training_data.csv")
+    parser.add_argument('--training-file', default='training_data.csv')
+    parser.add_argument('--output', default='prescreen_weights.json')
+    parser.add_argument('--target-accuracy', type=float, default=0.95)
+    args = parser.parse_args(argv)
+
+    agent = ImprovedNatuurhuisjeAgent(training_file=args.training_file)
+    prescreener = Prescreener.load(args.output)
+    report = calibrate_from_training_data(agent, prescreener, args.target_accuracy)
+    prescreener.save(args.output)
+
+    print(f"✅ Gekalibreerd op {report['samples']} voorbeelden, opgeslagen in {args.output}")
+    print(f"   Fast path dekking: {report['coverage']:.0%}, nauwkeurigheid: {report['fast_path_accuracy']:.0%}, "
+          f"marge: ±{report['margin']:.0f} punten")
+
+
+if __name__ == '__main__':
+    main()
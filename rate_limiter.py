@@ -0,0 +1,345 @@
+"""
+Adaptieve rate limiter voor de Claude client
+Budgetteert requests en tokens per minuut, respecteert retry-after en past de concurrency aan (AIMD)
+"""
+
+import asyncio
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import Callable, Dict, Optional
+
+from instrumentation import NULL_METRICS
+
+# Worth retrying: timeouts, conflicts, rate limits, server errors and 529 overloaded
+RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504, 529}
+# Signals that we are going too fast; these shrink the concurrency window
+THROTTLE_STATUS = {429, 529}
+
+CHARS_PER_TOKEN = 3.5  # Slightly pessimistic for Dutch text, so estimates err on the high side
+
+MIN_RATE_SCALE = 0.05   # Budgets never shrink below 5% of the configured limits
+RATE_INCREASE = 0.01    # Share of the configured limits won back per successful call
+
+
+def estimate_request_tokens(request: Dict) -> int:
+    """Input tokens of a messages.create request, estimated locally from its text"""
+    chars = 0
+    system = request.get("system", "")
+    blocks = [{"text": system}] if isinstance(system, str) else list(system)
+    for message in request.get("messages", []):
+        content = message.get("content", "")
+        blocks.extend([{"text": content}] if isinstance(content, str) else content)
+    for block in blocks:
+        chars += len(block.get("text", "") or "")
+    return int(chars / CHARS_PER_TOKEN) + 1
+
+
+def retry_after_seconds(error: Exception) -> Optional[float]:
+    """The server's retry-after hint (retry-after-ms, seconds or HTTP date), if any"""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+
+    value = headers.get("retry-after-ms")
+    if value:
+        try:
+            return float(value) / 1000
+        except ValueError:
+            pass
+
+    value = headers.get("retry-after")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        try:
+            return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+        except (TypeError, ValueError):
+            return None
+
+
+def _status_code(error: Exception) -> Optional[int]:
+    return getattr(error, "status_code", None)
+
+
+def _is_connection_error(error: Exception) -> bool:
+    # anthropic.APIConnectionError (and APITimeoutError) without importing the SDK here
+    return any(cls.__name__ == "APIConnectionError" for cls in type(error).__mro__)
+
+
+class TokenBucket:
+    """
+    Token bucket refilled continuously at per_minute / 60 per second.
+
+    reserve() always succeeds and may drive the level negative; the return
+    value is how long the caller must wait for its reservation to be
+    covered. Callers are thereby served in reservation order and the
+    long-run rate never exceeds per_minute. Not thread-safe on its own.
+    """
+
+    def __init__(self, per_minute: float, burst_seconds: float = 1.0, clock: Callable[[], float] = time.monotonic):
+        self.per_minute = per_minute
+        self.burst_seconds = burst_seconds
+        self.rate = per_minute / 60.0
+        self.capacity = max(1.0, self.rate * burst_seconds)
+        self.clock = clock
+        self.level = self.capacity
+        self.updated = clock()
+
+    def set_scale(self, scale: float):
+        """Run at `scale` times per_minute (burst shrinks along)"""
+        self._refill()
+        self.rate = self.per_minute / 60.0 * scale
+        self.capacity = max(1.0, self.rate * self.burst_seconds)
+        self.level = min(self.level, self.capacity)
+
+    def _refill(self):
+        now = self.clock()
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self, amount: float) -> float:
+        self._refill()
+        self.level -= amount
+        return max(0.0, -self.level / self.rate)
+
+    def adjust(self, amount: float):
+        """Give back (positive) or charge extra (negative) after the fact"""
+        self._refill()
+        self.level = min(self.capacity, self.level + amount)
+
+
+class RateLimiter:
+    """
+    Shared limiter around messages.create.
+
+    Before a call it takes a concurrency slot and reserves one request plus
+    the estimated input tokens (and max_tokens of output, when an output
+    budget is set) from token buckets sized to the account limits, then
+    waits until the budget covers it. After the call the token buckets are
+    corrected with the actual usage.
+
+    Retryable errors are retried with jittered exponential backoff. A
+    retry-after from the server pauses all callers until then. The
+    concurrency window follows AIMD: +1/window per success, halved on a
+    429/529. A 429 also halves the request and token budgets, which then
+    grow back by RATE_INCREASE per success up to the configured limits, so
+    limits set too high (or shared with other clients) still converge.
+    Like TCP it decreases at most once per round trip: throttles of
+    requests sent before the last decrease do not count again.
+
+    One instance can be shared by the sync and async paths and across threads.
+    """
+
+    def __init__(self, requests_per_minute: float = 50, input_tokens_per_minute: Optional[float] = 30_000,
+                 output_tokens_per_minute: Optional[float] = None, max_concurrency: int = 16,
+                 min_concurrency: int = 1, max_retries: int = 6, base_backoff: float = 1.0,
+                 max_backoff: float = 60.0, burst_seconds: float = 1.0,
+                 metrics=None, clock: Callable[[], float] = time.monotonic, seed: Optional[int] = None):
+        self.max_concurrency = max_concurrency
+        self.min_concurrency = min_concurrency
+        self.max_retries = max_retries
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.metrics = metrics or NULL_METRICS
+        self.clock = clock
+        self._random = random.Random(seed)
+
+        self._requests = TokenBucket(requests_per_minute, burst_seconds, clock)
+        self._input_tokens = TokenBucket(input_tokens_per_minute, burst_seconds, clock) if input_tokens_per_minute else None
+        self._output_tokens = TokenBucket(output_tokens_per_minute, burst_seconds, clock) if output_tokens_per_minute else None
+
+        self._condition = threading.Condition()
+        self._async_waiters = []
+        self._in_flight = 0
+        self._window = float(max_concurrency)
+        self._rate_scale = 1.0
+        self._blocked_until = 0.0
+        self._last_decrease = float('-inf')
+
+        self.stats = {"calls": 0, "retries": 0, "throttled": 0, "failed": 0, "waited_seconds": 0.0}
+
+    @property
+    def concurrency(self) -> int:
+        """Current AIMD concurrency window"""
+        return max(self.min_concurrency, int(self._window))
+
+    @property
+    def rate_scale(self) -> float:
+        """Current budgets as a fraction of the configured limits"""
+        return self._rate_scale
+
+    # -- public API ----------------------------------------------------------
+
+    def call(self, create: Callable, request: Dict):
+        """create(**request) under the limiter, with retries; returns the response"""
+        estimate = self._estimate(request)
+        for attempt in range(self.max_retries + 1):
+            self._acquire_slot()
+            try:
+                self._wait(self._reserve(estimate))
+                sent = self.clock()
+                try:
+                    response = create(**request)
+                except Exception as error:
+                    delay = self._on_error(error, attempt, estimate, sent)
+                else:
+                    self._on_success(response, estimate)
+                    return response
+            finally:
+                self._release_slot()
+            self._wait(delay)
+
+    async def acall(self, create: Callable, request: Dict):
+        """Async counterpart of call() for AsyncAnthropic"""
+        estimate = self._estimate(request)
+        for attempt in range(self.max_retries + 1):
+            await self._aacquire_slot()
+            try:
+                await self._await(self._reserve(estimate))
+                sent = self.clock()
+                try:
+                    response = await create(**request)
+                except Exception as error:
+                    delay = self._on_error(error, attempt, estimate, sent)
+                else:
+                    self._on_success(response, estimate)
+                    return response
+            finally:
+                self._release_slot()
+            await self._await(delay)
+
+    # -- budget ----------------------------------------------------------------
+
+    @staticmethod
+    def _estimate(request: Dict) -> Dict[str, float]:
+        return {"input": estimate_request_tokens(request), "output": request.get("max_tokens", 0)}
+
+    def _reserve(self, estimate: Dict[str, float]) -> float:
+        """Reserve one request and its tokens; returns the seconds to wait before sending"""
+        with self._condition:
+            self.stats["calls"] += 1
+            wait = self._requests.reserve(1)
+            if self._input_tokens:
+                wait = max(wait, self._input_tokens.reserve(estimate["input"]))
+            if self._output_tokens:
+                wait = max(wait, self._output_tokens.reserve(estimate["output"]))
+            return max(wait, self._blocked_until - self.clock())
+
+    def _refund(self, estimate: Dict[str, float]):
+        """A rejected request does not count against the limits"""
+        with self._condition:
+            self._requests.adjust(1)
+            if self._input_tokens:
+                self._input_tokens.adjust(estimate["input"])
+            if self._output_tokens:
+                self._output_tokens.adjust(estimate["output"])
+
+    def _on_success(self, response, estimate: Dict[str, float]):
+        usage = getattr(response, "usage", None)
+        with self._condition:
+            if usage is not None:
+                # Cache reads do not count towards the input limit; cache writes do
+                actual = (getattr(usage, "input_tokens", 0) or 0) + (getattr(usage, "cache_creation_input_tokens", 0) or 0)
+                if self._input_tokens:
+                    self._input_tokens.adjust(estimate["input"] - actual)
+                if self._output_tokens:
+                    self._output_tokens.adjust(estimate["output"] - (getattr(usage, "output_tokens", 0) or 0))
+            # Additive increase: about +1 per window's worth of successes
+            self._window = min(float(self.max_concurrency), self._window + 1.0 / self._window)
+            if self._rate_scale < 1.0:
+                self._set_rate_scale(self._rate_scale + RATE_INCREASE)
+
+    def _on_error(self, error: Exception, attempt: int, estimate: Dict[str, float], sent: float) -> float:
+        """Seconds to wait before the next attempt, or re-raise if the error is final"""
+        status = _status_code(error)
+        retryable = status in RETRYABLE_STATUS or (status is None and _is_connection_error(error))
+        if not retryable or attempt >= self.max_retries:
+            with self._condition:
+                self.stats["failed"] += 1
+            raise error
+
+        if status in THROTTLE_STATUS:
+            self._refund(estimate)
+        retry_after = retry_after_seconds(error)
+        with self._condition:
+            self.stats["retries"] += 1
+            now = self.clock()
+            if status in THROTTLE_STATUS:
+                self.stats["throttled"] += 1
+                if sent >= self._last_decrease:
+                    # Multiplicative decrease, once per round trip
+                    self._window = max(float(self.min_concurrency), self._window / 2)
+                    if status == 429:
+                        self._set_rate_scale(self._rate_scale / 2)
+                    self._last_decrease = now
+            if retry_after is not None:
+                # Everyone waits for the server's hint, not just this caller
+                self._blocked_until = max(self._blocked_until, now + retry_after)
+                delay = 0.0
+            else:
+                delay = self._random.uniform(0, min(self.max_backoff, self.base_backoff * 2 ** attempt))
+        self.metrics.count("retries")
+        if status in THROTTLE_STATUS:
+            self.metrics.count("throttled")
+        return delay
+
+    def _set_rate_scale(self, scale: float):
+        """Scale all budgets relative to the configured limits (caller holds the lock)"""
+        self._rate_scale = max(MIN_RATE_SCALE, min(1.0, scale))
+        for bucket in (self._requests, self._input_tokens, self._output_tokens):
+            if bucket is not None:
+                bucket.set_scale(self._rate_scale)
+
+    # -- waiting -----------------------------------------------------------------
+
+    def _wait(self, seconds: float):
+        if seconds > 0:
+            with self._condition:
+                self.stats["waited_seconds"] += seconds
+            self.metrics.observe("rate_limit_wait", seconds)
+            time.sleep(seconds)
+
+    async def _await(self, seconds: float):
+        if seconds > 0:
+            with self._condition:
+                self.stats["waited_seconds"] += seconds
+            self.metrics.observe("rate_limit_wait", seconds)
+            await asyncio.sleep(seconds)
+
+    # -- concurrency window --------------------------------------------------------
+
+    def _acquire_slot(self):
+        with self._condition:
+            while self._in_flight >= self.concurrency:
+                self._condition.wait()
+            self._in_flight += 1
+
+    async def _aacquire_slot(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            with self._condition:
+                if self._in_flight < self.concurrency:
+                    self._in_flight += 1
+                    return
+                waiter = loop.create_future()
+                self._async_waiters.append((loop, waiter))
+            await waiter
+
+    def _release_slot(self):
+        with self._condition:
+            self._in_flight -= 1
+            self._condition.notify_all()
+            waiters, self._async_waiters = self._async_waiters, []
+        # Wake every async waiter; each re-checks the window under the lock
+        for loop, waiter in waiters:
+            loop.call_soon_threadsafe(_wake, waiter)
+
+
+def _wake(waiter: asyncio.Future):
+    if not waiter.done():
+        waiter.set_result(None)
@@ -0,0 +1,305 @@
+"""
+Incrementele re-crawl scheduler voor natuurhuisje.nl listings
+Bezoekt listings opnieuw op basis van hoe vaak ze veranderen en scoort alleen opnieuw als de inhoud echt veranderde
+
+Usage:
+    python recrawl_scheduler.py add urls.txt
+    python recrawl_scheduler.py run --limit 5000 --concurrency 16
+    python recrawl_scheduler.py status
+"""
+
+import asyncio
+import hashlib
+import json
+import re
+import sqlite3
+import threading
+import time
+from concurrent.futures import Executor
+from dataclasses import asdict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from natuurhuisje_agent_v2 import ImprovedNatuurhuisjeAgent, ScoringResult
+
+HOUR = 3600.0
+DAY = 24 * HOUR
+
+_LISTING_ID = re.compile(r'/vakantiehuisje/(\d+)')
+
+
+def listing_id(url: str) -> str:
+    """Numeric listing ID from a natuurhuisje.nl URL (/vakantiehuisje/90261 -> "90261"), else the URL itself"""
+    match = _LISTING_ID.search(url)
+    return match.group(1) if match else url
+
+
+def content_hash(listing_data: Dict) -> str:
+    """Hash of the extracted listing data: page changes outside it (ads, prices, markup) do not count"""
+    payload = json.dumps(listing_data, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class RecrawlScheduler:
+    """
+    Revisit listings when they are due and re-score only the ones that changed.
+
+    Per listing ID it keeps the last fetch time, the hash of the extracted
+    listing_data, the last result and a revisit interval, in SQLite. The
+    table is indexed on next_visit, which makes it a persistent priority
+    queue: run() takes the most overdue listings first. A visit whose
+    extracted data has the same hash as last time keeps the stored result
+    without a model call and stretches the interval by `slowdown`; a change
+    re-scores the listing and shrinks the interval by `speedup`, always
+    within [min_interval, max_interval]. Listings that change often are
+    thereby visited often, static ones rarely. A failed fetch, or a model
+    answer that could not be parsed (a neutral fallback result), is retried
+    after `retry_interval` and keeps the previous hash and result. A forced
+    visit (force()) re-scores without touching the learned interval.
+    """
+
+    def __init__(self, agent: ImprovedNatuurhuisjeAgent, path: str = '.recrawl_state.sqlite',
+                 initial_interval: float = DAY, min_interval: float = 6 * HOUR, max_interval: float = 30 * DAY,
+                 slowdown: float = 1.5, speedup: float = 0.5, retry_interval: float = HOUR):
+        self.agent = agent
+        self.path = path
+        self.initial_interval = initial_interval
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.slowdown = slowdown
+        self.speedup = speedup
+        self.retry_interval = retry_interval
+        self.stats = {"visited": 0, "unchanged": 0, "rescored": 0, "failed": 0}
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS listings (
+                listing_id TEXT PRIMARY KEY,
+                url TEXT NOT NULL,
+                next_visit REAL NOT NULL,
+                interval REAL NOT NULL,
+                last_fetch REAL,
+                last_change REAL,
+                content_hash TEXT,
+                last_score REAL,
+                result TEXT,
+                visits INTEGER NOT NULL DEFAULT 0,
+                changes INTEGER NOT NULL DEFAULT 0,
+                error TEXT,
+                forced INTEGER NOT NULL DEFAULT 0
+            )
+        """)
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(listings)")}
+        if "forced" not in columns:  # State files from before force() kept the hash
+            self._conn.execute("ALTER TABLE listings ADD COLUMN forced INTEGER NOT NULL DEFAULT 0")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS listings_next_visit ON listings (next_visit)")
+
+    # -- queue -----------------------------------------------------------------
+
+    def add(self, urls: Iterable[str], now: Optional[float] = None) -> int:
+        """Track new listings (due immediately); known listing IDs are left alone. Returns how many were new"""
+        now = time.time() if now is None else now
+        with self._lock:
+            before = self._conn.total_changes
+            self._conn.execute("BEGIN")
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO listings (listing_id, url, next_visit, interval) VALUES (?, ?, ?, ?)",
+                ((listing_id(url), url, now, self.initial_interval) for url in urls),
+            )
+            self._conn.execute("COMMIT")
+            return self._conn.total_changes - before
+
+    def due(self, now: Optional[float] = None, limit: Optional[int] = None) -> List[Tuple[str, str]]:
+        """(listing ID, url) of listings whose revisit time has passed, most overdue first"""
+        now = time.time() if now is None else now
+        with self._lock:
+            return self._conn.execute(
+                "SELECT listing_id, url FROM listings WHERE next_visit <= ? ORDER BY next_visit LIMIT ?",
+                (now, -1 if limit is None else limit),
+            ).fetchall()
+
+    def force(self, listing_ids: Optional[Iterable[str]] = None):
+        """Make listings due now and re-score them on the next run even if unchanged (all if None)"""
+        with self._lock:
+            if listing_ids is None:
+                self._conn.execute("UPDATE listings SET next_visit = 0, forced = 1")
+            else:
+                self._conn.executemany("UPDATE listings SET next_visit = 0, forced = 1 WHERE listing_id = ?",
+                                       ((listing_id,) for listing_id in listing_ids))
+
+    # -- visiting ----------------------------------------------------------------
+
+    async def run(self, limit: Optional[int] = None, concurrency: int = 8,
+                  executor: Optional[Executor] = None) -> Dict[str, int]:
+        """Visit the due listings (at most `limit`), `concurrency` at a time; returns this run's counts"""
+        queue: asyncio.Queue = asyncio.Queue()
+        for item in self.due(limit=limit):
+            queue.put_nowait(item)
+        counts = {"visited": 0, "unchanged": 0, "rescored": 0, "failed": 0}
+
+        async with self.agent.fetcher.async_client(concurrency) as http:
+            async def worker():
+                while not queue.empty():
+                    key, url = queue.get_nowait()
+                    outcome = await self._visit(http, key, url, executor)
+                    counts["visited"] += 1
+                    counts[outcome] += 1
+
+            await asyncio.gather(*(worker() for _ in range(max(1, concurrency))))
+
+        for name, value in counts.items():
+            self.stats[name] += value
+        return counts
+
+    async def _visit(self, http, key: str, url: str, executor: Optional[Executor]) -> str:
+        """Fetch and extract one listing; re-score it only if the extracted data changed"""
+        previous = self._state(key)
+        try:
+            with self.agent.metrics.stage("fetch"):
+                html_content = await self.agent.fetcher.afetch(http, url)
+            listing_data = await self.agent._aextract_listing_data(html_content, executor)
+            digest = content_hash(listing_data)
+            changed = digest != previous["content_hash"]
+            if not changed and not previous["forced"] and previous["result"] is not None:
+                self._record(key, previous, digest, None, changed=False)
+                return "unchanged"
+
+            result = await self.agent._ascore_listing_data(url, listing_data, executor)
+        except Exception as e:
+            self._record_failure(key, f"{type(e).__name__}: {e}")
+            return "failed"
+
+        if result.source == "fallback":
+            # Keeping this digest would make the neutral scores stick until the page changes
+            self._record_failure(key, "antwoord van het model niet te parsen")
+            return "failed"
+        self._record(key, previous, digest, result, changed=changed)
+        return "rescored"
+
+    def _state(self, key: str) -> Dict:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT interval, content_hash, result, last_fetch, forced FROM listings WHERE listing_id = ?", (key,)
+            ).fetchone()
+        return {"interval": row[0], "content_hash": row[1], "result": row[2], "last_fetch": row[3],
+                "forced": bool(row[4])}
+
+    def _next_interval(self, previous: Dict, changed: bool) -> float:
+        if previous["last_fetch"] is None or (previous["forced"] and not changed):
+            return previous["interval"]  # First or forced visit: nothing to learn from
+        factor = self.speedup if changed else self.slowdown
+        return max(self.min_interval, min(self.max_interval, previous["interval"] * factor))
+
+    def _record(self, key: str, previous: Dict, digest: str, result: Optional[ScoringResult], changed: bool):
+        now = time.time()
+        interval = self._next_interval(previous, changed)
+        with self._lock:
+            if result is None:
+                self._conn.execute(
+                    "UPDATE listings SET last_fetch = ?, next_visit = ?, interval = ?, visits = visits + 1, "
+                    "error = NULL WHERE listing_id = ?",
+                    (now, now + interval, interval, key),
+                )
+            else:
+                # A first visit is not a change, just the first version; neither is a forced re-score of the same data
+                counts_as_change = changed and previous["content_hash"] is not None
+                self._conn.execute(
+                    "UPDATE listings SET last_fetch = ?, next_visit = ?, interval = ?, visits = visits + 1, "
+                    "changes = changes + ?, last_change = CASE WHEN ? THEN ? ELSE last_change END, "
+                    "content_hash = ?, last_score = ?, result = ?, error = NULL, forced = 0 WHERE listing_id = ?",
+                    (now, now + interval, interval, int(counts_as_change), changed, now, digest,
+                     result.confidence_score, json.dumps(asdict(result), ensure_ascii=False), key),
+                )
+
+    def _record_failure(self, key: str, error: str):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "UPDATE listings SET next_visit = ?, error = ? WHERE listing_id = ?",
+                (now + self.retry_interval, error, key),
+            )
+
+    # -- reporting -------------------------------------------------------------------
+
+    def result(self, key: str) -> Optional[ScoringResult]:
+        """Last result for a listing ID (or URL), None if it was never scored"""
+        with self._lock:
+            row = self._conn.execute("SELECT result FROM listings WHERE listing_id = ?",
+                                     (listing_id(key),)).fetchone()
+        return ScoringResult(**json.loads(row[0])) if row and row[0] else None
+
+    def summary(self, now: Optional[float] = None) -> Dict[str, float]:
+        """Queue size, what is due and how intervals are spread"""
+        now = time.time() if now is None else now
+        with self._lock:
+            total, due, scored, failing, median_days = self._conn.execute(
+                "SELECT COUNT(*), SUM(next_visit <= ?), SUM(result IS NOT NULL), SUM(error IS NOT NULL), "
+                "(SELECT interval FROM listings ORDER BY interval LIMIT 1 OFFSET (SELECT COUNT(*) FROM listings) / 2) "
+                "FROM listings",
+                (now,),
+            ).fetchone()
+        return {
+            "listings": total,
+            "due": due or 0,
+            "scored": scored or 0,
+            "failing": failing or 0,
+            "median_interval_days": (median_days or 0.0) / DAY,
+        }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def main(argv: Optional[Iterable[str]] = None):
+    import argparse
+    from concurrent.futures import ProcessPoolExecutor
+    from stream_scoring import read_urls
+
+    parser = argparse.ArgumentParser(description="Bezoek listings opnieuw en scoor alleen gewijzigde opnieuw")
+    parser.add_argument('--state', default='.recrawl_state.sqlite')
+    commands = parser.add_subparsers(dest='command', required=True)
+    add = commands.add_parser('add', help="listings toevoegen (een URL per regel)")
+    add.add_argument('input')
+    run = commands.add_parser('run', help="bezoek de listings die aan de beurt zijn")
+    run.add_argument('--limit', type=int)
+    run.add_argument('--concurrency', type=int, default=8)
+    run.add_argument('--processes', type=int, default=0, help="processen voor extractie en parsing")
+    run.add_argument('--training-file', default='training_data.csv')
+    run.add_argument('--rescore-all', action='store_true', help="alles opnieuw scoren (na prompt of training wijziging)")
+    commands.add_parser('status', help="toon de stand van de queue")
+    args = parser.parse_args(argv)
+
+    if args.command == 'run':
+        from result_cache import ResultCache
+        agent = ImprovedNatuurhuisjeAgent(training_file=args.training_file, cache=ResultCache())
+    else:
+        agent = None  # add/status never score anything
+    scheduler = RecrawlScheduler(agent, args.state)
+
+    if args.command == 'add':
+        added = scheduler.add(url for _, url in read_urls(args.input) if url)
+        print(f"✅ {added} nieuwe listings toegevoegd")
+    elif args.command == 'run':
+        if args.rescore_all:
+            scheduler.force()
+        executor = ProcessPoolExecutor(args.processes) if args.processes > 0 else None
+        started = time.perf_counter()
+        try:
+            counts = asyncio.run(scheduler.run(args.limit, args.concurrency, executor))
+        finally:
+            if executor is not None:
+                executor.shutdown()
+        print(f"✅ {counts['visited']} bezocht in {time.perf_counter() - started:.0f}s: "
+              f"{counts['unchanged']} ongewijzigd, {counts['rescored']} opnieuw gescoord, {counts['failed']} mislukt")
+
+    summary = scheduler.summary()
+    print(f"   {summary['listings']} listings, {summary['due']} aan de beurt, {summary['failing']} met fouten, "
+          f"mediaan interval {summary['median_interval_days']:.1f} dagen")
+    scheduler.close()
+
+
+if __name__ == '__main__':
+    main()
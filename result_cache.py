@@ -0,0 +1,139 @@
+"""
+Persistent result cache voor de Natuurhuisje Agent
+Slaat ScoringResults lokaal op in SQLite zodat ongewijzigde listings niet opnieuw naar Claude gaan
+"""
+
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from dataclasses import asdict
+from typing import Dict, Optional
+
+
+def make_cache_key(listing_data: Dict, prompt_version: str, training_fingerprint: str, model: str) -> str:
+    """Content-addressed key: same listing + prompt + training set + model -> same key"""
+    payload = json.dumps(
+        {
+            "listing": listing_data,
+            "prompt_version": prompt_version,
+            "training": training_fingerprint,
+            "model": model,
+        },
+        sort_keys=True,
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ResultCache:
+    """
+    Disk-backed ScoringResult cache with TTL and size-bounded LRU eviction.
+
+    Every stored entry remembers how long the model call took, so `stats()`
+    can report how much API time the hits have saved.
+    """
+
+    def __init__(self, path: str = '.natuurhuisje_cache.sqlite', ttl_seconds: Optional[float] = 30 * 24 * 3600,
+                 max_entries: int = 100_000):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.saved_seconds = 0.0
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS results (
+                key TEXT PRIMARY KEY,
+                result TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                last_access REAL NOT NULL,
+                api_seconds REAL NOT NULL DEFAULT 0
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS results_last_access ON results (last_access)")
+        (self._entries,) = self._conn.execute("SELECT COUNT(*) FROM results").fetchone()
+
+    def get(self, key: str) -> Optional[Dict]:
+        """Return the stored result fields for `key`, or None on a miss"""
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT result, created_at, api_seconds FROM results WHERE key = ?", (key,)
+            ).fetchone()
+
+            if row is None:
+                self.misses += 1
+                return None
+
+            result, created_at, api_seconds = row
+            if self.ttl_seconds is not None and now - created_at > self.ttl_seconds:
+                self._conn.execute("DELETE FROM results WHERE key = ?", (key,))
+                self._entries -= 1
+                self.misses += 1
+                return None
+
+            self._conn.execute("UPDATE results SET last_access = ? WHERE key = ?", (now, key))
+            self.hits += 1
+            self.saved_seconds += api_seconds
+
+        return json.loads(result)
+
+    def put(self, key: str, result, api_seconds: float = 0.0):
+        """Store a ScoringResult (or dict of its fields) and evict the least recently used overflow"""
+        fields = result if isinstance(result, dict) else asdict(result)
+        now = time.time()
+        with self._lock:
+            existed = self._conn.execute("SELECT 1 FROM results WHERE key = ?", (key,)).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO results (key, result, created_at, last_access, api_seconds) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (key, json.dumps(fields, ensure_ascii=False), now, now, api_seconds),
+            )
+            if not existed:
+                self._entries += 1
+            if self._entries > self.max_entries:
+                cursor = self._conn.execute(
+                    "DELETE FROM results WHERE key IN "
+                    "(SELECT key FROM results ORDER BY last_access ASC LIMIT ?)",
+                    (self._entries - self.max_entries,),
+                )
+                self._entries -= cursor.rowcount
+
+    def purge_expired(self) -> int:
+        """Drop all entries older than the TTL, returns how many were removed"""
+        if self.ttl_seconds is None:
+            return 0
+        with self._lock:
+            cursor = self._conn.execute(
+                "DELETE FROM results WHERE created_at < ?", (time.time() - self.ttl_seconds,)
+            )
+            self._entries -= cursor.rowcount
+        return cursor.rowcount
+
+    def clear(self):
+        """Remove every cached result"""
+        with self._lock:
+            self._conn.execute("DELETE FROM results")
+            self._entries = 0
+
+    def stats(self) -> Dict[str, float]:
+        """Hit/miss counters and the model time saved by hits"""
+        lookups = self.hits + self.misses
+        return {
+            "entries": self._entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "saved_api_seconds": self.saved_seconds,
+        }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,246 @@
+"""
+Kolomgewijze opslag van ruwe criterium scores
+Herweeg en hertest drempels over alle gescoorde listings zonder nieuwe API calls
+"""
+
+import csv
+import glob
+import os
+import threading
+import time
+import uuid
+from itertools import product
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+# Same order as DEFAULT_CRITERIA in natuurhuisje_agent_v2 (not imported, to keep this module light)
+CRITERIA = ("natuur_nabijheid", "privacy_rust", "omgeving_kwaliteit", "authenticiteit", "bebouwing")
+
+
+class ResultsStore:
+    """
+    Append-only store of raw per-criterion scores, one row per scored listing.
+
+    Rows are buffered in memory and written by flush() as a new chunk file
+    in `directory`, so appending never rewrites earlier data. Chunk names
+    start with the write time and carry a random suffix, so several
+    processes can write to one store and chunks still sort oldest first.
+    Buffered rows are lost unless the store is flushed: call close() (or
+    use it as a context manager) when done. Columns: url (utf-8 bytes),
+    scores (float32, n x len(CRITERIA)) and scored_at (unix time).
+    """
+
+    def __init__(self, directory: str = 'results_store', flush_every: int = 1000):
+        self.directory = directory
+        self.flush_every = flush_every
+        os.makedirs(directory, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._pending_urls: List[bytes] = []
+        self._pending_scores: List[List[float]] = []
+        self._pending_times: List[float] = []
+        self._columns: Optional[Dict[str, np.ndarray]] = None
+
+    def append(self, url: str, breakdown: Dict[str, float]):
+        """Record the raw scores of one result (missing criteria are stored as NaN)"""
+        with self._lock:
+            self._pending_urls.append((url or '').encode('utf-8'))
+            self._pending_scores.append([float(breakdown.get(c, np.nan)) for c in CRITERIA])
+            self._pending_times.append(time.time())
+            should_flush = len(self._pending_urls) >= self.flush_every
+        if should_flush:
+            self.flush()
+
+    def flush(self):
+        """Write buffered rows as a new chunk file"""
+        with self._lock:
+            if not self._pending_urls:
+                return
+            urls = np.array(self._pending_urls, dtype=bytes)
+            scores = np.array(self._pending_scores, dtype=np.float32)
+            times = np.array(self._pending_times, dtype=np.float64)
+            self._pending_urls, self._pending_scores, self._pending_times = [], [], []
+            self._write_part(self._part_path(), urls, scores, times)
+            self._columns = None
+
+    def close(self):
+        """Flush the buffered rows"""
+        self.flush()
+
+    def __enter__(self) -> 'ResultsStore':
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _part_path(self) -> str:
+        # Older chunk names (part-00000.npz) sort before these, so order is kept across versions
+        return os.path.join(self.directory, f'part-{time.time_ns():020d}-{uuid.uuid4().hex[:8]}.npz')
+
+    def _write_part(self, path: str, urls: np.ndarray, scores: np.ndarray, times: np.ndarray):
+        # np.savez adds .npz to a name without it; a unique temp name per writer
+        tmp = os.path.join(self.directory, f'writing-{uuid.uuid4().hex}.tmp.npz')
+        np.savez(tmp, url=urls, scores=scores, scored_at=times, criteria=np.array(CRITERIA))
+        os.replace(tmp, path)
+
+    def columns(self, latest_only: bool = True) -> Dict[str, np.ndarray]:
+        """
+        All flushed rows as concatenated column arrays.
+
+        With latest_only=True a listing scored more than once keeps only its
+        most recent row.
+        """
+        with self._lock:
+            if self._columns is None:
+                self._columns = self._load_parts(self._part_paths())
+            columns = self._columns
+        return _latest(columns) if latest_only else columns
+
+    def compact(self):
+        """Merge all chunks into one, dropping superseded rows"""
+        self.flush()
+        with self._lock:
+            # Only the chunks read here are replaced: one another writer adds meanwhile is kept
+            old_parts = self._part_paths()
+            if not old_parts:
+                return
+            columns = _latest(self._load_parts(old_parts))
+            # The merged chunk takes the newest old name, so chunks added meanwhile still sort after it
+            self._write_part(old_parts[-1], columns["url"], columns["scores"], columns["scored_at"])
+            for path in old_parts[:-1]:
+                os.remove(path)
+            self._columns = None
+
+    def _part_paths(self) -> List[str]:
+        return sorted(glob.glob(os.path.join(self.directory, 'part-*.npz')))
+
+    @staticmethod
+    def _load_parts(paths: Sequence[str]) -> Dict[str, np.ndarray]:
+        parts = []
+        for path in paths:
+            with np.load(path) as part:
+                parts.append({name: part[name] for name in ("url", "scores", "scored_at")})
+        if not parts:
+            return {
+                "url": np.array([], dtype=bytes),
+                "scores": np.empty((0, len(CRITERIA)), dtype=np.float32),
+                "scored_at": np.array([], dtype=np.float64),
+            }
+        return {name: np.concatenate([part[name] for part in parts]) for name in ("url", "scores", "scored_at")}
+
+
+def _latest(columns: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+    """Only the last row of every url"""
+    if not len(columns["url"]):
+        return columns
+    # Last occurrence of every url: unique over the reversed array
+    _, reversed_index = np.unique(columns["url"][::-1], return_index=True)
+    keep = np.sort(len(columns["url"]) - 1 - reversed_index)
+    return {name: values[keep] for name, values in columns.items()}
+
+def weight_vector(weights: Dict[str, float]) -> np.ndarray:
+    """Criterion weights in CRITERIA order, scaled so a 0-10 score maps onto points"""
+    return np.array([weights[c] for c in CRITERIA], dtype=np.float32) / 10.0
+
+
+def rescore(scores: np.ndarray, weights: Dict[str, float], threshold: float = 60) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Vectorised _calculate_final_score over an (n x criteria) score matrix.
+
+    Missing criteria count as 5, like analysis.get(criterion, 5) does.
+    Returns (total scores, is_natuurhuisje).
+    """
+    filled = np.where(np.isnan(scores), 5.0, scores)
+    totals = filled @ weight_vector(weights)
+    return totals, totals >= threshold
+
+
+def load_labels(training_file: str = 'training_data.csv') -> Dict[str, bool]:
+    """url -> is JA, for the labeled rows in training_data.csv"""
+    labels = {}
+    with open(training_file, 'r', encoding='utf-8') as f:
+        for row in csv.DictReader(f):
+            if row['Categorie'] in ('ja', 'nee'):
+                labels[row['URL']] = row['Categorie'] == 'ja'
+    return labels
+
+
+def weight_grid(base: Dict[str, float], steps: Sequence[float] = (-10, -5, 0, 5, 10)) -> List[Dict[str, float]]:
+    """Every combination of base weights shifted by `steps` (negative weights are skipped)"""
+    grid = []
+    for deltas in product(steps, repeat=len(CRITERIA)):
+        weights = {c: base[c] + d for c, d in zip(CRITERIA, deltas)}
+        if all(w >= 0 for w in weights.values()):
+            grid.append(weights)
+    return grid
+
+
+def sweep(store: ResultsStore, labels: Dict[str, bool], weight_configs: Iterable[Dict[str, float]],
+          thresholds: Iterable[float] = (50, 55, 60, 65, 70)):
+    """
+    Evaluate every (weights, threshold) pair against the labels.
+
+    All weight configurations are applied in one matrix product over the
+    labeled rows. Returns a pandas DataFrame sorted by accuracy.
+    """
+    import pandas as pd
+
+    columns = store.columns()
+    labeled = np.isin(columns["url"], np.array([url.encode('utf-8') for url in labels], dtype=bytes))
+    truth = np.array([labels[url.decode('utf-8')] for url in columns["url"][labeled]], dtype=bool)
+    scores = np.where(np.isnan(columns["scores"][labeled]), 5.0, columns["scores"][labeled])
+
+    configs = list(weight_configs)
+    thresholds = np.asarray(list(thresholds), dtype=np.float32)
+    if not configs or not len(truth):
+        return pd.DataFrame()
+
+    weight_matrix = np.stack([weight_vector(w) for w in configs])         # (configs, criteria)
+    totals = scores @ weight_matrix.T                                     # (rows, configs)
+    predicted = totals[:, :, None] >= thresholds[None, None, :]           # (rows, configs, thresholds)
+    actual = truth[:, None, None]
+
+    tp = (predicted & actual).sum(axis=0)
+    fp = (predicted & ~actual).sum(axis=0)
+    fn = (~predicted & actual).sum(axis=0)
+    n_configs, n_thresholds = tp.shape
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        table = {
+            **{f"w_{c}": np.repeat(weight_matrix[:, k] * 10.0, n_thresholds) for k, c in enumerate(CRITERIA)},
+            "threshold": np.tile(thresholds, n_configs),
+            "accuracy": ((predicted == actual).sum(axis=0) / len(truth)).ravel(),
+            "precision": np.nan_to_num(tp / (tp + fp)).ravel(),
+            "recall": np.nan_to_num(tp / (tp + fn)).ravel(),
+            "n": len(truth),
+        }
+    return pd.DataFrame(table).sort_values("accuracy", ascending=False, kind="stable", ignore_index=True)
+
+
+def main(argv: Optional[Iterable[str]] = None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Sweep gewichten en drempels over opgeslagen scores")
+    parser.add_argument('--store', default='results_store')
+    parser.add_argument('--training-file', default='training_data.csv')
+    parser.add_argument('--top', type=int, default=10)
+    args = parser.parse_args(argv)
+
+    from natuurhuisje_agent_v2 import DEFAULT_CRITERIA
+
+    store = ResultsStore(args.store)
+    base_weights = {name: config["weight"] for name, config in DEFAULT_CRITERIA.items()}
+    started = time.perf_counter()
+    table = sweep(store, load_labels(args.training_file), weight_grid(base_weights))
+    elapsed = time.perf_counter() - started
+
+    if table.empty:
+        print("⚠️  Geen gelabelde listings in de results store")
+        return
+    print(f"✅ {len(table)} configuraties getest in {elapsed:.2f}s op {table['n'].iloc[0]} gelabelde listings")
+    print(table.head(args.top).to_string(index=False))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,316 @@
+"""
+Lokale scoring service: een warme agent achter een kleine HTTP/JSON endpoint
+Gelijktijdige aanvragen voor dezelfde URL delen een analyse, werk wacht in een begrensde queue
+
+Usage:
+    python scoring_service.py --port 8765 --concurrency 8 --queue-size 64
+    curl -s localhost:8765/score -d '{"url": "https://www.natuurhuisje.nl/vakantiehuisje/90261"}'
+    NATUURHUISJE_SERVICE_URL=http://127.0.0.1:8765 streamlit run web_ui_v2.py
+"""
+
+import asyncio
+import contextlib
+import json
+import time
+from concurrent.futures import Executor
+from dataclasses import asdict
+from typing import Dict, Iterable, Optional, Tuple
+
+from natuurhuisje_agent_v2 import ImprovedNatuurhuisjeAgent, ScoringResult
+
+MAX_BODY_BYTES = 64 * 1024
+REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+           413: "Payload Too Large", 503: "Service Unavailable"}
+
+
+class ServiceBusy(Exception):
+    """The scoring queue is full; retry later"""
+
+
+class ScoringService:
+    """
+    One shared agent that scores URLs for any number of clients.
+
+    submit() coalesces: while a URL is queued or being scored, every other
+    request for it gets the same future instead of a second fetch and model
+    call. New URLs go into a queue of at most `queue_size` entries, drained
+    by `concurrency` workers; when it is full submit() raises ServiceBusy, so
+    callers back off instead of piling up unbounded work. The HTTP client
+    (connection pool) lives as long as the service, and the agent keeps its
+    result cache, near-duplicate index and training data warm across calls.
+    """
+
+    def __init__(self, agent: ImprovedNatuurhuisjeAgent, concurrency: int = 8, queue_size: int = 64,
+                 executor: Optional[Executor] = None):
+        self.agent = agent
+        self.concurrency = concurrency
+        self.executor = executor
+        self.stats = {"requests": 0, "coalesced": 0, "rejected": 0, "scored": 0, "failed": 0}
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self._in_flight: Dict[str, asyncio.Future] = {}
+        self._workers = []
+        self._http = None
+        self._exit_stack = contextlib.AsyncExitStack()
+
+    async def start(self):
+        self._http = await self._exit_stack.enter_async_context(self.agent.fetcher.async_client(self.concurrency))
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(max(1, self.concurrency))]
+
+    async def stop(self):
+        for task in self._workers:
+            task.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        for future in self._in_flight.values():
+            if not future.done():
+                future.cancel()
+        self._in_flight.clear()
+        await self._exit_stack.aclose()
+
+    def submit(self, url: str) -> asyncio.Future:
+        """Future for url's ScoringResult, shared with any request for it already in flight"""
+        self._count("requests")
+        future = self._in_flight.get(url)
+        if future is not None:
+            self._count("coalesced")
+            return future
+
+        future = asyncio.get_running_loop().create_future()
+        try:
+            self._queue.put_nowait((url, future))
+        except asyncio.QueueFull:
+            self._count("rejected")
+            raise ServiceBusy(f"queue vol ({self._queue.maxsize} listings)")
+        self._in_flight[url] = future
+        return future
+
+    async def score(self, url: str) -> ScoringResult:
+        # Shielded: a caller that goes away must not cancel the analysis others are waiting for
+        return await asyncio.shield(self.submit(url))
+
+    async def _worker(self):
+        while True:
+            url, future = await self._queue.get()
+            try:
+                result = await self.agent._analyze_one_async(self._http, url, self.executor)
+                self._count("failed" if result.error else "scored")
+                if not future.done():
+                    future.set_result(result)
+            finally:
+                self._in_flight.pop(url, None)
+                self._queue.task_done()
+
+    def _count(self, name: str):
+        self.stats[name] += 1
+        self.agent.metrics.count(f"service_{name}")
+
+    def health(self) -> Dict:
+        return {
+            "status": "ok",
+            "queued": self._queue.qsize(),
+            "queue_size": self._queue.maxsize,
+            "in_flight": len(self._in_flight),
+            "training_examples": sum(len(examples) for examples in self.agent.training_examples.values()),
+            **self.stats,
+        }
+
+
+class ScoringServer:
+    """
+    Minimal HTTP/1.1 front end for a ScoringService (stdlib asyncio, keep-alive).
+
+        POST /score   {"url": ...}  -> ScoringResult as JSON (503 + Retry-After when the queue is full)
+        GET  /health                -> queue depth and counters
+        GET  /metrics               -> the agent's metrics in Prometheus text format
+    """
+
+    def __init__(self, service: ScoringService, host: str = '127.0.0.1', port: int = 8765):
+        self.service = service
+        self.host = host
+        self.port = port
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    async def start(self):
+        await self.service.start()
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]  # Resolves port 0
+
+    async def serve_forever(self):
+        await self.start()
+        try:
+            await self._server.serve_forever()
+        finally:
+            await self.stop()
+
+    async def stop(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+        await self.service.stop()
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                request = await self._read_request(reader)
+                if request is None:
+                    break
+                method, path, headers, body = request
+                status, content_type, payload, extra = await self._route(method, path, body)
+                keep_alive = body is not None and headers.get("connection", "").lower() != "close"
+                writer.write(self._response(status, content_type, payload, extra, keep_alive))
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass  # Gone or not speaking HTTP: drop the connection
+        finally:
+            writer.close()
+
+    @staticmethod
+    async def _read_request(reader: asyncio.StreamReader
+                            ) -> Optional[Tuple[str, str, Dict[str, str], Optional[bytes]]]:
+        line = await reader.readline()
+        if not line:
+            return None
+        method, path, _ = line.decode('latin-1').split(' ', 2)
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+        length = int(headers.get("content-length", 0))
+        if length > MAX_BODY_BYTES:
+            return method, path, headers, None  # Rejected with 413 and the connection closed, unread
+        body = await reader.readexactly(length) if length else b''
+        return method, path, headers, body
+
+    async def _route(self, method: str, path: str, body: Optional[bytes]) -> Tuple[int, str, bytes, Dict[str, str]]:
+        path = path.split('?', 1)[0]
+        if path == '/health':
+            return self._json(200, self.service.health())
+        if path == '/metrics':
+            return 200, 'text/plain; version=0.0.4', self.service.agent.metrics.to_prometheus().encode('utf-8'), {}
+        if path != '/score':
+            return self._json(404, {"error": f"onbekend pad {path}"})
+        if method != 'POST':
+            return self._json(405, {"error": "gebruik POST"})
+        if body is None:
+            return self._json(413, {"error": f"body groter dan {MAX_BODY_BYTES} bytes"})
+
+        try:
+            url = json.loads(body)["url"]
+            if not isinstance(url, str) or not url.startswith('http'):
+                raise ValueError(url)
+        except (ValueError, KeyError, TypeError):
+            return self._json(400, {"error": 'verwacht {"url": "https://..."}'})
+
+        try:
+            result = await self.service.score(url)
+        except ServiceBusy as e:
+            status, content_type, payload, _ = self._json(503, {"error": str(e)})
+            return status, content_type, payload, {"Retry-After": "1"}
+        return self._json(200, asdict(result))
+
+    @staticmethod
+    def _json(status: int, data: Dict) -> Tuple[int, str, bytes, Dict[str, str]]:
+        return status, 'application/json', json.dumps(data, ensure_ascii=False).encode('utf-8'), {}
+
+    @staticmethod
+    def _response(status: int, content_type: str, payload: bytes, extra: Dict[str, str], keep_alive: bool) -> bytes:
+        headers = [f"HTTP/1.1 {status} {REASONS.get(status, '')}",
+                   f"Content-Type: {content_type}",
+                   f"Content-Length: {len(payload)}",
+                   f"Connection: {'keep-alive' if keep_alive else 'close'}"]
+        headers += [f"{name}: {value}" for name, value in extra.items()]
+        return ("\r\n".join(headers) + "\r\n\r\n").encode('latin-1') + payload
+
+
+class ScoringServiceClient:
+    """
+    Blocking client for the service, for the Streamlit UI and batch jobs.
+
+    Uses one pooled requests session; a full queue (503) is retried with
+    the server's Retry-After up to `retries` times before ServiceBusy.
+    """
+
+    def __init__(self, base_url: str = 'http://127.0.0.1:8765', timeout: float = 120.0, retries: int = 5):
+        import requests
+
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+        self.retries = retries
+        self.session = requests.Session()
+
+    def score(self, url: str) -> ScoringResult:
+        for attempt in range(self.retries + 1):
+            response = self.session.post(f"{self.base_url}/score", json={"url": url}, timeout=self.timeout)
+            if response.status_code != 503:
+                break
+            if attempt < self.retries:
+                time.sleep(float(response.headers.get("Retry-After", 1)))
+        else:
+            raise ServiceBusy(response.json().get("error", "scoring service bezet"))
+        response.raise_for_status()
+        return ScoringResult(**response.json())
+
+    def health(self) -> Dict:
+        response = self.session.get(f"{self.base_url}/health", timeout=self.timeout)
+        response.raise_for_status()
+        return response.json()
+
+
+def main(argv: Optional[Iterable[str]] = None):
+    import argparse
+    from concurrent.futures import ProcessPoolExecutor
+    from instrumentation import Metrics
+    from near_duplicates import NearDuplicateIndex
+    from page_fetcher import PageFetcher
+    from result_cache import ResultCache
+    from results_store import ResultsStore
+
+    parser = argparse.ArgumentParser(description="Lokale scoring service rond een gedeelde, warme agent")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--concurrency', type=int, default=8, help="listings tegelijk in behandeling")
+    parser.add_argument('--queue-size', type=int, default=64, help="wachtende listings voor een 503")
+    parser.add_argument('--processes', type=int, default=0, help="processen voor extractie en parsing")
+    parser.add_argument('--training-file', default='training_data.csv')
+    parser.add_argument('--few-shot', choices=('fixed', 'nearest'), default='fixed')
+    parser.add_argument('--cache', default='.natuurhuisje_cache.sqlite', help="result cache (leeg: geen cache)")
+    parser.add_argument('--results-store', default='results_store',
+                        help="map voor de ruwe criterium scores (results_store.py; leeg: uit)")
+    parser.add_argument('--near-duplicates', default='.near_duplicates.pickle', help="near-duplicate index (leeg: uit)")
+    parser.add_argument('--cascade-model')
+    parser.add_argument('--cascade-band', type=float, default=10.0)
+    args = parser.parse_args(argv)
+
+    near_duplicates = NearDuplicateIndex.load(args.near_duplicates) if args.near_duplicates else None
+    results_store = ResultsStore(args.results_store) if args.results_store else None
+    agent = ImprovedNatuurhuisjeAgent(
+        training_file=args.training_file, few_shot=args.few_shot, metrics=Metrics(),
+        cache=ResultCache(args.cache) if args.cache else None,
+        fetcher=PageFetcher(pool_size=max(16, args.concurrency)),
+        near_duplicates=near_duplicates, results_store=results_store,
+        cascade_model=args.cascade_model, cascade_band=args.cascade_band,
+    )
+    executor = ProcessPoolExecutor(args.processes) if args.processes > 0 else None
+    server = ScoringServer(ScoringService(agent, args.concurrency, args.queue_size, executor), args.host, args.port)
+    print(f"🌲 Scoring service op http://{args.host}:{args.port} (POST /score, GET /health, GET /metrics)")
+    try:
+        asyncio.run(server.serve_forever())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
+        if near_duplicates is not None:
+            near_duplicates.save(args.near_duplicates)
+        if results_store is not None:
+            results_store.close()
+        stats = server.service.stats
+        print(f"\n✅ {stats['scored']} gescoord, {stats['coalesced']} samengevoegd, {stats['rejected']} geweigerd")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,107 @@
+"""
+Lokale similarity index over de gelabelde voorbeelden
+Kiest per listing de meest vergelijkbare JA en NEE voorbeelden voor de few-shot prompt
+"""
+
+import heapq
+import math
+import re
+import zlib
+from collections import Counter, defaultdict
+from typing import Dict, List, Optional, Tuple
+
+_WORD = re.compile(r'\w+', re.UNICODE)
+
+N_BUCKETS = 1 << 18
+MAX_QUERY_TERMS = 64      # Only the most informative query terms are scored
+MAX_DOC_FREQUENCY = 0.5   # Terms in more than half of the examples are treated as stopwords
+
+
+def hashed_ngrams(text: str) -> Counter:
+    """Word unigrams and bigrams hashed into N_BUCKETS (crc32, stable across processes)"""
+    words = _WORD.findall(text.lower())
+    grams = words + [f'{a} {b}' for a, b in zip(words, words[1:])]
+    return Counter(zlib.crc32(gram.encode('utf-8')) % N_BUCKETS for gram in grams)
+
+
+class ExampleIndex:
+    """
+    Inverted index of hashed n-gram vectors, one document per labeled example.
+
+    Documents store length-normalised term frequencies; IDF is applied to the
+    query side only, so adding a document never requires re-weighting the
+    others. Queries score only their MAX_QUERY_TERMS rarest terms and skip
+    near-stopwords, which keeps lookups sub-millisecond as the set grows.
+    """
+
+    def __init__(self):
+        self._postings: Dict[int, List[Tuple[int, float]]] = defaultdict(list)
+        self._doc_freq: Counter = Counter()
+        self._docs: List[Tuple[str, str]] = []  # (key, category) per doc id
+        self._doc_terms: List[List[int]] = []
+        self._by_key: Dict[str, int] = {}
+
+    def __len__(self) -> int:
+        return len(self._by_key)
+
+    def copy(self) -> 'ExampleIndex':
+        """Independent copy (postings lists are copied, term lists shared), to update off to the side"""
+        clone = ExampleIndex()
+        clone._postings = defaultdict(list, {term: list(postings) for term, postings in self._postings.items()})
+        clone._doc_freq = Counter(self._doc_freq)
+        clone._docs = list(self._docs)
+        clone._doc_terms = list(self._doc_terms)
+        clone._by_key = dict(self._by_key)
+        return clone
+
+    def add(self, key: str, category: str, text: str):
+        """Add (or replace) one example; cost is proportional to its own length"""
+        if key in self._by_key:
+            self.remove(key)
+
+        terms = hashed_ngrams(text)
+        norm = math.sqrt(sum(tf * tf for tf in terms.values())) or 1.0
+        doc_id = len(self._docs)
+        self._docs.append((key, category))
+        self._doc_terms.append(list(terms))
+        self._by_key[key] = doc_id
+
+        for term, tf in terms.items():
+            self._postings[term].append((doc_id, tf / norm))
+            self._doc_freq[term] += 1
+
+    def remove(self, key: str):
+        """Forget an example and drop its postings"""
+        doc_id = self._by_key.pop(key, None)
+        if doc_id is None:
+            return
+        self._docs[doc_id] = (None, None)
+        for term in self._doc_terms[doc_id]:
+            self._postings[term] = [entry for entry in self._postings[term] if entry[0] != doc_id]
+            self._doc_freq[term] -= 1
+        self._doc_terms[doc_id] = []
+
+    def nearest(self, text: str, k: int = 2, category: Optional[str] = None) -> List[Tuple[str, float]]:
+        """The k most similar example keys (optionally within one category) with their scores"""
+        n_docs = len(self._by_key)
+        if not n_docs:
+            return []
+
+        weighted = []
+        for term, tf in hashed_ngrams(text).items():
+            df = self._doc_freq.get(term, 0)
+            if df == 0 or (n_docs > 2 and df > MAX_DOC_FREQUENCY * n_docs):
+                continue
+            idf = math.log((n_docs + 1) / (df + 0.5))
+            weighted.append((tf * idf * idf, term))
+
+        scores: Dict[int, float] = defaultdict(float)
+        for weight, term in heapq.nlargest(MAX_QUERY_TERMS, weighted):
+            for doc_id, doc_weight in self._postings[term]:
+                scores[doc_id] += weight * doc_weight
+
+        candidates = (
+            (score, doc_id) for doc_id, score in scores.items()
+            if self._docs[doc_id][0] is not None and (category is None or self._docs[doc_id][1] == category)
+        )
+        return [(self._docs[doc_id][0], score) for score, doc_id in heapq.nlargest(k, candidates)]
@@ -0,0 +1,253 @@
+"""
+Streaming scoring van grote URL lijsten naar JSONL
+Hervatbaar via een checkpoint: een afgebroken run slaat al gescoorde URLs over
+
+Usage:
+    python natuurhuisje_agent_v2.py score urls.txt -o results.jsonl
+    python stream_scoring.py urls.txt -o results.jsonl --concurrency 16 --processes 4
+"""
+
+import asyncio
+import json
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict
+from typing import Deque, Dict, Iterable, Iterator, Optional, Set, Tuple
+
+from natuurhuisje_agent_v2 import ImprovedNatuurhuisjeAgent
+
+
+def read_urls(path: str) -> Iterator[Tuple[int, Optional[str]]]:
+    """(line number, url) per input line, streamed; url is None for blank and # comment lines"""
+    if path == '-':
+        yield from _numbered_urls(sys.stdin)  # Not in a with: closing stdin would outlive this read
+        return
+    with open(path, 'r', encoding='utf-8') as f:
+        yield from _numbered_urls(f)
+
+
+def _numbered_urls(lines: Iterable[str]) -> Iterator[Tuple[int, Optional[str]]]:
+    for line_number, line in enumerate(lines):
+        line = line.strip()
+        yield line_number, line if line and not line.startswith('#') else None
+
+
+class Checkpoint:
+    """
+    Which input lines are done, plus how much of the output belongs to them.
+
+    Lines below `watermark` are all done; `done` holds the finished lines
+    above it (results arrive out of order), so the state stays small however
+    long the input is. `output_bytes` is the output size when the
+    checkpoint was written: on resume the output is cut back to it, so a
+    result written after the last checkpoint is scored again instead of
+    appearing twice.
+    """
+
+    def __init__(self, path: str, input_path: str, watermark: int = 0,
+                 done: Iterable[int] = (), output_bytes: int = 0):
+        self.path = path
+        self.input_path = input_path
+        self.watermark = watermark
+        self.done: Set[int] = set(done)
+        self.output_bytes = output_bytes
+
+    @classmethod
+    def load(cls, path: str, input_path: str) -> Optional['Checkpoint']:
+        if not os.path.exists(path):
+            return None
+        with open(path, 'r', encoding='utf-8') as f:
+            state = json.load(f)
+        if state["input"] != os.path.abspath(input_path):
+            raise ValueError(f"{path} hoort bij {state['input']}, niet bij {input_path} (gebruik --restart)")
+        return cls(path, input_path, state["watermark"], state["done"], state["output_bytes"])
+
+    def is_done(self, line_number: int) -> bool:
+        return line_number < self.watermark or line_number in self.done
+
+    def mark_done(self, line_number: int):
+        self.done.add(line_number)
+        while self.watermark in self.done:
+            self.done.remove(self.watermark)
+            self.watermark += 1
+
+    def save(self, output_bytes: int):
+        # Write to a temp file first so a crash never leaves half a checkpoint behind
+        self.output_bytes = output_bytes
+        tmp_file = self.path + '.tmp'
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump({
+                "input": os.path.abspath(self.input_path),
+                "watermark": self.watermark,
+                "done": sorted(self.done),
+                "output_bytes": output_bytes,
+            }, f)
+        os.replace(tmp_file, self.path)
+
+
+class StreamScoringJob:
+    """
+    Score a URL list with bounded concurrency, one JSONL line per result.
+
+    URLs are read lazily and every ScoringResult is written (and flushed) as
+    soon as it is ready, so memory use does not grow with the input. The
+    checkpoint is written at most every `checkpoint_interval` seconds and at
+    the end; running the same command again scores only what is left,
+    including lines appended to the input since. With processes > 0 HTML
+    extraction and response parsing run in a process pool.
+    """
+
+    def __init__(self, agent: ImprovedNatuurhuisjeAgent, output: str, checkpoint_file: Optional[str] = None,
+                 concurrency: int = 8, processes: int = 0, checkpoint_interval: float = 1.0):
+        self.agent = agent
+        self.output = output
+        self.checkpoint_file = checkpoint_file or output + '.checkpoint'
+        self.concurrency = concurrency
+        self.processes = processes
+        self.checkpoint_interval = checkpoint_interval
+        self.stats = {"resumed": 0, "scored": 0, "failed": 0, "seconds": 0.0}
+
+    def run(self, input_path: str, restart: bool = False) -> Dict:
+        """Score every line of input_path that is not done yet; returns the stats"""
+        checkpoint = None if restart else Checkpoint.load(self.checkpoint_file, input_path)
+        if checkpoint is not None and self._output_size() < checkpoint.output_bytes:
+            # Output gone or cut short: the results the checkpoint counts as done are not all there
+            print(f"⚠️  {self.output} ontbreekt of is korter dan het checkpoint: opnieuw beginnen")
+            checkpoint = None
+        if checkpoint is None:
+            checkpoint = Checkpoint(self.checkpoint_file, input_path)
+            mode = 'wb'
+        else:
+            print(f"↻ Hervat vanaf regel {checkpoint.watermark + 1} ({self.checkpoint_file})")
+            mode = 'r+b'
+
+        started = time.perf_counter()
+        with open(self.output, mode) as output:
+            output.truncate(checkpoint.output_bytes)
+            output.seek(checkpoint.output_bytes)
+            executor = ProcessPoolExecutor(self.processes) if self.processes > 0 else None
+            try:
+                asyncio.run(self._score(input_path, checkpoint, output, executor))
+            finally:
+                output.flush()
+                checkpoint.save(output.tell())
+                if executor is not None:
+                    executor.shutdown(cancel_futures=True)
+                self.stats["seconds"] = time.perf_counter() - started
+        return self.stats
+
+    def _output_size(self) -> int:
+        return os.path.getsize(self.output) if os.path.exists(self.output) else -1
+
+    async def _score(self, input_path: str, checkpoint: Checkpoint, output, executor):
+        # Line numbers of the urls handed to the agent, per url (the same url may occur twice)
+        in_flight: Dict[str, Deque[int]] = {}
+
+        def pending_urls() -> Iterator[str]:
+            for line_number, url in read_urls(input_path):
+                if checkpoint.is_done(line_number):
+                    self.stats["resumed"] += url is not None
+                elif url is None:
+                    checkpoint.mark_done(line_number)
+                else:
+                    in_flight.setdefault(url, deque()).append(line_number)
+                    yield url
+
+        last_saved = time.monotonic()
+        async for result in self.agent.analyze_many(pending_urls(), self.concurrency, executor):
+            output.write(json.dumps(asdict(result), ensure_ascii=False).encode('utf-8') + b'\n')
+            output.flush()
+
+            lines = in_flight[result.url]
+            checkpoint.mark_done(lines.popleft())
+            if not lines:
+                del in_flight[result.url]
+            self.stats["failed" if result.error else "scored"] += 1
+
+            if time.monotonic() - last_saved >= self.checkpoint_interval:
+                checkpoint.save(output.tell())
+                last_saved = time.monotonic()
+
+
+def main(argv: Optional[Iterable[str]] = None):
+    import argparse
+    from instrumentation import Metrics
+    from near_duplicates import NearDuplicateIndex
+    from page_fetcher import PageFetcher
+    from rate_limiter import RateLimiter
+    from result_cache import ResultCache
+    from results_store import ResultsStore
+
+    parser = argparse.ArgumentParser(prog='natuurhuisje_agent_v2.py score',
+                                     description="Scoor een lijst URLs (een per regel) naar JSONL")
+    parser.add_argument('input', help="bestand met URLs, of - voor stdin")
+    parser.add_argument('-o', '--output', default='results.jsonl')
+    parser.add_argument('--checkpoint', help="checkpoint bestand (standaard <output>.checkpoint)")
+    parser.add_argument('--restart', action='store_true', help="negeer het checkpoint en begin opnieuw")
+    parser.add_argument('--concurrency', type=int, default=8, help="listings tegelijk in behandeling")
+    parser.add_argument('--processes', type=int, default=min(4, os.cpu_count() or 1),
+                        help="processen voor extractie en parsing (0: in het hoofdproces)")
+    parser.add_argument('--training-file', default='training_data.csv')
+    parser.add_argument('--few-shot', choices=('fixed', 'nearest'), default='fixed')
+    parser.add_argument('--cache', default='.natuurhuisje_cache.sqlite', help="result cache (leeg: geen cache)")
+    parser.add_argument('--results-store', default='results_store',
+                        help="map voor de ruwe criterium scores (results_store.py; leeg: uit)")
+    parser.add_argument('--near-duplicates', default='.near_duplicates.pickle',
+                        help="near-duplicate index, hergebruikt scores van bijna identieke listings (leeg: uit)")
+    parser.add_argument('--cascade-model', help="goedkoop model dat eerst scoort (bijv. claude-3-5-haiku-20241022)")
+    parser.add_argument('--cascade-band', type=float, default=10.0,
+                        help="scores binnen zoveel punten van de drempel gaan alsnog naar het grote model")
+    parser.add_argument('--stream', action='store_true',
+                        help="stream de antwoorden en stop zodra alle benodigde velden binnen zijn (minder output tokens)")
+    parser.add_argument('--output-mode', choices=('text', 'tool'), default='text',
+                        help="tool: antwoord via een tool met schema in plaats van JSON in de tekst")
+    parser.add_argument('--reasoning-chars', type=int, help="maximale lengte van de redenering")
+    parser.add_argument('--rpm', type=float, help="requests per minuut voor de rate limiter (standaard geen)")
+    args = parser.parse_args(argv)
+
+    if args.input == '-' and not args.restart and os.path.exists(args.checkpoint or args.output + '.checkpoint'):
+        parser.error("stdin kan niet hervat worden; gebruik een bestand of --restart")
+
+    metrics = Metrics()
+    near_duplicates = NearDuplicateIndex.load(args.near_duplicates) if args.near_duplicates else None
+    results_store = ResultsStore(args.results_store) if args.results_store else None
+    agent = ImprovedNatuurhuisjeAgent(
+        training_file=args.training_file, few_shot=args.few_shot, metrics=metrics,
+        cache=ResultCache(args.cache) if args.cache else None,
+        fetcher=PageFetcher(pool_size=max(16, args.concurrency)),
+        rate_limiter=RateLimiter(requests_per_minute=args.rpm, metrics=metrics) if args.rpm else None,
+        near_duplicates=near_duplicates, results_store=results_store,
+        cascade_model=args.cascade_model, cascade_band=args.cascade_band,
+        streaming=args.stream, output_mode=args.output_mode, reasoning_chars=args.reasoning_chars,
+    )
+    job = StreamScoringJob(agent, args.output, args.checkpoint, args.concurrency, args.processes)
+    try:
+        stats = job.run(args.input, restart=args.restart)
+    except KeyboardInterrupt:
+        print(f"\n⏸  Onderbroken; checkpoint opgeslagen in {job.checkpoint_file}, run opnieuw om te hervatten")
+        sys.exit(130)
+    finally:
+        if near_duplicates is not None:
+            near_duplicates.save(args.near_duplicates)
+        if results_store is not None:
+            results_store.close()
+
+    rate = (stats["scored"] + stats["failed"]) / stats["seconds"] if stats["seconds"] else 0.0
+    print(f"✅ {stats['scored']} gescoord, {stats['failed']} mislukt, {stats['resumed']} al klaar "
+          f"({rate:.1f} listings/s) → {args.output}")
+    parsing = agent.parse_report()
+    if parsing["invalid"]:
+        print(f"   Ongeldige antwoorden: {parsing['invalid']}/{parsing['responses']} ({parsing['invalid_rate']:.1%}), "
+              f"{parsing['retries']} opnieuw gevraagd, {parsing['fallbacks']} neutrale fallback")
+    if args.cascade_model:
+        report = agent.cascade_report()
+        print(f"   Cascade: {report['fast']['calls']} snel ({report['fast']['mean_seconds']:.2f}s), "
+              f"{report['escalated']} doorgezet ({report['escalation_rate']:.0%}), "
+              f"{report['flipped']} keer een ander oordeel")
+
+
+if __name__ == '__main__':
+    main()
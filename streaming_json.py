@@ -0,0 +1,128 @@
+"""
+Incrementele JSON parser voor gestreamde model antwoorden
+Geeft de velden van het eerste JSON object zodra ze compleet zijn, terwijl de rest nog binnenkomt
+"""
+
+import json
+from typing import Any, Dict, List, Optional, Tuple
+
+_WHITESPACE = ' \t\r\n'
+
+
+class IncrementalJSONParser:
+    """
+    Top-level fields of the first JSON object in a text that arrives in chunks.
+
+    feed() scans each chunk once, character by character, keeping only
+    the nesting depth and string/escape state; text before the opening
+    brace (a preamble like "Hier is mijn analyse:") is skipped. A field is
+    decoded with json.loads as soon as its value is complete: a string at
+    its closing quote, a number or literal at the next delimiter, an array
+    or nested object at its closing bracket. `partial()` gives the text so
+    far of a string value that is still arriving, for progressive display.
+    """
+
+    def __init__(self):
+        self.fields: Dict[str, Any] = {}
+        self.done = False  # The object's closing brace has been seen
+        self._text = ""
+        self._pos = 0
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._string_start = 0
+        self._key: Optional[str] = None        # Key whose value is expected or arriving
+        self._expect_value = False
+        self._value_start: Optional[int] = None
+
+    @property
+    def text(self) -> str:
+        """Everything fed so far"""
+        return self._text
+
+    def feed(self, chunk: str) -> List[Tuple[str, Any]]:
+        """Add a chunk; returns the (key, value) pairs it completed, in order"""
+        self._text += chunk
+        completed: List[Tuple[str, Any]] = []
+        text = self._text
+        while self._pos < len(text) and not self.done:
+            char = text[self._pos]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == '\\':
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+                    if self._depth == 1:
+                        self._end_string(completed)
+            elif self._depth == 0:
+                if char == '{':
+                    self._depth = 1
+            elif char == '"':
+                self._in_string = True
+                if self._depth == 1:
+                    self._string_start = self._pos
+                    if self._expect_value:
+                        self._start_value()
+            elif char in '{[':
+                if self._depth == 1 and self._expect_value:
+                    self._start_value()
+                self._depth += 1
+            elif char in '}]':
+                self._depth -= 1
+                if self._depth == 1 and self._value_start is not None:
+                    self._complete(text[self._value_start:self._pos + 1], completed)
+                elif self._depth == 0:
+                    self._end_scalar(completed)
+                    self.done = True
+            elif self._depth == 1:
+                if char == ',' or char in _WHITESPACE:
+                    self._end_scalar(completed)
+                elif char == ':' and self._key is not None and self._value_start is None:
+                    self._expect_value = True
+                elif self._expect_value:
+                    self._start_value()  # Number, true, false or null
+            self._pos += 1
+        return completed
+
+    def partial(self, key: str) -> Optional[str]:
+        """Decoded text so far of `key`'s string value while it is still arriving, else None"""
+        if key != self._key or self._value_start is None or not self._in_string or self._depth != 1:
+            return None
+        raw = self._text[self._value_start + 1:self._pos]
+        # An escape sequence cut off mid-way (at most "\\uXXX") fails to decode: drop it
+        for end in range(len(raw), max(-1, len(raw) - 6), -1):
+            try:
+                return json.loads(f'"{raw[:end]}"')
+            except ValueError:
+                continue
+        return raw
+
+    def _start_value(self):
+        self._value_start = self._pos
+        self._expect_value = False
+
+    def _end_string(self, completed: List[Tuple[str, Any]]):
+        literal = self._text[self._string_start:self._pos + 1]
+        if self._value_start is not None:
+            self._complete(literal, completed)
+        elif not self._expect_value:
+            try:
+                self._key = json.loads(literal)
+            except ValueError:
+                self._key = None
+
+    def _end_scalar(self, completed: List[Tuple[str, Any]]):
+        if self._value_start is not None:
+            self._complete(self._text[self._value_start:self._pos], completed)
+
+    def _complete(self, literal: str, completed: List[Tuple[str, Any]]):
+        key = self._key
+        self._key, self._value_start, self._expect_value = None, None, False
+        try:
+            value = json.loads(literal)
+        except ValueError:
+            return  # Malformed value: leave the field out, like a missing one
+        self.fields[key] = value
+        completed.append((key, value))
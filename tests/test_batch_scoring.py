@@ -0,0 +1,146 @@
+"""
+Tests voor BatchScoringJob met een batch backend in het geheugen
+Hervatten, de input fingerprint, de submitting guard, dubbele URLs en de volgorde van de resultaten
+
+    python -m unittest discover tests
+"""
+
+import json
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from batch_scoring import BatchScoringJob
+from natuurhuisje_agent_v2 import ImprovedNatuurhuisjeAgent
+from near_duplicates import NearDuplicateIndex
+from result_cache import ResultCache
+
+TRAINING_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'training_data.csv')
+
+ANSWER = json.dumps({
+    "natuur_nabijheid": 8, "privacy_rust": 7, "omgeving_kwaliteit": 8, "authenticiteit": 9, "bebouwing": 8,
+    "reasoning": "Vrijstaande blokhut midden in het bos.", "similar_to": "ja",
+})
+
+
+def page(number: int) -> str:
+    """A listing page with a description long enough for a near-duplicate signature"""
+    return (f"<html><body><h2>Over deze accommodatie</h2><p>Blokhut nummer {number} ligt vrijstaand midden "
+            f"in een groot bos met heide, ver van de weg, met een eigen tuin, een houtkachel en een terras "
+            f"waar je 's avonds herten ziet lopen langs de bosrand achter het huisje {number}.</p></body></html>")
+
+
+class MemoryBackend:
+    """Stores submitted requests and answers every one of them with ANSWER once finished"""
+
+    def __init__(self, fail_submit: bool = False):
+        self.fail_submit = fail_submit
+        self.batches = {}
+        self.finished = True
+
+    def submit(self, requests):
+        if self.fail_submit:
+            raise ConnectionError("verbinding verbroken tijdens indienen")
+        batch_id = f"batch-{len(self.batches)}"
+        self.batches[batch_id] = [request["custom_id"] for request in requests]
+        return batch_id
+
+    def is_finished(self, batch_id):
+        return self.finished
+
+    def results(self, batch_id):
+        for custom_id in self.batches[batch_id]:
+            yield custom_id, ANSWER, None
+
+
+class BatchScoringJobTest(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.state_file = os.path.join(self._tmp.name, 'batch_state.json')
+        self.cache = ResultCache(os.path.join(self._tmp.name, 'cache.sqlite'))
+        self.agent = ImprovedNatuurhuisjeAgent(training_file=TRAINING_FILE, cache=self.cache)
+        self.listings = [(f"https://www.natuurhuisje.nl/vakantiehuisje/{i:02d}", page(i)) for i in range(6)]
+
+    def tearDown(self):
+        self.cache.close()
+        self._tmp.cleanup()
+
+    def job(self, backend, agent=None) -> BatchScoringJob:
+        return BatchScoringJob(agent or self.agent, backend=backend, state_file=self.state_file, poll_interval=0.0)
+
+    def test_results_follow_input_order_with_local_answers(self):
+        url, html_content = self.listings[3]
+        self.job(MemoryBackend()).run([(url, html_content)])  # Now in the result cache
+
+        backend = MemoryBackend()
+        results = self.job(backend).run(self.listings)
+
+        self.assertEqual([result.url for result in results], [url for url, _ in self.listings])
+        self.assertEqual(len(backend.batches["batch-0"]), 5)
+        self.assertFalse(os.path.exists(self.state_file))
+
+    def test_duplicate_urls_are_submitted_once(self):
+        backend = MemoryBackend()
+        results = self.job(backend).run(self.listings + self.listings[:2])
+
+        submitted = backend.batches["batch-0"]
+        self.assertEqual(len(submitted), len(set(submitted)))
+        self.assertEqual(len(submitted), 6)
+        self.assertEqual([result.url for result in results], [url for url, _ in self.listings])
+
+    def test_resumes_the_batch_after_a_restart(self):
+        backend = MemoryBackend()
+        backend.finished = False
+        job = self.job(backend)
+        job._wait = lambda batch_id: (_ for _ in ()).throw(KeyboardInterrupt)  # Killed while waiting
+        with self.assertRaises(KeyboardInterrupt):
+            job.run(self.listings)
+        self.assertTrue(os.path.exists(self.state_file))
+
+        backend.finished = True
+        results = self.job(backend).run(self.listings)
+
+        self.assertEqual(list(backend.batches), ["batch-0"])  # Not submitted again
+        self.assertEqual([result.url for result in results], [url for url, _ in self.listings])
+        self.assertTrue(all(result.source == "model" for result in results))
+
+    def test_state_file_of_another_input_is_refused(self):
+        backend = MemoryBackend()
+        backend.finished = False
+        job = self.job(backend)
+        job._wait = lambda batch_id: (_ for _ in ()).throw(KeyboardInterrupt)
+        with self.assertRaises(KeyboardInterrupt):
+            job.run(self.listings)
+
+        with self.assertRaises(ValueError):
+            self.job(backend).run(self.listings[:3])
+
+    def test_interrupted_submission_is_not_submitted_again(self):
+        with self.assertRaises(ConnectionError):
+            self.job(MemoryBackend(fail_submit=True)).run(self.listings)
+
+        backend = MemoryBackend()
+        with self.assertRaises(RuntimeError):
+            self.job(backend).run(self.listings)
+        self.assertEqual(backend.batches, {})
+
+    def test_batch_answers_are_indexed_for_near_duplicates(self):
+        index = NearDuplicateIndex()
+        agent = ImprovedNatuurhuisjeAgent(training_file=TRAINING_FILE, near_duplicates=index)
+        self.job(MemoryBackend(), agent).run(self.listings[:1])
+
+        self.assertEqual(len(index), 1)
+        _, result = agent._local_result(agent._extract_listing_data(page(0)), url="https://elders.example/0")
+        self.assertEqual(result.source, "near_duplicate")
+
+    def test_cascade_agents_are_refused(self):
+        agent = ImprovedNatuurhuisjeAgent(training_file=TRAINING_FILE, cascade_model="claude-3-5-haiku-latest")
+        with self.assertRaises(ValueError):
+            self.job(MemoryBackend(), agent)
+
+
+if __name__ == '__main__':
+    unittest.main()
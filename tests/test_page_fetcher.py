@@ -0,0 +1,156 @@
+"""
+Tests voor PageFetcher tegen een lokale stub server
+Conditional GET, de disk cache, offline mode, pacing en de async API
+
+    python -m unittest discover tests
+"""
+
+import asyncio
+import os
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from page_fetcher import PageFetcher, PageNotCached
+
+ETAG = '"v1"'
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """/etag answers with an ETag and 304 on a match, /plain without validators, /missing with 404"""
+
+    def do_GET(self):
+        self.server.hits.append((self.path, dict(self.headers), time.monotonic()))
+        if self.path == '/missing':
+            self.send_error(404)
+            return
+        if self.path == '/etag' and self.headers.get('If-None-Match') == ETAG:
+            self.send_response(304)
+            self.end_headers()
+            return
+
+        body = f"<html><body>{self.path}</body></html>".encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        if self.path == '/etag':
+            self.send_header('ETag', ETAG)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class PageFetcherTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server = ThreadingHTTPServer(('127.0.0.1', 0), StubHandler)
+        cls.server.hits = []
+        cls.base = f"http://127.0.0.1:{cls.server.server_address[1]}"
+        cls.thread = threading.Thread(target=cls.server.serve_forever, daemon=True)
+        cls.thread.start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        self.server.hits.clear()
+        self._tmp = tempfile.TemporaryDirectory()
+        self.cache_dir = os.path.join(self._tmp.name, 'pages')
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def fetcher(self, **kwargs) -> PageFetcher:
+        kwargs.setdefault('cache_dir', self.cache_dir)
+        kwargs.setdefault('min_interval', 0.0)
+        return PageFetcher(**kwargs)
+
+    def test_revalidates_with_etag_and_serves_304_from_cache(self):
+        fetcher = self.fetcher()
+        first = fetcher.fetch(self.base + '/etag')
+        second = fetcher.fetch(self.base + '/etag')
+
+        self.assertEqual(first, second)
+        self.assertIn('/etag', first)
+        self.assertEqual(len(self.server.hits), 2)
+        self.assertNotIn('If-None-Match', self.server.hits[0][1])
+        self.assertEqual(self.server.hits[1][1].get('If-None-Match'), ETAG)
+        self.assertEqual(fetcher.stats["requests"], 2)
+        self.assertEqual(fetcher.stats["not_modified"], 1)
+        self.assertEqual(fetcher.cached(self.base + '/etag'), first)
+
+    def test_page_without_validators_is_not_cached(self):
+        fetcher = self.fetcher()
+        fetcher.fetch(self.base + '/plain')
+        fetcher.fetch(self.base + '/plain')
+
+        self.assertEqual(len(self.server.hits), 2)
+        self.assertIsNone(fetcher.cached(self.base + '/plain'))
+        self.assertFalse(os.path.exists(self.cache_dir))  # Made on the first write only
+
+    def test_fresh_pages_skip_the_request(self):
+        fetcher = self.fetcher(fresh_for=60.0)
+        fetcher.fetch(self.base + '/plain')
+        fetcher.fetch(self.base + '/plain')
+
+        self.assertEqual(len(self.server.hits), 1)
+        self.assertEqual(fetcher.stats["fresh_hits"], 1)
+
+    def test_offline_never_touches_the_network(self):
+        self.fetcher().fetch(self.base + '/etag')
+        self.server.hits.clear()
+
+        offline = self.fetcher(offline=True)
+        self.assertIn('/etag', offline.fetch(self.base + '/etag'))
+        with self.assertRaises(PageNotCached):
+            offline.fetch(self.base + '/plain')
+        self.assertEqual(self.server.hits, [])
+
+    def test_no_cache_dir_keeps_nothing_on_disk(self):
+        fetcher = self.fetcher(cache_dir=None)
+        fetcher.fetch(self.base + '/etag')
+        fetcher.fetch(self.base + '/etag')
+
+        self.assertEqual(fetcher.stats["not_modified"], 0)
+        self.assertIsNone(fetcher.cached(self.base + '/etag'))
+
+    def test_http_errors_raise(self):
+        import requests
+
+        with self.assertRaises(requests.HTTPError):
+            self.fetcher().fetch(self.base + '/missing')
+
+    def test_min_interval_spaces_requests_per_host(self):
+        fetcher = self.fetcher(min_interval=0.1)
+        for _ in range(3):
+            fetcher.fetch(self.base + '/plain')
+
+        starts = [hit[2] for hit in self.server.hits]
+        self.assertGreaterEqual(starts[-1] - starts[0], 0.18)
+
+    def test_afetch_shares_the_cache_with_fetch(self):
+        fetcher = self.fetcher()
+        fetcher.fetch(self.base + '/etag')
+
+        async def run():
+            async with fetcher.async_client() as http:
+                return await asyncio.gather(*(fetcher.afetch(http, self.base + path) for path in ('/etag', '/plain')))
+
+        etag_page, plain_page = asyncio.run(run())
+        self.assertIn('/etag', etag_page)
+        self.assertIn('/plain', plain_page)
+        self.assertEqual(fetcher.stats["not_modified"], 1)
+        self.assertEqual(fetcher.stats["requests"], 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
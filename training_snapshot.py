@@ -0,0 +1,101 @@
+"""
+Binaire snapshot van de geparste training data
+Slaat het parsen van training_data.csv (en het herbouwen van prompt en index) over zolang de CSV niet verandert
+"""
+
+import os
+import pickle
+from typing import Callable, Dict, List, Optional, Tuple
+
+SNAPSHOT_VERSION = 2
+
+# (url, score, reasoning, key_features) per example, grouped by category
+ExampleRows = Dict[str, List[Tuple[str, float, str, List[str]]]]
+
+
+def snapshot_path(training_file: str) -> str:
+    """Hidden file next to the CSV: training_data.csv -> .training_data.csv.snapshot"""
+    directory, name = os.path.split(os.path.abspath(training_file))
+    return os.path.join(directory, f'.{name}.snapshot')
+
+
+def source_stamp(training_file: str) -> Optional[Tuple[int, int]]:
+    """(size, mtime_ns) of the CSV, or None if it does not exist"""
+    try:
+        stat = os.stat(training_file)
+    except OSError:
+        return None
+    return stat.st_size, stat.st_mtime_ns
+
+
+class TrainingSnapshot:
+    """
+    Parsed training examples plus data derived from them, for one version of the CSV.
+
+    `stamp` is the CSV's (size, mtime_ns); a snapshot whose stamp no longer
+    matches is ignored and rebuilt. Derived data (prompt prefix, similarity
+    index) is stored under caller-chosen keys, so each agent configuration
+    adds its own entries to the same file. Stored with pickle: only load
+    snapshots this code wrote itself.
+    """
+
+    def __init__(self, stamp: Tuple[int, int], examples: ExampleRows, fingerprint: str,
+                 derived: Optional[Dict] = None, content_hash: Optional[str] = None):
+        self.stamp = stamp
+        self.examples = examples
+        self.fingerprint = fingerprint
+        self.derived = derived or {}
+        self.content_hash = content_hash  # sha256 of the CSV bytes, used to detect appends
+        self.dirty = True
+
+    @classmethod
+    def load(cls, path: str, stamp: Tuple[int, int]) -> Optional['TrainingSnapshot']:
+        """The snapshot at `path` if it is readable and still matches `stamp`"""
+        try:
+            with open(path, 'rb') as f:
+                data = pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError, AttributeError, ImportError, ValueError):
+            return None
+        if not isinstance(data, dict) or data.get("version") != SNAPSHOT_VERSION or tuple(data.get("stamp", ())) != stamp:
+            return None
+
+        snapshot = cls(stamp, data["examples"], data["fingerprint"], data["derived"], data["content_hash"])
+        snapshot.dirty = False
+        return snapshot
+
+    def derive(self, key: Tuple, build: Callable, exclusive: bool = False):
+        """
+        The derived value stored under `key`, building (and keeping) it if missing.
+
+        With exclusive=True other entries of the same kind (key[0]) are
+        dropped when a new one is built, for data that goes stale.
+        """
+        if key not in self.derived:
+            if exclusive:
+                for stale in [other for other in self.derived if other[0] == key[0]]:
+                    del self.derived[stale]
+            self.derived[key] = build()
+            self.dirty = True
+        return self.derived[key]
+
+    def save(self, path: str):
+        """Write atomically; a read-only location just means no snapshot next time"""
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        data = {
+            "version": SNAPSHOT_VERSION,
+            "stamp": self.stamp,
+            "examples": self.examples,
+            "fingerprint": self.fingerprint,
+            "derived": self.derived,
+            "content_hash": self.content_hash,
+        }
+        try:
+            with open(tmp_path, 'wb') as f:
+                pickle.dump(data, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, path)
+            self.dirty = False
+        except OSError:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
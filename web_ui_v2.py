@@ -4,14 +4,20 @@ Run with: streamlit run web_ui_v2.py
 """
 
 import streamlit as st
-import requests
 import os
 import sys
+import threading
+import time
 
 # Add current directory to path for imports
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
 from natuurhuisje_agent_v2 import ImprovedNatuurhuisjeAgent, ScoringResult
+from bulk_jobs import BulkJobManager, read_url_csv
+from instrumentation import Metrics
+from page_fetcher import PageFetcher
+from prescreen import Prescreener
+from result_cache import ResultCache
 
 # Page config
 st.set_page_config(
@@ -56,14 +62,43 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
+@st.cache_resource
+def load_fetcher() -> PageFetcher:
+    """Shared fetcher: keeps connections and the page cache warm across reruns"""
+    return PageFetcher()
+
+@st.cache_resource
+def load_service_client():
+    """Client for a running scoring_service.py (NATUURHUISJE_SERVICE_URL), None to score in this process"""
+    base_url = os.environ.get('NATUURHUISJE_SERVICE_URL')
+    if not base_url:
+        return None
+    from scoring_service import ScoringServiceClient
+    return ScoringServiceClient(base_url)
+
 def fetch_page_content(url: str) -> str:
     """Fetch HTML content from a URL"""
-    headers = {
-        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
-    }
-    response = requests.get(url, headers=headers, timeout=10)
-    response.raise_for_status()
-    return response.text
+    agent = load_agent()
+    return agent.fetch_page(url) if agent else load_fetcher().fetch(url)
+
+def live_breakdown(placeholder, agent: ImprovedNatuurhuisjeAgent):
+    """on_field callback for analyze_listing: fills in scores and reasoning while the answer streams in"""
+    container = placeholder.container()
+    container.subheader("📊 Criterium Breakdown")
+    cols = container.columns(2)
+    slots = {criterion: cols[idx % 2].empty() for idx, criterion in enumerate(agent.criteria)}
+    for criterion, slot in slots.items():
+        slot.metric(label=agent.criteria[criterion]['description'], value="…")
+    container.subheader("💭 AI Redenering")
+    reasoning = container.empty()
+    
+    def on_field(key, value, done):
+        if key in slots and done and isinstance(value, (int, float)):
+            slots[key].metric(label=agent.criteria[key]['description'], value=f"{value:.1f}/10")
+        elif key == "reasoning" and isinstance(value, str):
+            reasoning.info(value if done else value + " ▌")
+    
+    return on_field
 
 def get_score_class(score: float) -> str:
     """Determine CSS class based on score"""
@@ -74,18 +109,93 @@ def get_score_class(score: float) -> str:
     else:
         return "score-low"
 
+def _warm_up(agent: ImprovedNatuurhuisjeAgent):
+    """Import the Anthropic SDK and Streamlit's chart dependencies ahead of the first request"""
+    try:
+        agent.client
+        import pandas  # noqa: F401  (st.bar_chart converts through pandas)
+    except Exception:
+        pass  # The request path will surface any real error
+
 # Initialize agent (cached)
 @st.cache_resource
 def load_agent():
     """Load agent with training data"""
     try:
-        agent = ImprovedNatuurhuisjeAgent(training_file='training_data.csv')
+        # Fast path alleen als de pre-classifier gekalibreerd is (python prescreen.py)
+        prescreener = Prescreener.load('prescreen_weights.json') if os.path.exists('prescreen_weights.json') else None
+        agent = ImprovedNatuurhuisjeAgent(training_file='training_data.csv', fetcher=load_fetcher(),
+                                          prescreener=prescreener, metrics=Metrics(), cache=ResultCache())
+        # Warm up the modules the first analysis needs in the background, not on the first click
+        threading.Thread(target=_warm_up, args=(agent,), daemon=True).start()
         return agent
     except Exception as e:
         st.error(f"⚠️ Kon agent niet laden: {e}")
         st.info("Zorg dat training_data.csv bestaat in dezelfde map.")
         return None
 
+@st.cache_resource
+def load_bulk_jobs():
+    """Background job runner, shared by all sessions so jobs outlive reruns"""
+    agent = load_agent()
+    return BulkJobManager(agent, concurrency=8) if agent else None
+
+def format_seconds(seconds) -> str:
+    if seconds is None:
+        return "–"
+    minutes, seconds = divmod(int(seconds), 60)
+    return f"{minutes}m {seconds:02d}s" if minutes else f"{seconds}s"
+
+def render_bulk_page(agent: ImprovedNatuurhuisjeAgent):
+    """Bulk mode: upload a CSV of URLs, score it in the background, follow progress and download the results"""
+    manager = load_bulk_jobs()
+    
+    uploaded = st.file_uploader("📄 Upload een CSV met natuurhuisje.nl URLs (kolom 'url', of één URL per regel)",
+                                type=["csv", "txt"])
+    if uploaded is not None:
+        urls = read_url_csv(uploaded.getvalue())
+        st.caption(f"{len(urls)} unieke URLs gevonden in {uploaded.name}")
+        if urls and st.button("🚀 Start bulk analyse", type="primary"):
+            st.session_state['bulk_job'] = manager.submit(uploaded.name, urls).id
+    
+    job = manager.get(st.session_state.get('bulk_job', ''))
+    if job is None:
+        return
+    
+    progress = job.progress()
+    st.subheader(f"📦 {job.name}")
+    st.progress(progress['done'] / progress['total'] if progress['total'] else 1.0,
+                text=f"{progress['done']} van {progress['total']} klaar")
+    cols = st.columns(4)
+    cols[0].metric("Klaar", f"{progress['done']}/{progress['total']}")
+    cols[1].metric("Doorvoer", f"{progress['rate']:.1f} /s")
+    cols[2].metric("Resterend" if job.running else "Duur",
+                   format_seconds(progress['eta'] if job.running else progress['elapsed']))
+    cols[3].metric("Hergebruikt", progress['reused'], help="Eerder gescoord, zonder nieuwe fetch of AI call")
+    if progress['failed']:
+        st.warning(f"⚠️ {progress['failed']} URLs mislukt (zie kolom 'fout')")
+    
+    rows = job.rows(agent.criteria)
+    if rows:
+        st.dataframe(rows, use_container_width=True, hide_index=True)
+    
+    if job.running:
+        if st.button("⏹️ Annuleer"):
+            job.cancel()
+        # Poll: the job runs on its own thread, this rerun only redraws its progress
+        time.sleep(1)
+        st.rerun()
+    else:
+        if job.error:
+            st.error(f"❌ Job gestopt: {job.error}")
+        st.download_button("⬇️ Download resultaten (CSV)", job.to_csv(agent.criteria),
+                           file_name=f"{os.path.splitext(job.name)[0]}_scores.csv", mime="text/csv")
+        st.caption(f"Resultaten blijven {format_seconds(manager.job_ttl)} na afloop beschikbaar")
+        if st.button("🗑️ Sluit job"):
+            manager.discard(job.id)
+            st.session_state.pop('bulk_job', None)
+            st.rerun()
+
 # Header
 st.markdown('<h1 class="main-header">🌲 Natuurhuisje Agent V2</h1>', unsafe_allow_html=True)
 
@@ -93,6 +203,9 @@ st.markdown('<h1 class="main-header">🌲 Natuurhuisje Agent V2</h1>', unsafe_al
 agent = load_agent()
 
 if agent:
+    # Pick up edits to training_data.csv (only a stat() when nothing changed)
+    agent.refresh_training_data()
+    
     # Count training examples
     ja_count = len(agent.training_examples.get('ja', []))
     nee_count = len(agent.training_examples.get('nee', []))
@@ -152,6 +265,23 @@ with st.sidebar:
                 for ex in agent.training_examples['nee'][:2]:
                     st.text(ex.url.split('/')[-1])
 
+    if agent and agent.metrics.enabled:
+        with st.expander("⏱️ Prestaties"):
+            snapshot = agent.metrics.snapshot()
+            for stage, stats in snapshot["stages"].items():
+                st.text(f"{stage:<8} {stats['count']:>4}x  gem. {stats['mean'] * 1000:.0f} ms")
+            counters = snapshot["counters"]
+            if counters:
+                st.text(f"tokens in/uit: {counters.get('input_tokens', 0):.0f} / {counters.get('output_tokens', 0):.0f}")
+
+mode = st.sidebar.radio("Modus", ["🔗 Eén URL", "📄 Bulk (CSV)"], index=0)
+if mode == "📄 Bulk (CSV)":
+    if agent:
+        render_bulk_page(agent)
+    else:
+        st.error("⚠️ Agent kon niet worden geladen. Check of training_data.csv bestaat.")
+    st.stop()
+
 # Main content
 col1, col2 = st.columns([2, 1])
 
@@ -174,11 +304,20 @@ if analyze_button and url_input and agent:
     else:
         with st.spinner("🤖 AI aan het werk (met training data)..."):
             try:
-                # Fetch content
-                html_content = fetch_page_content(url_input)
-                
-                # Analyze
-                result = agent.analyze_listing(url_input, html_content)
+                service = load_service_client()
+                if service is not None:
+                    # Shared service: a URL another session is already scoring is not scored twice
+                    result = service.score(url_input)
+                    if result.error:
+                        raise RuntimeError(result.error)
+                else:
+                    # Fetch content
+                    html_content = fetch_page_content(url_input)
+                    
+                    # Analyze, streamed: scores and reasoning appear while Claude is still writing
+                    live = st.empty()
+                    result = agent.analyze_listing(url_input, html_content, on_field=live_breakdown(live, agent))
+                    live.empty()
                 
                 # Display results
                 score_class = get_score_class(result.confidence_score)
@@ -191,6 +330,11 @@ if analyze_button and url_input and agent:
                 </div>
                 """, unsafe_allow_html=True)
                 
+                if result.source == "fast_path":
+                    st.caption("⚡ Duidelijk geval: gescoord door de lokale pre-classifier, zonder AI call")
+                elif result.source == "near_duplicate":
+                    st.caption(f"♻️ Bijna identiek aan een eerder gescoorde listing, score overgenomen van {result.derived_from}")
+                
                 # Show similarity if available
                 if result.similar_to:
                     similarity_emoji = {
@@ -224,23 +368,15 @@ if analyze_button and url_input and agent:
                 st.subheader("💭 AI Redenering")
                 st.info(result.reasoning)
                 
-                # Visual breakdown
+                # Visual breakdown (plain dict, so our code never imports pandas in the request path)
                 st.subheader("📈 Gewogen Impact")
-                import pandas as pd
                 
-                breakdown_data = []
+                contributions = {}
                 for criterion, score in result.breakdown.items():
                     config = agent.criteria[criterion]
-                    weighted_score = (score / 10) * config['weight']
-                    breakdown_data.append({
-                        'Criterium': config['description'][:30],
-                        'Score': score,
-                        'Gewicht': config['weight'],
-                        'Bijdrage': weighted_score
-                    })
+                    contributions[config['description'][:30]] = (score / 10) * config['weight']
                 
-                df = pd.DataFrame(breakdown_data)
-                st.bar_chart(df.set_index('Criterium')['Bijdrage'])
+                st.bar_chart({'Bijdrage': contributions})
                 
                 # Add feedback section
                 st.divider()
@@ -278,14 +414,14 @@ with st.expander("🆘 Hulp nodig?"):
     
     1. Plak een natuurhuisje.nl URL in het veld
     2. Klik op "Analyseer"
-    3. Wacht 5-10 seconden
+    3. De scores verschijnen zodra Claude ze geeft, de redenering volgt live
     4. Bekijk de score en redenering
     
     **Training data bijwerken:**
     
     1. Open training_data.csv
-    2. Voeg nieuwe voorbeelden toe
-    3. Herstart de app (klik R in terminal)
+    2. Voeg nieuwe voorbeelden toe en sla op
+    3. Klaar: de app neemt de wijzigingen binnen enkele seconden over
     
     **Problemen?**
     